@@ -2,6 +2,12 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
+from dotenv import load_dotenv
+
+# Before anything reads the environment: the app settings, and migrations that
+# honour options such as NOTE_COMPRESSION
+load_dotenv()
+
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
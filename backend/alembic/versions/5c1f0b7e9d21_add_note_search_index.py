@@ -0,0 +1,84 @@
+"""Add full-text search index for notes
+
+Revision ID: 5c1f0b7e9d21
+Revises: 42a7995bf9a4
+Create Date: 2026-10-17 09:12:41.318220
+
+"""
+import html
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f0b7e9d21'
+down_revision: Union[str, None] = '42a7995bf9a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+# Frozen copy of app.utils.html_to_text as of this revision, so the index holds
+# the same text the app writes for a saved note
+_TAG_RE = re.compile(r"<[^>]*>|<[^>]*$")
+_BLOCK_TAG_RE = re.compile(r"</?(p|div|br|li|h[1-6]|blockquote|pre|tr)\b[^>]*>", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _html_to_text(value):
+    if not value:
+        return ""
+    text = _BLOCK_TAG_RE.sub(" ", value)
+    text = _TAG_RE.sub("", text)
+    return _WHITESPACE_RE.sub(" ", html.unescape(text)).strip()
+
+
+def _backfill(conn, statement: str) -> None:
+    """Index existing notes, one keyset-paged batch per executemany"""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text("SELECT id, title, content FROM notes WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': BATCH_SIZE},
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        conn.execute(
+            sa.text(statement),
+            [{'id': row.id, 'title': row.title or '', 'body': _html_to_text(row.content)} for row in rows],
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        op.execute("ALTER TABLE notes ADD COLUMN search_vector tsvector")
+        _backfill(
+            conn,
+            "UPDATE notes SET search_vector = "
+            "setweight(to_tsvector('english', :title), 'A') || "
+            "setweight(to_tsvector('english', :body), 'B') "
+            "WHERE id = :id",
+        )
+        op.create_index(
+            'ix_notes_search_vector', 'notes', ['search_vector'], postgresql_using='gin'
+        )
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE notes_fts USING fts5(title, body, tokenize='porter unicode61')"
+        )
+        _backfill(conn, "INSERT INTO notes_fts(rowid, title, body) VALUES (:id, :title, :body)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_notes_search_vector', table_name='notes')
+        op.drop_column('notes', 'search_vector')
+    else:
+        op.execute("DROP TABLE notes_fts")
@@ -0,0 +1,28 @@
+"""Add version column to notes
+
+Revision ID: 8e3a6d4f2b10
+Revises: 5c1f0b7e9d21
+Create Date: 2026-10-17 10:03:18.552904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e3a6d4f2b10'
+down_revision: Union[str, None] = '5c1f0b7e9d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('notes', 'version')
@@ -0,0 +1,61 @@
+"""Add note list indexes and timestamps
+
+Revision ID: a93e5b7c2d18
+Revises: f2c9a7d1b3e6
+Create Date: 2026-10-17 16:21:45.660871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93e5b7c2d18'
+down_revision: Union[str, None] = 'f2c9a7d1b3e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _timestamp(name: str) -> sa.Column:
+    return sa.Column(name, sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        # SQLite cannot ADD COLUMN with a non-constant default, so rebuild the table
+        with op.batch_alter_table('notes', recreate='always') as batch_op:
+            batch_op.add_column(_timestamp('created_at'))
+            batch_op.add_column(_timestamp('updated_at'))
+    else:
+        # now() is stable, so existing rows get the migration time without a rewrite
+        op.add_column('notes', _timestamp('created_at'))
+        op.add_column('notes', _timestamp('updated_at'))
+
+    # Build outside the migration transaction so writes to notes are not blocked
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_notes_owner_id_desc', 'notes', ['owner_id', sa.text('id DESC')],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_notes_guest_session_id_desc', 'notes', ['session_id', sa.text('id DESC')],
+            unique=False, postgresql_concurrently=True,
+            postgresql_where=sa.text('owner_id IS NULL'), sqlite_where=sa.text('owner_id IS NULL'),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_notes_guest_session_id_desc', table_name='notes', postgresql_concurrently=True)
+        op.drop_index('ix_notes_owner_id_desc', table_name='notes', postgresql_concurrently=True)
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('notes', recreate='always') as batch_op:
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('created_at')
+    else:
+        op.drop_column('notes', 'updated_at')
+        op.drop_column('notes', 'created_at')
@@ -0,0 +1,44 @@
+"""Add blob last used
+
+Revision ID: b2d8e4f6a1c7
+Revises: f5a1d7c3b9e8
+Create Date: 2026-10-18 10:12:31.804215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d8e4f6a1c7'
+down_revision: Union[str, None] = 'f5a1d7c3b9e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _last_used_at() -> sa.Column:
+    return sa.Column('last_used_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing blobs count as used now, so the first collection cannot race their writers
+    if op.get_bind().dialect.name == 'sqlite':
+        # SQLite cannot ADD COLUMN with a non-constant default, so rebuild the table
+        with op.batch_alter_table('blobs', recreate='always') as batch_op:
+            batch_op.add_column(_last_used_at())
+    else:
+        op.add_column('blobs', _last_used_at())
+    op.create_index('ix_blobs_last_used_at', 'blobs', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_blobs_last_used_at', table_name='blobs')
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('blobs', recreate='always') as batch_op:
+            batch_op.drop_column('last_used_at')
+    else:
+        op.drop_column('blobs', 'last_used_at')
@@ -0,0 +1,67 @@
+"""Add change-feed revisions and note tombstones
+
+Revision ID: b71d2c5a9e44
+Revises: 8e3a6d4f2b10
+Create Date: 2026-10-17 11:26:50.104377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71d2c5a9e44'
+down_revision: Union[str, None] = '8e3a6d4f2b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('revision', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_table('sync_scopes',
+    sa.Column('scope', sa.String(), nullable=False),
+    sa.Column('revision', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('scope')
+    )
+    op.create_table('note_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=True),
+    sa.Column('session_id', sa.String(), nullable=True),
+    sa.Column('revision', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_note_tombstones_id'), 'note_tombstones', ['id'], unique=False)
+    op.create_index('ix_note_tombstones_owner_revision', 'note_tombstones', ['owner_id', 'revision'], unique=False)
+    op.create_index('ix_note_tombstones_session_revision', 'note_tombstones', ['session_id', 'revision'], unique=False)
+
+    # Existing notes get their id as revision; each scope's counter starts at its max
+    op.execute("UPDATE notes SET revision = id")
+    op.execute(
+        "INSERT INTO sync_scopes (scope, revision) "
+        "SELECT 'user:' || owner_id, max(revision) FROM notes "
+        "WHERE owner_id IS NOT NULL GROUP BY owner_id"
+    )
+    op.execute(
+        "INSERT INTO sync_scopes (scope, revision) "
+        "SELECT 'session:' || session_id, max(revision) FROM notes "
+        "WHERE owner_id IS NULL AND session_id IS NOT NULL GROUP BY session_id"
+    )
+    op.create_index('ix_notes_owner_revision', 'notes', ['owner_id', 'revision'], unique=False)
+    op.create_index('ix_notes_session_revision', 'notes', ['session_id', 'revision'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notes_session_revision', table_name='notes')
+    op.drop_index('ix_notes_owner_revision', table_name='notes')
+    op.drop_index('ix_note_tombstones_session_revision', table_name='note_tombstones')
+    op.drop_index('ix_note_tombstones_owner_revision', table_name='note_tombstones')
+    op.drop_index(op.f('ix_note_tombstones_id'), table_name='note_tombstones')
+    op.drop_table('note_tombstones')
+    op.drop_table('sync_scopes')
+    op.drop_column('notes', 'revision')
@@ -0,0 +1,53 @@
+"""Generate note search vector
+
+Revision ID: c3f7a9e2d4b6
+Revises: b2d8e4f6a1c7
+Create Date: 2026-10-18 14:03:52.117406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f7a9e2d4b6'
+down_revision: Union[str, None] = 'b2d8e4f6a1c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of search.SEARCH_VECTOR_SQL as of this revision
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(plaintext, '')), 'B')"
+)
+
+
+def _replace_search_vector(definition: str) -> None:
+    op.drop_index('ix_notes_search_vector', table_name='notes')
+    op.drop_column('notes', 'search_vector')
+    op.execute(f"ALTER TABLE notes ADD COLUMN search_vector tsvector {definition}")
+    op.create_index('ix_notes_search_vector', 'notes', ['search_vector'], postgresql_using='gin')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Computed by the row's own INSERT/UPDATE instead of a second UPDATE per save
+        _replace_search_vector(f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED")
+    elif dialect == 'sqlite':
+        # Earlier 5c1f0b7e9d21 runs backfilled raw HTML; reindex from the stored plaintext
+        op.execute("DELETE FROM notes_fts")
+        op.execute(
+            "INSERT INTO notes_fts(rowid, title, body) "
+            "SELECT id, coalesce(title, ''), coalesce(plaintext, '') FROM notes"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        _replace_search_vector("")
+        op.execute(f"UPDATE notes SET search_vector = {SEARCH_VECTOR_SQL}")
+    # SQLite: the plaintext index stays valid for the previous revision
@@ -0,0 +1,119 @@
+"""Add compressed note content
+
+Revision ID: d4a8c3e1f7b2
+Revises: b71d2c5a9e44
+Create Date: 2026-10-17 14:02:13.518204
+
+"""
+import os
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8c3e1f7b2'
+down_revision: Union[str, None] = 'b71d2c5a9e44'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+# Frozen copy of app.core.compression as of this revision; the options are read
+# from the environment the way the app reads them
+NOTE_COMPRESSION = os.getenv('NOTE_COMPRESSION', 'none')
+NOTE_COMPRESSION_MIN_BYTES = int(os.getenv('NOTE_COMPRESSION_MIN_BYTES', 1024))
+CODEC_ZLIB = b'\x01'
+CODEC_ZSTD = b'\x02'
+
+
+def _compress(value: str) -> bytes:
+    raw = value.encode('utf-8')
+    if NOTE_COMPRESSION == 'zstd':
+        return CODEC_ZSTD + zstandard.ZstdCompressor(level=3).compress(raw)
+    return CODEC_ZLIB + zlib.compress(raw, 6)
+
+
+def _decompress(blob: bytes) -> str:
+    tag, payload = blob[:1], blob[1:]
+    if tag == CODEC_ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if tag == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Note is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(payload).decode('utf-8')
+    raise ValueError(f"Unknown compression tag {tag!r}")
+
+notes = sa.table(
+    'notes',
+    sa.column('id', sa.Integer()),
+    sa.column('content', sa.Text()),
+    sa.column('content_z', sa.LargeBinary()),
+)
+
+
+def _batches(conn, where):
+    """Keyset-paged (id, content, content_z) rows matching ``where``"""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(notes.c.id, notes.c.content, notes.c.content_z)
+            .where(where, notes.c.id > last_id)
+            .order_by(notes.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _write(conn, params):
+    if params:
+        conn.execute(
+            notes.update()
+            .where(notes.c.id == sa.bindparam('note_id'))
+            .values(content=sa.bindparam('text'), content_z=sa.bindparam('blob')),
+            params,
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('content_z', sa.LargeBinary(), nullable=True))
+
+    # Compress existing bodies under the configured NOTE_COMPRESSION setting
+    if NOTE_COMPRESSION == 'none':
+        return
+    if NOTE_COMPRESSION not in ('zlib', 'zstd'):
+        raise RuntimeError(f"NOTE_COMPRESSION must be one of none, zlib, zstd, not {NOTE_COMPRESSION!r}")
+    if NOTE_COMPRESSION == 'zstd' and zstandard is None:
+        raise RuntimeError("NOTE_COMPRESSION=zstd requires the zstandard package")
+    conn = op.get_bind()
+    large = sa.func.length(notes.c.content) >= NOTE_COMPRESSION_MIN_BYTES
+    for rows in _batches(conn, large):
+        params = []
+        for row in rows:
+            blob = _compress(row.content)
+            # Bodies that do not shrink stay plain text
+            if len(blob) < len(row.content.encode('utf-8')):
+                params.append({'note_id': row.id, 'text': None, 'blob': blob})
+        _write(conn, params)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    for rows in _batches(conn, notes.c.content_z.isnot(None)):
+        _write(
+            conn,
+            [{'note_id': row.id, 'text': _decompress(row.content_z), 'blob': None} for row in rows],
+        )
+    op.drop_column('notes', 'content_z')
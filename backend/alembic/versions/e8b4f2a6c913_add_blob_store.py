@@ -0,0 +1,215 @@
+"""Add blob store
+
+Revision ID: e8b4f2a6c913
+Revises: c6d1f08a4e37
+Create Date: 2026-10-17 19:21:40.652387
+
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+import zlib
+from typing import Dict, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b4f2a6c913'
+down_revision: Union[str, None] = 'c6d1f08a4e37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 200
+
+notes = sa.table(
+    'notes',
+    sa.column('id', sa.Integer()),
+    sa.column('content', sa.Text()),
+    sa.column('content_z', sa.LargeBinary()),
+)
+blobs = sa.table(
+    'blobs',
+    sa.column('digest', sa.String()),
+    sa.column('media_type', sa.String()),
+    sa.column('size', sa.Integer()),
+    sa.column('data', sa.LargeBinary()),
+)
+
+# Frozen copies of app.core.compression and app.blobs as of this revision; the
+# options are read from the environment the way the app reads them
+NOTE_COMPRESSION = os.getenv('NOTE_COMPRESSION', 'none')
+NOTE_COMPRESSION_MIN_BYTES = int(os.getenv('NOTE_COMPRESSION_MIN_BYTES', 1024))
+BLOB_STORE = os.getenv('BLOB_STORE', 'database')
+BLOB_DIR = os.getenv('BLOB_DIR', 'blobs')
+BLOB_MIN_BYTES = int(os.getenv('BLOB_MIN_BYTES', 512))
+BLOB_URL_PREFIX = os.getenv('BLOB_URL_PREFIX', '/blobs/')
+CODEC_ZLIB = b'\x01'
+CODEC_ZSTD = b'\x02'
+_DATA_URI_RE = re.compile(
+    r"(?P<attr>\bsrc\s*=\s*)(?P<quote>[\"'])data:(?P<type>image/[\w.+-]+);base64,(?P<data>[A-Za-z0-9+/=\s]+)(?P=quote)",
+    re.IGNORECASE,
+)
+_BLOB_URL_RE = re.compile(
+    r"(?P<attr>\bsrc\s*=\s*)(?P<quote>[\"'])" + re.escape(BLOB_URL_PREFIX) + r"(?P<digest>[0-9a-f]{64})(?P=quote)"
+)
+
+
+def _decompress(blob: bytes) -> str:
+    tag, payload = blob[:1], blob[1:]
+    if tag == CODEC_ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if tag == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Note is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(payload).decode('utf-8')
+    raise ValueError(f"Unknown compression tag {tag!r}")
+
+
+def _encode(value):
+    """``(text, blob)`` column values for a body, as the app stores it"""
+    if NOTE_COMPRESSION == 'none' or value is None or len(value) < NOTE_COMPRESSION_MIN_BYTES:
+        return value, None
+    raw = value.encode('utf-8')
+    if NOTE_COMPRESSION == 'zstd':
+        blob = CODEC_ZSTD + zstandard.ZstdCompressor(level=3).compress(raw)
+    else:
+        blob = CODEC_ZLIB + zlib.compress(raw, 6)
+    if len(blob) >= len(raw):
+        return value, None
+    return None, blob
+
+
+def _path(digest: str) -> str:
+    return os.path.join(BLOB_DIR, digest[:2], digest)
+
+
+def _write_file(digest: str, data: bytes) -> None:
+    path = _path(digest)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _extract_images(conn, content):
+    """``content`` with inline base64 images moved to the store and referenced by URL"""
+    if not content or 'data:image/' not in content:
+        return content
+    images: Dict[str, Tuple[str, bytes]] = {}
+
+    def replace(match):
+        try:
+            data = base64.b64decode(re.sub(r"\s+", "", match['data']), validate=True)
+        except (binascii.Error, ValueError):
+            return match[0]
+        if len(data) < BLOB_MIN_BYTES:
+            return match[0]
+        digest = hashlib.sha256(data).hexdigest()
+        images[digest] = (match['type'].lower(), data)
+        return f"{match['attr']}{match['quote']}{BLOB_URL_PREFIX}{digest}{match['quote']}"
+
+    content = _DATA_URI_RE.sub(replace, content)
+    if images:
+        known = set(conn.execute(sa.select(blobs.c.digest).where(blobs.c.digest.in_(images))).scalars())
+        rows = []
+        for digest, (media_type, data) in images.items():
+            if digest in known:
+                continue
+            if BLOB_STORE == 'filesystem':
+                _write_file(digest, data)
+            rows.append({
+                'digest': digest,
+                'media_type': media_type,
+                'size': len(data),
+                'data': data if BLOB_STORE != 'filesystem' else None,
+            })
+        if rows:
+            conn.execute(blobs.insert(), rows)
+    return content
+
+
+def _inline_images(conn, content):
+    """The inverse of ``_extract_images``: stored images referenced from ``content`` as data URIs again"""
+    if not content or BLOB_URL_PREFIX not in content:
+        return content
+
+    def replace(match):
+        row = conn.execute(
+            sa.select(blobs.c.media_type, blobs.c.data).where(blobs.c.digest == match['digest'])
+        ).first()
+        if row is None:
+            return match[0]
+        if row.data is not None:
+            data = bytes(row.data)
+        else:
+            with open(_path(match['digest']), 'rb') as f:
+                data = f.read()
+        encoded = base64.b64encode(data).decode('ascii')
+        return f"{match['attr']}{match['quote']}data:{row.media_type};base64,{encoded}{match['quote']}"
+
+    return _BLOB_URL_RE.sub(replace, content)
+
+
+def _rewrite(conn, where, rewrite):
+    """Apply ``rewrite`` to matching note bodies in batches (compressed bodies
+    are always checked, since LIKE cannot see into them)"""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(notes.c.id, notes.c.content, notes.c.content_z)
+            .where(sa.or_(where, notes.c.content_z.isnot(None)), notes.c.id > last_id)
+            .order_by(notes.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        for row in rows:
+            content = _decompress(row.content_z) if row.content_z is not None else row.content
+            rewritten = rewrite(conn, content)
+            if rewritten != content:
+                text, blob = _encode(rewritten)
+                conn.execute(notes.update().where(notes.c.id == row.id).values(content=text, content_z=blob))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('blobs',
+    sa.Column('digest', sa.String(length=64), nullable=False),
+    sa.Column('media_type', sa.String(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('digest')
+    )
+
+    # Move images already pasted into notes to the store
+    if BLOB_STORE == 'none':
+        return
+    conn = op.get_bind()
+    _rewrite(conn, notes.c.content.like('%data:image/%'), _extract_images)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Put the images back into the notes before their store goes away
+    conn = op.get_bind()
+    _rewrite(conn, notes.c.content.like(f'%{BLOB_URL_PREFIX}%'), _inline_images)
+    op.drop_table('blobs')
@@ -0,0 +1,48 @@
+"""Add guest sessions
+
+Revision ID: f2c9a7d1b3e6
+Revises: d4a8c3e1f7b2
+Create Date: 2026-10-17 15:40:27.093318
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c9a7d1b3e6'
+down_revision: Union[str, None] = 'd4a8c3e1f7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    guest_sessions = op.create_table('guest_sessions',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Existing guest sessions start their TTL now rather than expiring at once
+    notes = sa.table('notes', sa.column('owner_id', sa.Integer()), sa.column('session_id', sa.String()))
+    now = sa.literal(datetime.now(timezone.utc), sa.DateTime(timezone=True))
+    op.execute(
+        guest_sessions.insert().from_select(
+            ['id', 'created_at', 'last_seen_at'],
+            sa.select(notes.c.session_id, now, now)
+            .where(notes.c.owner_id.is_(None), notes.c.session_id.isnot(None))
+            .group_by(notes.c.session_id),
+        )
+    )
+    op.create_index(op.f('ix_guest_sessions_last_seen_at'), 'guest_sessions', ['last_seen_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_guest_sessions_last_seen_at'), table_name='guest_sessions')
+    op.drop_table('guest_sessions')
@@ -0,0 +1,128 @@
+"""Add note derived fields
+
+Revision ID: f5a1d7c3b9e8
+Revises: e8b4f2a6c913
+Create Date: 2026-10-17 20:48:05.217634
+
+"""
+import hashlib
+import html
+import re
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a1d7c3b9e8'
+down_revision: Union[str, None] = 'e8b4f2a6c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+notes = sa.table(
+    'notes',
+    sa.column('id', sa.Integer()),
+    sa.column('content', sa.Text()),
+    sa.column('content_z', sa.LargeBinary()),
+    sa.column('plaintext', sa.Text()),
+    sa.column('preview', sa.String()),
+    sa.column('word_count', sa.Integer()),
+    sa.column('char_count', sa.Integer()),
+    sa.column('content_hash', sa.String()),
+)
+
+# Frozen copies of app.core.compression.decompress and app.utils.note_text_fields
+# as of this revision
+CODEC_ZLIB = b'\x01'
+CODEC_ZSTD = b'\x02'
+PREVIEW_LENGTH = 140
+_TAG_RE = re.compile(r"<[^>]*>|<[^>]*$")
+_BLOCK_TAG_RE = re.compile(r"</?(p|div|br|li|h[1-6]|blockquote|pre|tr)\b[^>]*>", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _decompress(blob: bytes) -> str:
+    tag, payload = blob[:1], blob[1:]
+    if tag == CODEC_ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if tag == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Note is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(payload).decode('utf-8')
+    raise ValueError(f"Unknown compression tag {tag!r}")
+
+
+def _html_to_text(value):
+    if not value:
+        return ""
+    text = _BLOCK_TAG_RE.sub(" ", value)
+    text = _TAG_RE.sub("", text)
+    return _WHITESPACE_RE.sub(" ", html.unescape(text)).strip()
+
+
+def _note_text_fields(value) -> dict:
+    body = value or ""
+    text = _html_to_text(body)
+    preview = text if len(text) <= PREVIEW_LENGTH else text[:PREVIEW_LENGTH].rstrip() + "…"
+    return {
+        'plaintext': text,
+        'preview': preview,
+        'word_count': len(text.split()),
+        'char_count': len(text),
+        'content_hash': hashlib.sha256(body.encode('utf-8')).hexdigest(),
+    }
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('plaintext', sa.Text(), nullable=True))
+    op.add_column('notes', sa.Column('preview', sa.String(), nullable=True))
+    op.add_column('notes', sa.Column('word_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('notes', sa.Column('char_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('notes', sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    # Derive the fields of existing notes, one keyset-paged batch per UPDATE executemany
+    conn = op.get_bind()
+    # The SET clause comes from the parameter keys, which are the column names
+    update = notes.update().where(notes.c.id == sa.bindparam('note_id'))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(notes.c.id, notes.c.content, notes.c.content_z)
+            .where(notes.c.id > last_id)
+            .order_by(notes.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        conn.execute(
+            update,
+            [
+                {
+                    'note_id': row.id,
+                    **_note_text_fields(
+                        _decompress(row.content_z) if row.content_z is not None else row.content
+                    ),
+                }
+                for row in rows
+            ],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('notes', 'content_hash')
+    op.drop_column('notes', 'char_count')
+    op.drop_column('notes', 'word_count')
+    op.drop_column('notes', 'preview')
+    op.drop_column('notes', 'plaintext')
@@ -0,0 +1,262 @@
+"""Admission control: per-client rate limits and a per-worker concurrency cap.
+
+Every request except the probes, ``/metrics`` and the docs takes a token from
+one of its client's three token buckets: "auth" for POSTs to ``/auth/*``,
+"read" for other GET and HEAD requests and "write" for the rest. Clients are
+told apart by the user id in their bearer token, else by their guest
+``X-Session-Id``, else by address; sign-ups and logins always count against
+the address. Any client can send a new ``X-Session-Id``, so guest requests
+also take a token from their address's bucket. A client whose bucket is empty gets 429, with ``Retry-After``
+set to when its next token arrives. With ``RATE_LIMIT_BACKEND=local`` the
+buckets live in each process, so every worker grants the full rate;
+``redis`` (``pip install redis``) shares them between workers and hosts. If
+Redis fails, requests are admitted.
+
+Separately, each worker serves at most ``MAX_CONCURRENT_REQUESTS`` requests
+at once. Up to ``ADMISSION_QUEUE_SIZE`` more wait as long as
+``ADMISSION_QUEUE_TIMEOUT`` for a slot, and the rest get 503 with
+``Retry-After``, so overload is shed at the door instead of queueing for the
+database pool. Change-push streams stay open for minutes and are not counted.
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import orjson
+
+from .core.cache import TTLCache
+from .core.config import settings
+from .core.security import decode_access_token
+from .metrics import RATE_LIMITED, REQUESTS_IN_FLIGHT, REQUESTS_SHED
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional dependency
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_PREFIX = "cleverpad:ratelimit:"
+RETRY_AFTER = 1
+# Neither rate limited nor counted against the concurrency cap
+EXEMPT_PATHS = {"/", "/healthz", "/readyz", "/metrics", "/docs", "/redoc", "/openapi.json"}
+# Rate limited when opened, but they hold no concurrency slot
+STREAM_PATHS = {"/notes/events"}
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # tokens added per second
+    burst: int  # bucket size
+
+    @property
+    def refill_seconds(self) -> float:
+        return self.burst / self.rate
+
+
+class LocalBackend:
+    def __init__(self, limits: Dict[str, Limit], max_keys: int):
+        self.limits = limits
+        # A bucket left alone for its refill time is full again, so it can be forgotten
+        self._buckets = {
+            name: TTLCache(maxsize=max_keys, ttl=limit.refill_seconds) for name, limit in limits.items()
+        }
+
+    async def take(self, bucket: str, key: str) -> float:
+        limit = self.limits[bucket]
+        now = time.monotonic()
+        state = self._buckets[bucket].get(key)
+        tokens = limit.burst if state is None else min(limit.burst, state[0] + (now - state[1]) * limit.rate)
+        if tokens < 1:
+            return (1 - tokens) / limit.rate
+        self._buckets[bucket].set(key, (tokens - 1, now))
+        return 0.0
+
+    async def close(self) -> None:
+        for buckets in self._buckets.values():
+            buckets.clear()
+
+
+# Refill and take atomically, on the Redis clock so app servers' clocks never matter
+_TAKE_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = burst
+if state[1] then
+  tokens = math.min(burst, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+end
+if tokens < 1 then
+  return tostring((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'stamp', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return '0'
+"""
+
+
+class RedisBackend:
+    def __init__(self, limits: Dict[str, Limit], url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package")
+        self.limits = limits
+        self._redis = redis_asyncio.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    async def take(self, bucket: str, key: str) -> float:
+        limit = self.limits[bucket]
+        wait = await self._take(keys=[f"{REDIS_PREFIX}{bucket}:{key}"], args=[limit.rate, limit.burst])
+        return float(wait)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend  # None when rate limiting is off
+
+    async def retry_after(self, bucket: str, key: str) -> float:
+        """Take one of ``key``'s ``bucket`` tokens; 0, or the seconds until one is available"""
+        if self.backend is None or bucket not in self.backend.limits:
+            return 0.0
+        try:
+            return await self.backend.take(bucket, key)
+        except Exception:
+            logger.exception("Rate limit check failed; admitting the request")
+            return 0.0
+
+    async def stop(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float):
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(limit) if limit > 0 else None
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting briefly if all are taken; False if the request should be shed"""
+        if self._slots is not None:
+            if self._slots.locked():
+                if self.waiting >= self.queue_size or self.queue_timeout <= 0:
+                    return False
+                self.waiting += 1
+                try:
+                    async with asyncio.timeout(self.queue_timeout):
+                        await self._slots.acquire()
+                except TimeoutError:
+                    return False
+                finally:
+                    self.waiting -= 1
+            else:
+                await self._slots.acquire()
+        REQUESTS_IN_FLIGHT.inc()
+        return True
+
+    def release(self) -> None:
+        REQUESTS_IN_FLIGHT.dec()
+        if self._slots is not None:
+            self._slots.release()
+
+
+def _bucket(method: str, path: str) -> str:
+    if method == "POST" and path.startswith("/auth/"):
+        return "auth"
+    return "read" if method in ("GET", "HEAD") else "write"
+
+
+def _client_keys(scope, bucket: str) -> Tuple[str, ...]:
+    """Keys whose buckets must all admit the request"""
+    client = scope.get("client")
+    address = f"addr:{client[0] if client else 'unknown'}"
+    if bucket != "auth":
+        headers = dict(scope["headers"])
+        authorization = headers.get(b"authorization", b"")
+        if authorization[:7].lower() == b"bearer ":
+            try:
+                return (f"user:{int(decode_access_token(authorization[7:].decode('latin-1'))['sub'])}",)
+            except Exception:
+                pass  # an invalid token is rejected by the route; limit it like an anonymous caller
+        session_id = headers.get(b"x-session-id")
+        if session_id:
+            # Unverified, so rotating the header must not escape the address's bucket
+            return f"session:{session_id.decode('latin-1')}", address
+    return (address,)
+
+
+async def _refuse(send, status_code: int, detail: str, retry_after: float) -> None:
+    body = orjson.dumps({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying the rate limits, then the concurrency cap"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        bucket = _bucket(scope["method"], scope["path"])
+        for key in _client_keys(scope, bucket):
+            wait = await limiter.retry_after(bucket, key)
+            if wait > 0:
+                RATE_LIMITED.labels(bucket).inc()
+                await _refuse(send, 429, "Too many requests, please retry", wait)
+                return
+        if scope["path"] in STREAM_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if not await concurrency.acquire():
+            REQUESTS_SHED.inc()
+            await _refuse(send, 503, "Server busy, please retry", RETRY_AFTER)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            concurrency.release()
+
+
+def _limits() -> Dict[str, Limit]:
+    configured = {
+        "read": Limit(settings.rate_limit_read_rate, settings.rate_limit_read_burst),
+        "write": Limit(settings.rate_limit_write_rate, settings.rate_limit_write_burst),
+        "auth": Limit(settings.rate_limit_auth_rate, settings.rate_limit_auth_burst),
+    }
+    # A rate of 0 leaves that kind of request unlimited
+    return {name: limit for name, limit in configured.items() if limit.rate > 0 and limit.burst > 0}
+
+
+def _backend():
+    if settings.rate_limit_backend == "redis":
+        return RedisBackend(_limits(), settings.rate_limit_redis_url)
+    if settings.rate_limit_backend == "local":
+        return LocalBackend(_limits(), settings.rate_limit_max_keys)
+    return None
+
+
+limiter = RateLimiter(_backend())
+concurrency = ConcurrencyLimiter(
+    settings.max_concurrent_requests, settings.admission_queue_size, settings.admission_queue_timeout
+)
@@ -0,0 +1,304 @@
+"""Content-addressed store for images pasted into notes.
+
+The editor pastes images as ``data:image/...;base64,`` URIs, so one
+screenshot used to ride along with every list, save, search and export of its
+note. Full note writes now move each such image into this store, keyed by the
+SHA-256 of its bytes, and point the ``<img>`` at ``BLOB_URL_PREFIX + digest``.
+Identical images are stored once.
+
+The ``blobs`` table holds the bytes, or with ``BLOB_STORE=filesystem`` only
+the media type and size, the bytes being written under ``BLOB_DIR``. Blobs
+are immutable and never rewritten; they are not deleted with notes, since
+revisions and other notes may reference the same digest. Instead every note
+write refreshes the last-used time of the blobs it references, and every
+``BLOB_GC_INTERVAL`` seconds a mark-and-sweep pass deletes the blobs unused
+for ``BLOB_GC_GRACE`` seconds that no note body or revision (rebuilt from its
+deltas) references any more. The delete re-checks the last-used time, so a
+blob referenced again while the pass runs is kept.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models, revisions
+from .core import compression
+from .core.config import settings
+from .database import SessionLocal, ReadSessionLocal
+from .metrics import BLOB_BYTES_COLLECTED, BLOBS_COLLECTED
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+GC_BATCH_SIZE = 500
+DIGEST_PATTERN = "^[0-9a-f]{64}$"
+
+_DATA_URI_RE = re.compile(
+    r"(?P<attr>\bsrc\s*=\s*)(?P<quote>[\"'])data:(?P<type>image/[\w.+-]+);base64,(?P<data>[A-Za-z0-9+/=\s]+)(?P=quote)",
+    re.IGNORECASE,
+)
+
+
+def _path(digest: str) -> str:
+    return os.path.join(settings.blob_dir, digest[:2], digest)
+
+
+def _write_file(digest: str, data: bytes) -> None:
+    path = _path(digest)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename, so a reader never sees a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _store(conn: Connection, digests: Set[str], images: Dict[str, Tuple[str, bytes]]) -> None:
+    """Mark the ``digests`` a note references as used, and insert images (digest -> (media type, bytes)) not stored yet"""
+    now = datetime.now(timezone.utc)
+    # At most one refresh per blob every half grace period, so hot images do not turn every save into a blob write
+    conn.execute(
+        update(models.Blob)
+        .where(
+            models.Blob.digest.in_(digests),
+            models.Blob.last_used_at < now - timedelta(seconds=settings.blob_gc_grace / 2),
+        )
+        .values(last_used_at=now)
+    )
+    if not images:
+        return
+    known = set(conn.execute(select(models.Blob.digest).where(models.Blob.digest.in_(images))).scalars())
+    rows = []
+    for digest, (media_type, data) in images.items():
+        if digest in known:
+            continue
+        if settings.blob_store == "filesystem":
+            _write_file(digest, data)
+        rows.append({
+            "digest": digest,
+            "media_type": media_type,
+            "size": len(data),
+            "data": data if settings.blob_store != "filesystem" else None,
+        })
+    if rows:
+        upsert = pg_insert if conn.dialect.name == "postgresql" else sqlite_insert
+        # Another writer may be storing the same image right now
+        conn.execute(upsert(models.Blob).on_conflict_do_nothing(index_elements=[models.Blob.digest]), rows)
+
+
+def extract_images(conn: Connection, content: Optional[str]) -> Optional[str]:
+    """``content`` with inline base64 images moved to the store and referenced by URL"""
+    if not content:
+        return content
+    images: Dict[str, Tuple[str, bytes]] = {}
+
+    def replace(match: re.Match) -> str:
+        try:
+            data = base64.b64decode(re.sub(r"\s+", "", match["data"]), validate=True)
+        except (binascii.Error, ValueError):
+            return match[0]
+        if len(data) < settings.blob_min_bytes:
+            return match[0]
+        digest = hashlib.sha256(data).hexdigest()
+        images[digest] = (match["type"].lower(), data)
+        return f"{match['attr']}{match['quote']}{settings.blob_url_prefix}{digest}{match['quote']}"
+
+    if settings.blob_store != "none" and "data:image/" in content:
+        content = _DATA_URI_RE.sub(replace, content)
+    digests = referenced_digests(content)
+    if digests:
+        _store(conn, digests, images)
+    return content
+
+
+def _read(conn: Connection, digest: str) -> Optional[Tuple[str, bytes]]:
+    row = conn.execute(
+        select(models.Blob.media_type, models.Blob.data).where(models.Blob.digest == digest)
+    ).first()
+    if row is None:
+        return None
+    if row.data is not None:
+        return row.media_type, bytes(row.data)
+    with open(_path(digest), "rb") as f:
+        return row.media_type, f.read()
+
+
+def inline_images(conn: Connection, content: Optional[str]) -> Optional[str]:
+    """The inverse of ``extract_images``: stored images referenced from ``content`` as data URIs again"""
+    if not content or settings.blob_url_prefix not in content:
+        return content
+    pattern = re.compile(
+        r"(?P<attr>\bsrc\s*=\s*)(?P<quote>[\"'])" + re.escape(settings.blob_url_prefix) + r"(?P<digest>[0-9a-f]{64})(?P=quote)"
+    )
+
+    def replace(match: re.Match) -> str:
+        blob = _read(conn, match["digest"])
+        if blob is None:
+            return match[0]
+        data = base64.b64encode(blob[1]).decode("ascii")
+        return f"{match['attr']}{match['quote']}data:{blob[0]};base64,{data}{match['quote']}"
+
+    return pattern.sub(replace, content)
+
+
+def referenced_digests(content: Optional[str]) -> Set[str]:
+    """Digests of the stored images ``content`` points at"""
+    if not content or settings.blob_url_prefix not in content:
+        return set()
+    pattern = re.compile(re.escape(settings.blob_url_prefix) + r"([0-9a-f]{64})")
+    return set(pattern.findall(content))
+
+
+def read_blobs(conn: Connection, digests: Iterable[str]) -> Dict[str, Tuple[str, bytes]]:
+    """digest -> (media type, bytes) of the stored ones among ``digests``"""
+    digests = list(digests)
+    if not digests:
+        return {}
+    rows = conn.execute(
+        select(models.Blob.digest, models.Blob.media_type, models.Blob.data).where(models.Blob.digest.in_(digests))
+    ).all()
+    images = {}
+    for row in rows:
+        if row.data is not None:
+            images[row.digest] = (row.media_type, bytes(row.data))
+        else:
+            with open(_path(row.digest), "rb") as f:
+                images[row.digest] = (row.media_type, f.read())
+    return images
+
+
+def get_blob_info(conn: Connection, digest: str) -> Optional[Tuple[str, int, Optional[str]]]:
+    """(media type, size, file path or None if the bytes are in the table) of a stored blob, or None"""
+    row = conn.execute(
+        select(models.Blob.media_type, models.Blob.size, models.Blob.data.is_(None).label("on_disk"))
+        .where(models.Blob.digest == digest)
+    ).first()
+    if row is None:
+        return None
+    if not row.on_disk:
+        return row.media_type, row.size, None
+    path = _path(digest)
+    if not os.path.exists(path):
+        logger.error("Blob %s has no file under %s", digest, settings.blob_dir)
+        return None
+    return row.media_type, row.size, path
+
+
+def iter_blob(digest: str, start: int, end: int, path: Optional[str] = None) -> Iterator[bytes]:
+    """Bytes ``start``..``end`` (inclusive) of a blob, in chunks, from ``path`` if given; runs in the threadpool"""
+    if path is not None:
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+        return
+    db = ReadSessionLocal()
+    try:
+        # Read the column a slice at a time rather than loading the whole image
+        for offset in range(start, end + 1, CHUNK_SIZE):
+            length = min(CHUNK_SIZE, end + 1 - offset)
+            chunk = db.execute(
+                select(func.substr(models.Blob.data, offset + 1, length)).where(models.Blob.digest == digest)
+            ).scalar()
+            if not chunk:
+                return
+            yield bytes(chunk)
+    finally:
+        db.close()
+
+
+# ──────────────────────────────────────────────────
+# Garbage collection
+# ──────────────────────────────────────────────────
+def _live_digests(db: Session, candidates: Set[str]) -> Set[str]:
+    """The ``candidates`` some note, or some revision of one, still references"""
+    live: Set[str] = set()
+    last_id = 0
+    while len(live) < len(candidates):
+        rows = db.execute(
+            select(models.Note.id, models.Note._content, models.Note.content_z)
+            .where(models.Note.id > last_id)
+            .order_by(models.Note.id)
+            .limit(GC_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        bodies = {
+            note_id: compression.decompress(blob) if blob is not None else text or ""
+            for note_id, text, blob in rows
+        }
+        for body in revisions.iter_history(db, bodies):
+            live |= referenced_digests(body) & candidates
+        db.commit()  # one short read transaction per batch
+    return live
+
+
+def collect_garbage(cutoff: datetime) -> Tuple[int, int]:
+    """Delete blobs unused since ``cutoff`` that nothing references; returns (blobs, bytes) deleted"""
+    reader = ReadSessionLocal()
+    try:
+        candidates = set(reader.execute(select(models.Blob.digest).where(models.Blob.last_used_at < cutoff)).scalars())
+        garbage = sorted(candidates - _live_digests(reader, candidates)) if candidates else []
+    finally:
+        reader.close()
+    count = size = 0
+    db = SessionLocal()
+    try:
+        for i in range(0, len(garbage), GC_BATCH_SIZE):
+            # Spare any blob a write referenced again since the mark began
+            deleted = db.execute(
+                delete(models.Blob)
+                .where(models.Blob.digest.in_(garbage[i:i + GC_BATCH_SIZE]), models.Blob.last_used_at < cutoff)
+                .returning(models.Blob.digest, models.Blob.size)
+            ).all()
+            db.commit()
+            for digest, blob_size in deleted:
+                try:
+                    os.unlink(_path(digest))
+                except FileNotFoundError:
+                    pass
+                count += 1
+                size += blob_size
+    finally:
+        db.close()
+    BLOBS_COLLECTED.inc(count)
+    BLOB_BYTES_COLLECTED.inc(size)
+    return count, size
+
+
+async def run_collector() -> None:
+    """Collect garbage every ``BLOB_GC_INTERVAL`` seconds until cancelled"""
+    while True:
+        await asyncio.sleep(settings.blob_gc_interval)
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.blob_gc_grace)
+        try:
+            count, size = await asyncio.to_thread(collect_garbage, cutoff)
+        except Exception:
+            logger.exception("Blob garbage collection failed")
+            continue
+        if count:
+            logger.info("Deleted %d unreferenced blobs (%d bytes)", count, size)
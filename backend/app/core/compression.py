@@ -0,0 +1,63 @@
+"""Codecs for compressed note bodies.
+
+Blobs start with a one-byte codec tag, so rows written under a different
+``NOTE_COMPRESSION`` setting stay readable after it changes. zstd needs the
+optional ``zstandard`` package; zlib is always available.
+"""
+import zlib
+from typing import Optional, Tuple
+
+from .config import settings
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+CODEC_ZLIB = b"\x01"
+CODEC_ZSTD = b"\x02"
+CODECS = ("none", "zlib", "zstd")
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def _check_codec(codec: str) -> None:
+    if codec not in CODECS:
+        raise RuntimeError(f"NOTE_COMPRESSION must be one of {', '.join(CODECS)}, not {codec!r}")
+    if codec == "zstd" and zstandard is None:
+        raise RuntimeError("NOTE_COMPRESSION=zstd requires the zstandard package")
+
+
+_check_codec(settings.note_compression)
+
+
+def compress(value: str, codec: str) -> bytes:
+    raw = value.encode("utf-8")
+    if codec == "zstd":
+        return CODEC_ZSTD + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return CODEC_ZLIB + zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress(blob: bytes) -> str:
+    tag, payload = blob[:1], blob[1:]
+    if tag == CODEC_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if tag == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Note is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown compression tag {tag!r}")
+
+
+def encode(value: Optional[str]) -> Tuple[Optional[str], Optional[bytes]]:
+    """Split a body into ``(text, blob)`` column values; exactly one is used.
+
+    Bodies below the size threshold, or that do not shrink, stay plain text.
+    """
+    codec = settings.note_compression
+    if codec == "none" or value is None or len(value) < settings.note_compression_min_bytes:
+        return value, None
+    blob = compress(value, codec)
+    if len(blob) >= len(value.encode("utf-8")):
+        return value, None
+    return None, blob
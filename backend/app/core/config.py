@@ -1,15 +1,110 @@
 from pydantic import BaseModel
-from dotenv import load_dotenv
 import os
 
-load_dotenv()  # reads .env
-
 
+# Read from the environment only; launchers (app.serve, alembic) load .env before importing this
 class Settings(BaseModel):
     database_url: str = os.getenv("DATABASE_URL")
     secret_key: str = os.getenv("SECRET_KEY")
+    # Startup schema check: "create" builds an empty database from the models and
+    # stamps it at the Alembic head (development); otherwise, as with "verify", the
+    # app refuses to start unless the database is at the head. "off" skips the check
+    db_schema: str = os.getenv("DB_SCHEMA", "create")
+    # Pooled connections each worker opens before it reports ready
+    db_warmup_connections: int = int(os.getenv("DB_WARMUP_CONNECTIONS", 2))
+    # On SIGTERM, report not ready for this long before closing the listener, so
+    # load balancers stop routing here first (python -m app.serve defaults it to 5)
+    shutdown_drain_seconds: float = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", 0))
+    # Seconds in-flight requests get to finish once the listener is closed
+    graceful_timeout: int = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+    # python -m app.serve: bind address and worker processes
+    host: str = os.getenv("HOST", "0.0.0.0")
+    port: int = int(os.getenv("PORT", 8000))
+    # More than one worker needs shared state: app.serve refuses to start them with the
+    # write-behind buffer, the local change channel or without PROMETHEUS_MULTIPROC_DIR
+    web_concurrency: int = int(os.getenv("WEB_CONCURRENCY", 1))
     algorithm: str = os.getenv("ALGORITHM", "HS256")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+    # bcrypt cost; hashes with any other cost are rehashed on the next login
+    bcrypt_rounds: int = int(os.getenv("BCRYPT_ROUNDS", 12))
+    password_hash_workers: int = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+    # Hash/verify jobs allowed in flight before signup/login answer 503
+    password_hash_max_pending: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
+    # Store note bodies compressed ("none", "zlib" or "zstd") from this size up
+    note_compression: str = os.getenv("NOTE_COMPRESSION", "none")
+    note_compression_min_bytes: int = int(os.getenv("NOTE_COMPRESSION_MIN_BYTES", 1024))
+    # Smaller response bodies are sent uncompressed
+    response_compression_min_bytes: int = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", 1024))
+    # Guest sessions idle for longer than this (seconds) are deleted with their notes
+    guest_session_ttl: float = float(os.getenv("GUEST_SESSION_TTL", 30 * 24 * 3600))
+    # Last-seen is written at most this often per session and process
+    guest_touch_interval: float = float(os.getenv("GUEST_TOUCH_INTERVAL", 300))
+    # Sessions each process remembers as recently touched; beyond this they are touched again early
+    guest_touch_cache_size: int = int(os.getenv("GUEST_TOUCH_CACHE_SIZE", 10000))
+    # Seconds between sweeps (0 disables the sweeper); each sweep deletes at most
+    # batch size x max batches notes, one short transaction per batch
+    guest_sweep_interval: float = float(os.getenv("GUEST_SWEEP_INTERVAL", 600))
+    guest_sweep_batch_size: int = int(os.getenv("GUEST_SWEEP_BATCH_SIZE", 500))
+    guest_sweep_max_batches: int = int(os.getenv("GUEST_SWEEP_MAX_BATCHES", 100))
+    # Buffer note saves for this many seconds and write them in batches (0 writes through)
+    write_coalesce_window: float = float(os.getenv("WRITE_COALESCE_WINDOW", 0))
+    write_coalesce_batch_size: int = int(os.getenv("WRITE_COALESCE_BATCH_SIZE", 200))
+    # Saves of further notes write through once this many notes are buffered
+    write_coalesce_max_pending: int = int(os.getenv("WRITE_COALESCE_MAX_PENDING", 10000))
+    # Change push fan-out: "local" (one process), "postgres" (LISTEN/NOTIFY) or "auto"
+    realtime_backend: str = os.getenv("REALTIME_BACKEND", "auto")
+    # Seconds between keep-alives on idle push connections
+    realtime_heartbeat: float = float(os.getenv("REALTIME_HEARTBEAT", 25))
+    # Undelivered events per connection before it is told to resync instead
+    realtime_queue_size: int = int(os.getenv("REALTIME_QUEUE_SIZE", 100))
+    # Note history: every Nth revision is a full snapshot, the others reverse deltas
+    note_revision_snapshot_every: int = int(os.getenv("NOTE_REVISION_SNAPSHOT_EVERY", 20))
+    # Revisions kept per note and their maximum age in seconds (0 = no limit)
+    note_revision_keep: int = int(os.getenv("NOTE_REVISION_KEEP", 100))
+    note_revision_max_age: float = float(os.getenv("NOTE_REVISION_MAX_AGE", 0))
+    # Read-through cache of note bodies and lists: "local" (per-process LRU), "redis" or "none"
+    note_cache_backend: str = os.getenv("NOTE_CACHE_BACKEND", "local")
+    note_cache_redis_url: str = os.getenv("NOTE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    # Size bound of the local cache, and the longest any entry is served
+    note_cache_max_bytes: int = int(os.getenv("NOTE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    note_cache_ttl: float = float(os.getenv("NOTE_CACHE_TTL", 300))
+    # Where images pasted into notes are moved: "database", "filesystem" (under
+    # BLOB_DIR) or "none" to leave them inline; smaller images stay inline
+    blob_store: str = os.getenv("BLOB_STORE", "database")
+    blob_dir: str = os.getenv("BLOB_DIR", "blobs")
+    blob_min_bytes: int = int(os.getenv("BLOB_MIN_BYTES", 512))
+    # Image URLs written into notes; use the API's public URL if it is served from another origin
+    blob_url_prefix: str = os.getenv("BLOB_URL_PREFIX", "/blobs/")
+    # Seconds between garbage collections of unreferenced blobs (0 disables them), and how
+    # long a blob must have gone unused by any note write before it can be collected
+    blob_gc_interval: float = float(os.getenv("BLOB_GC_INTERVAL", 24 * 3600))
+    blob_gc_grace: float = float(os.getenv("BLOB_GC_GRACE", 24 * 3600))
+    render_workers: int = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+    # Render jobs allowed in flight before POST /notes/{id}/render answers 503
+    render_max_pending: int = int(os.getenv("RENDER_MAX_PENDING", 32))
+    # Size bound of the rendered-artifact cache, and how long artifacts and job ids live
+    render_cache_max_bytes: int = int(os.getenv("RENDER_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+    render_ttl: float = float(os.getenv("RENDER_TTL", 3600))
+    # Per-client token buckets: "local" (per process), "redis" (shared) or "none"
+    rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "local")
+    rate_limit_redis_url: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    # Requests per second each user or guest session sustains, and the burst it may
+    # send at once; a rate of 0 leaves that kind of request unlimited
+    rate_limit_read_rate: float = float(os.getenv("RATE_LIMIT_READ_RATE", 50))
+    rate_limit_read_burst: int = int(os.getenv("RATE_LIMIT_READ_BURST", 200))
+    rate_limit_write_rate: float = float(os.getenv("RATE_LIMIT_WRITE_RATE", 20))
+    rate_limit_write_burst: int = int(os.getenv("RATE_LIMIT_WRITE_BURST", 100))
+    # Sign-ups, logins and new guest sessions, per client address
+    rate_limit_auth_rate: float = float(os.getenv("RATE_LIMIT_AUTH_RATE", 1))
+    rate_limit_auth_burst: int = int(os.getenv("RATE_LIMIT_AUTH_BURST", 10))
+    # Clients per bucket the local backend tracks (least recently seen are forgotten)
+    rate_limit_max_keys: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+    # Requests each worker serves at once (0 = unlimited); keep it near the database
+    # pool size (5 + 10 overflow) so overload is shed before it queues on the pool
+    max_concurrent_requests: int = int(os.getenv("MAX_CONCURRENT_REQUESTS", 32))
+    # Requests that may wait for a slot, and for how long, before 503
+    admission_queue_size: int = int(os.getenv("ADMISSION_QUEUE_SIZE", 64))
+    admission_queue_timeout: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 1))
 
 
 settings = Settings()
@@ -1,12 +1,27 @@
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
 from .config import settings
+from .executors import BoundedProcessPool
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min == max == default, so a hash made with any other cost "needs update"
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
+
+# bcrypt runs here, off the request threads and the event loop
+password_pool = BoundedProcessPool(
+    "password hashing",
+    max_workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
 
 
 def hash_password(password: str) -> str:
@@ -17,6 +32,19 @@ def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
 
+def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Verify; on success also return a fresh hash if ``hashed`` uses an outdated cost"""
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run(hash_password, password)
+
+
+async def verify_and_update_password_async(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return await password_pool.run(verify_and_update_password, plain, hashed)
+
+
 def create_access_token(
     data: Dict[str, Any], expires_delta: Optional[int] = None
 ) -> str:
@@ -1,9 +1,14 @@
+from sqlalchemy import case, delete, func, insert, select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import uuid
 
-from . import models, schemas
+from . import blobs, export, models, realtime, revisions, schemas, search
+from .diffs import apply_delta, from_utf16
 from .core.security import hash_password, verify_password
 
 
@@ -60,6 +65,157 @@ def get_notes(db: Session, user_id: Optional[int] = None, session_id: Optional[s
         return []
 
 
+def _note_scope(user_id: Optional[int] = None, session_id: Optional[str] = None, model=models.Note):
+    """Filter criteria selecting the notes (or tombstones) of a user or a guest session"""
+    if user_id:
+        return [model.owner_id == user_id]
+    elif session_id:
+        return [model.session_id == session_id, model.owner_id.is_(None)]
+    else:
+        return None
+
+
+def _scope_key(user_id: Optional[int] = None, session_id: Optional[str] = None) -> str:
+    return f"user:{user_id}" if user_id else f"session:{session_id}"
+
+
+def _upsert(db: Session):
+    return pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+def _next_revision(db: Session, scope_key: str, count: int = 1) -> int:
+    """Reserve ``count`` change-feed revisions for a scope; returns the highest.
+
+    The upsert locks the scope's counter row until commit, so writers in one
+    scope commit in revision order and a reader never sees a gap fill in later.
+    """
+    stmt = (
+        _upsert(db)(models.SyncScope)
+        .values(scope=scope_key, revision=count)
+        .on_conflict_do_update(
+            index_elements=[models.SyncScope.scope],
+            set_={"revision": models.SyncScope.revision + count},
+        )
+        .returning(models.SyncScope.revision)
+    )
+    return db.execute(stmt).scalar_one()
+
+
+def _note_event(db_note: models.Note) -> dict:
+    return {
+        "type": "note.created" if db_note.version == 1 else "note.updated",
+        "id": db_note.id,
+        "version": db_note.version,
+        "revision": db_note.revision,
+    }
+
+
+def _stage_note(
+    db: Session,
+    db_note: models.Note,
+    previous: Optional[revisions.Previous] = None,
+    revision: Optional[int] = None,
+) -> None:
+    """Stamp a new or edited note with the next revision (or ``revision``,
+    already reserved), reindex it, queue its change event and, for an edit,
+    record ``previous`` in its history; the caller commits"""
+    if previous is not None:
+        revisions.record_revision(db, db_note, previous)
+    scope_key = _scope_key(db_note.owner_id, db_note.session_id)
+    db_note.revision = revision if revision is not None else _next_revision(db, scope_key)
+    db.flush()
+    search.index_note(db, db_note)
+    realtime.queue_event(db, scope_key, _note_event(db_note))
+
+
+def _save_note(db: Session, db_note: models.Note, previous: Optional[revisions.Previous] = None) -> None:
+    _stage_note(db, db_note, previous)
+    db.commit()
+
+
+def get_note_summaries(
+    db: Session,
+    user_id: Optional[int] = None,
+    session_id: Optional[str] = None,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+) -> Tuple[List[dict], Optional[int]]:
+    """Keyset page of note summaries, newest first, without loading full bodies.
+
+    Returns the page and the cursor (an id) to pass as ``before_id`` for the
+    next page, or ``None`` when there are no more notes.
+    """
+    scope = _note_scope(user_id, session_id)
+    if scope is None:
+        return [], None
+
+    query = db.query(
+        models.Note.id, models.Note.title, models.Note.preview, models.Note.word_count
+    ).filter(*scope)
+    if before_id is not None:
+        query = query.filter(models.Note.id < before_id)
+    rows = query.order_by(models.Note.id.desc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {"id": row.id, "title": row.title, "preview": row.preview or "", "word_count": row.word_count}
+        for row in rows
+    ]
+    return items, (rows[-1].id if has_more else None)
+
+
+def get_note_stats(
+    db: Session, user_id: Optional[int] = None, session_id: Optional[str] = None, utc_offset: int = 0
+) -> dict:
+    """Totals over a user's or guest session's notes, from the derived columns
+    in a single query; ``utc_offset`` (minutes) decides where "today" starts"""
+    stats = {
+        "total_notes": 0, "total_words": 0, "total_characters": 0, "average_words": 0,
+        "notes_this_week": 0, "notes_today": 0, "last_updated_at": None, "longest_note": None,
+    }
+    scope = _note_scope(user_id, session_id)
+    if scope is None:
+        return stats
+
+    Note = models.Note
+    now = datetime.now(timezone.utc)
+    local_now = now + timedelta(minutes=utc_offset)
+    today_start = local_now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(minutes=utc_offset)
+    totals = (
+        select(
+            func.count(Note.id).label("total_notes"),
+            func.coalesce(func.sum(Note.word_count), 0).label("total_words"),
+            func.coalesce(func.sum(Note.char_count), 0).label("total_characters"),
+            func.coalesce(func.sum(case((Note.created_at >= now - timedelta(days=7), 1), else_=0)), 0).label("this_week"),
+            func.coalesce(func.sum(case((Note.created_at >= today_start, 1), else_=0)), 0).label("today"),
+            func.max(Note.updated_at).label("last_updated_at"),
+        )
+        .where(*scope)
+        .subquery()
+    )
+    longest = (
+        select(Note.id, Note.title, Note.word_count)
+        .where(*scope)
+        .order_by(Note.word_count.desc(), Note.id.desc())
+        .limit(1)
+        .subquery()
+    )
+    row = db.execute(select(totals, longest).select_from(totals.outerjoin(longest, true()))).one()
+    stats.update(
+        total_notes=row.total_notes,
+        total_words=row.total_words,
+        total_characters=row.total_characters,
+        average_words=round(row.total_words / row.total_notes) if row.total_notes else 0,
+        notes_this_week=row.this_week,
+        notes_today=row.today,
+        last_updated_at=row.last_updated_at,
+    )
+    if row.id is not None:
+        stats["longest_note"] = {"id": row.id, "title": row.title, "word_count": row.word_count}
+    return stats
+
+
 def get_note(db: Session, note_id: int, user_id: Optional[int] = None, session_id: Optional[str] = None):
     """Get a specific note for authenticated user or guest session"""
     if user_id:
@@ -86,42 +242,421 @@ def get_note(db: Session, note_id: int, user_id: Optional[int] = None, session_i
 
 def create_note(db: Session, note_in: schemas.NoteCreate, user_id: Optional[int] = None, session_id: Optional[str] = None):
     """Create a note for authenticated user or guest session"""
+    fields = {"title": note_in.title, "content": blobs.extract_images(db.connection(), note_in.content)}
     if user_id:
         # Authenticated user note
-        db_note = models.Note(**note_in.model_dump(), owner_id=user_id)
+        db_note = models.Note(**fields, owner_id=user_id)
     elif session_id:
         # Guest session note
-        db_note = models.Note(**note_in.model_dump(), session_id=session_id, owner_id=None)
+        db_note = models.Note(**fields, session_id=session_id, owner_id=None)
     else:
         raise HTTPException(status_code=400, detail="Either user_id or session_id required")
     
     db.add(db_note)
-    db.commit()
-    db.refresh(db_note)
+    _save_note(db, db_note)
     return db_note
 
 
-def update_note(db: Session, note_id: int, note_in: schemas.NoteCreate, user_id: Optional[int] = None, session_id: Optional[str] = None):
-    """Update a note for authenticated user or guest session"""
-    db_note = get_note(db, note_id, user_id, session_id)
+def bulk_create_notes(db: Session, notes_in: List[schemas.NoteCreate], user_id: Optional[int] = None, session_id: Optional[str] = None) -> List[int]:
+    """Insert many notes in one transaction with a single executemany; returns ids in input order"""
+    if not user_id and not session_id:
+        raise HTTPException(status_code=400, detail="Either user_id or session_id required")
+    if not notes_in:
+        return []
+    scope_key = _scope_key(user_id, session_id)
+    last_revision = _next_revision(db, scope_key, count=len(notes_in))
+    first_revision = last_revision - len(notes_in) + 1
+    bodies = [blobs.extract_images(db.connection(), note_in.content) for note_in in notes_in]
+    rows = [
+        {
+            "title": note_in.title,
+            **models.Note.stored_content(body),
+            "owner_id": user_id or None,
+            "session_id": None if user_id else session_id,
+            "version": 1,
+            "revision": first_revision + i,
+        }
+        for i, (note_in, body) in enumerate(zip(notes_in, bodies))
+    ]
+    ids = db.execute(
+        insert(models.Note).returning(models.Note.id, sort_by_parameter_order=True),
+        rows,
+    ).scalars().all()
+    search.index_notes(
+        db,
+        [
+            {"id": note_id, "title": row["title"], "plaintext": row["plaintext"]}
+            for row, note_id in zip(rows, ids)
+        ],
+    )
+    for row, note_id in zip(rows, ids):
+        realtime.queue_event(
+            db, scope_key, {"type": "note.created", "id": note_id, "version": 1, "revision": row["revision"]}
+        )
+    db.commit()
+    return list(ids)
+
+
+def _get_note_for_write(db: Session, note_id: int, user_id: Optional[int] = None, session_id: Optional[str] = None, expected_version: Optional[int] = None) -> models.Note:
+    """Load and row-lock a note for writing; 404 if missing, 412 if ``expected_version`` is stale"""
+    scope = _note_scope(user_id, session_id)
+    if scope is None:
+        raise HTTPException(status_code=400, detail="Either user_id or session_id required")
+    db_note = (
+        db.query(models.Note)
+        .filter(models.Note.id == note_id, *scope)
+        .with_for_update()
+        .first()
+    )
     if not db_note:
         raise HTTPException(status_code=404, detail="Note not found")
+    if expected_version is not None and db_note.version != expected_version:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"Note is at version {db_note.version}",
+        )
+    return db_note
+
+
+def update_note(db: Session, note_id: int, note_in: schemas.NoteCreate, user_id: Optional[int] = None, session_id: Optional[str] = None, expected_version: Optional[int] = None):
+    """Update a note for authenticated user or guest session"""
+    db_note = _get_note_for_write(db, note_id, user_id, session_id, expected_version)
+    previous = revisions.capture(db_note)
     db_note.title = note_in.title
-    db_note.content = note_in.content
-    db.commit()
-    db.refresh(db_note)
+    db_note.content = blobs.extract_images(db.connection(), note_in.content)
+    db_note.version += 1
+    _save_note(db, db_note, previous)
     return db_note
 
 
-def delete_note(db: Session, note_id: int, user_id: Optional[int] = None, session_id: Optional[str] = None):
+def _owned_by(db_note: models.Note, user_id: Optional[int] = None, session_id: Optional[str] = None) -> bool:
+    if user_id:
+        return db_note.owner_id == user_id
+    return bool(session_id) and db_note.owner_id is None and db_note.session_id == session_id
+
+
+def apply_note_updates(db: Session, updates: List[dict]) -> List[str]:
+    """Write buffered updates (see ``writeback``) in one transaction.
+
+    Each update is ``{"id", "title", "content", "version", "base_version",
+    "user_id", "session_id"}``. Returns, per update, "written"; "rebased" if
+    the note had moved on from ``base_version``, in which case the update is
+    still applied on top (last write wins; the replaced version stays in the
+    history) with a version past the stored one; or "missing" if the note has
+    been deleted.
+
+    Locks are taken in the same order as single-note writes: first every note
+    row (one statement, in id order), then each scope's revision counter, once
+    per scope and in scope order, so concurrent writers cannot deadlock.
+    """
+    outcomes = {}
+    locked = (
+        db.query(models.Note)
+        .filter(models.Note.id.in_([update["id"] for update in updates]))
+        .order_by(models.Note.id)
+        .with_for_update()
+        .all()
+    )
+    notes = {db_note.id: db_note for db_note in locked}
+    by_scope: Dict[str, List[Tuple[models.Note, dict]]] = {}
+    for update in sorted(updates, key=lambda u: u["id"]):
+        db_note = notes.get(update["id"])
+        if db_note is None or not _owned_by(db_note, update["user_id"], update["session_id"]):
+            outcomes[update["id"]] = "missing"
+            continue
+        outcomes[update["id"]] = "written" if db_note.version == update["base_version"] else "rebased"
+        by_scope.setdefault(_scope_key(db_note.owner_id, db_note.session_id), []).append((db_note, update))
+    for scope_key in sorted(by_scope):
+        scope_updates = by_scope[scope_key]
+        first_revision = _next_revision(db, scope_key, count=len(scope_updates)) - len(scope_updates) + 1
+        for i, (db_note, update) in enumerate(scope_updates):
+            previous = revisions.capture(db_note)
+            db_note.title = update["title"]
+            db_note.content = blobs.extract_images(db.connection(), update["content"])
+            db_note.version = max(update["version"], db_note.version + 1)
+            _stage_note(db, db_note, previous, revision=first_revision + i)
+    db.commit()
+    return [outcomes[update["id"]] for update in updates]
+
+
+def patch_note(db: Session, note_id: int, patch: schemas.NotePatch, user_id: Optional[int] = None, session_id: Optional[str] = None) -> Tuple[int, Optional[str]]:
+    """Apply a delta edit made against ``patch.base_version``.
+
+    Returns the new version, and the stored body if it differs from the patched
+    one (pasted images moved to the blob store), else None.
+    """
+    # Row lock so concurrent patches against the same base cannot both succeed
+    db_note = _get_note_for_write(db, note_id, user_id, session_id)
+    if db_note.version != patch.base_version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Note is at version {db_note.version}, not {patch.base_version}",
+        )
+    previous = revisions.capture(db_note)
+    rewritten = None
+    if patch.ops:
+        try:
+            base = db_note.content or ""
+            content = apply_delta(base, from_utf16(base, patch.ops))
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        # A patch may insert pasted images too; the client must then take the stored body
+        stored = blobs.extract_images(db.connection(), content)
+        if stored != content:
+            rewritten = stored
+        db_note.content = stored
+    if patch.title is not None:
+        db_note.title = patch.title
+    db_note.version = patch.base_version + 1
+    _save_note(db, db_note, previous)
+    return patch.base_version + 1, rewritten
+
+
+def delete_note(db: Session, note_id: int, user_id: Optional[int] = None, session_id: Optional[str] = None, expected_version: Optional[int] = None):
     """Delete a note for authenticated user or guest session"""
+    db_note = _get_note_for_write(db, note_id, user_id, session_id, expected_version)
+    search.unindex_note(db, db_note.id)
+    revisions.drop_revisions(db, [db_note.id])
+    scope_key = _scope_key(db_note.owner_id, db_note.session_id)
+    revision = _next_revision(db, scope_key)
+    db.add(
+        models.NoteTombstone(
+            note_id=db_note.id,
+            owner_id=db_note.owner_id,
+            session_id=db_note.session_id,
+            revision=revision,
+        )
+    )
+    realtime.queue_event(db, scope_key, {"type": "note.deleted", "id": db_note.id, "revision": revision})
+    db.delete(db_note)
+    db.commit()
+
+
+def list_note_revisions(
+    db: Session,
+    note_id: int,
+    user_id: Optional[int] = None,
+    session_id: Optional[str] = None,
+    limit: int = 50,
+    before_version: Optional[int] = None,
+) -> Tuple[List[dict], Optional[int]]:
+    """Page of a note's earlier versions, newest first"""
+    if get_note_version(db, note_id, user_id, session_id) is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return revisions.list_revisions(db, note_id, limit=limit, before_version=before_version)
+
+
+def get_note_revision(db: Session, note_id: int, version: int, user_id: Optional[int] = None, session_id: Optional[str] = None) -> dict:
+    """Rebuild an earlier version of a note"""
     db_note = get_note(db, note_id, user_id, session_id)
     if not db_note:
         raise HTTPException(status_code=404, detail="Note not found")
-    db.delete(db_note)
-    db.commit()
+    revision = revisions.get_revision(db, db_note, version)
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return revision
+
+
+def restore_note_revision(db: Session, note_id: int, version: int, user_id: Optional[int] = None, session_id: Optional[str] = None, expected_version: Optional[int] = None):
+    """Make an earlier version current again, as a new version; the replaced one joins the history"""
+    db_note = _get_note_for_write(db, note_id, user_id, session_id, expected_version)
+    revision = revisions.get_revision(db, db_note, version)
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    previous = revisions.capture(db_note)
+    db_note.title = revision["title"]
+    db_note.content = blobs.extract_images(db.connection(), revision["content"])
+    db_note.version += 1
+    _save_note(db, db_note, previous)
+    return db_note
+
+
+def get_note_version(db: Session, note_id: int, user_id: Optional[int] = None, session_id: Optional[str] = None) -> Optional[int]:
+    """Current version of a note without loading its body, or None if not found"""
+    scope = _note_scope(user_id, session_id)
+    if scope is None:
+        return None
+    return (
+        db.query(models.Note.version)
+        .filter(models.Note.id == note_id, *scope)
+        .scalar()
+    )
+
+
+def get_scope_revision(db: Session, user_id: Optional[int] = None, session_id: Optional[str] = None) -> int:
+    """Latest change-feed revision of a user or guest session (0 before any write)"""
+    if not user_id and not session_id:
+        return 0
+    revision = (
+        db.query(models.SyncScope.revision)
+        .filter(models.SyncScope.scope == _scope_key(user_id, session_id))
+        .scalar()
+    )
+    return revision or 0
+
+
+def get_note_changes(
+    db: Session,
+    since: int = 0,
+    user_id: Optional[int] = None,
+    session_id: Optional[str] = None,
+    limit: int = 500,
+) -> dict:
+    """Notes written and ids deleted after revision ``since``, oldest change first"""
+    note_scope = _note_scope(user_id, session_id)
+    if note_scope is None:
+        return {"notes": [], "deleted": [], "cursor": since, "has_more": False}
+    tombstone_scope = _note_scope(user_id, session_id, model=models.NoteTombstone)
+
+    notes = (
+        db.query(models.Note)
+        .filter(*note_scope, models.Note.revision > since)
+        .order_by(models.Note.revision)
+        .limit(limit + 1)
+        .all()
+    )
+    tombstones = (
+        db.query(models.NoteTombstone.note_id, models.NoteTombstone.revision)
+        .filter(*tombstone_scope, models.NoteTombstone.revision > since)
+        .order_by(models.NoteTombstone.revision)
+        .limit(limit + 1)
+        .all()
+    )
+    changes = sorted(
+        [(note.revision, note, None) for note in notes]
+        + [(row.revision, None, row.note_id) for row in tombstones],
+        key=lambda change: change[0],
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    return {
+        "notes": [note for _, note, _ in changes if note is not None],
+        "deleted": [note_id for _, _, note_id in changes if note_id is not None],
+        "cursor": changes[-1][0] if changes else since,
+        "has_more": has_more,
+    }
+
 
+def search_notes(
+    db: Session,
+    query: str,
+    user_id: Optional[int] = None,
+    session_id: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> Tuple[List[dict], Optional[int]]:
+    """Full-text search within the notes of a user or guest session"""
+    scope = _note_scope(user_id, session_id)
+    if scope is None:
+        return [], None
+    return search.search_notes(db, query, scope, limit=limit, offset=offset)
 
+
+def export_notes(export_format: str, user_id: Optional[int] = None, session_id: Optional[str] = None) -> Iterator[bytes]:
+    """Stream every note of a user or guest session as ``ndjson`` or ``markdown-zip``"""
+    scope = _note_scope(user_id, session_id)
+    if scope is None:
+        raise HTTPException(status_code=400, detail="Either user_id or session_id required")
+    if export_format == "markdown-zip":
+        return export.stream_markdown_zip(scope)
+    return export.stream_ndjson(scope)
+
+
+def get_blob_info(db: Session, digest: str) -> Optional[Tuple[str, int, Optional[str]]]:
+    """(media type, size, file path if the bytes are on disk) of a stored image, or None"""
+    return blobs.get_blob_info(db.connection(), digest)
+
+
+def get_notes_by_ids(db: Session, note_ids: List[int], user_id: Optional[int] = None, session_id: Optional[str] = None) -> List[models.Note]:
+    """The notes among ``note_ids`` that belong to a user or guest session"""
+    scope = _note_scope(user_id, session_id)
+    if scope is None or not note_ids:
+        return []
+    return db.query(models.Note).filter(models.Note.id.in_(note_ids), *scope).all()
+
+
+def read_blobs(db: Session, digests: Iterable[str]) -> Dict[str, Tuple[str, bytes]]:
+    """digest -> (media type, bytes) of stored images, for server-side rendering"""
+    return blobs.read_blobs(db.connection(), digests)
+
+
+# ──────────────────────────────────────────────────
+# Guest sessions
+# ──────────────────────────────────────────────────
 def generate_guest_session_id() -> str:
     """Generate a unique session ID for guest users"""
     return str(uuid.uuid4())
+
+
+def touch_guest_session(db: Session, session_id: str) -> None:
+    """Record a guest session as seen now, creating it if it is not known yet"""
+    now = datetime.now(timezone.utc)
+    db.execute(
+        _upsert(db)(models.GuestSession)
+        .values(id=session_id, created_at=now, last_seen_at=now)
+        .on_conflict_do_update(index_elements=[models.GuestSession.id], set_={"last_seen_at": now})
+    )
+    db.commit()
+
+
+def sweep_expired_guest_notes(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """Delete up to ``batch_size`` notes of guest sessions last seen before ``cutoff``.
+
+    The expiry is re-checked in the DELETE itself, so a session that came back
+    since the batch was picked keeps its notes. Returns the number deleted.
+    """
+    expired = (
+        select(models.GuestSession.id)
+        .where(models.GuestSession.id == models.Note.session_id, models.GuestSession.last_seen_at < cutoff)
+        .exists()
+    )
+    candidates = db.execute(
+        select(models.Note.id).where(models.Note.owner_id.is_(None), expired).limit(batch_size)
+    ).scalars().all()
+    if not candidates:
+        return 0
+    note_ids = db.execute(
+        delete(models.Note)
+        .where(models.Note.id.in_(candidates), models.Note.owner_id.is_(None), expired)
+        .returning(models.Note.id)
+    ).scalars().all()
+    search.unindex_notes(db, note_ids)
+    revisions.drop_revisions(db, note_ids)
+    db.commit()
+    return len(note_ids)
+
+
+def sweep_expired_guest_sessions(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """Delete up to ``batch_size`` expired guest sessions that have no notes left"""
+    has_notes = (
+        select(models.Note.id)
+        .where(models.Note.session_id == models.GuestSession.id, models.Note.owner_id.is_(None))
+        .exists()
+    )
+    candidates = db.execute(
+        select(models.GuestSession.id)
+        .where(models.GuestSession.last_seen_at < cutoff, ~has_notes)
+        .limit(batch_size)
+    ).scalars().all()
+    if not candidates:
+        return 0
+    # Both conditions again: a session touched, or given a note, since the select keeps
+    # its change-feed counter and tombstones
+    session_ids = db.execute(
+        delete(models.GuestSession)
+        .where(models.GuestSession.id.in_(candidates), models.GuestSession.last_seen_at < cutoff, ~has_notes)
+        .returning(models.GuestSession.id)
+    ).scalars().all()
+    if session_ids:
+        db.execute(
+            delete(models.NoteTombstone).where(
+                models.NoteTombstone.session_id.in_(session_ids), models.NoteTombstone.owner_id.is_(None)
+            )
+        )
+        db.execute(
+            delete(models.SyncScope).where(
+                models.SyncScope.scope.in_([_scope_key(session_id=sid) for sid in session_ids])
+            )
+        )
+    db.commit()
+    return len(session_ids)
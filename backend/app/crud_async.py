@@ -0,0 +1,151 @@
+"""AsyncSession front-end for ``crud``.
+
+Note logic lives once, in ``crud``. Each coroutine hands the sync function to
+``AsyncSession.run_sync``, which runs it on the event loop through greenlets
+while the async driver does the I/O, so no thread is held per request.
+Password hashing is CPU-bound and runs in the bounded password pool.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models, schemas
+from .core.security import hash_password_async, verify_and_update_password_async
+
+
+# ──────────────────────────────────────────────────
+# Users
+# ──────────────────────────────────────────────────
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+
+async def create_user(db: AsyncSession, user_in: schemas.UserCreate):
+    if await get_user_by_email(db, user_in.email):
+        raise HTTPException(status_code=400, detail="E-mail already registered")
+    db_user = models.User(
+        name=user_in.name,
+        email=user_in.email,
+        hashed_password=await hash_password_async(user_in.password),
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
+    if not user:
+        return None
+    await db.commit()  # no transaction (nor SQLite write lock) held while the hash is checked
+    valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        # Stored with an outdated cost factor; upgrade now that we know the password
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+
+# ──────────────────────────────────────────────────
+# Notes
+# ──────────────────────────────────────────────────
+async def get_notes(db: AsyncSession, user_id: Optional[int] = None, session_id: Optional[str] = None):
+    return await db.run_sync(crud.get_notes, user_id, session_id)
+
+
+async def get_note_summaries(db: AsyncSession, user_id: Optional[int] = None, session_id: Optional[str] = None, limit: int = 50, before_id: Optional[int] = None):
+    return await db.run_sync(crud.get_note_summaries, user_id, session_id, limit, before_id)
+
+
+async def get_note(db: AsyncSession, note_id: int, user_id: Optional[int] = None, session_id: Optional[str] = None):
+    return await db.run_sync(crud.get_note, note_id, user_id, session_id)
+
+
+async def get_note_version(db: AsyncSession, note_id: int, user_id: Optional[int] = None, session_id: Optional[str] = None):
+    return await db.run_sync(crud.get_note_version, note_id, user_id, session_id)
+
+
+async def get_scope_revision(db: AsyncSession, user_id: Optional[int] = None, session_id: Optional[str] = None) -> int:
+    return await db.run_sync(crud.get_scope_revision, user_id, session_id)
+
+
+async def create_note(db: AsyncSession, note_in: schemas.NoteCreate, user_id: Optional[int] = None, session_id: Optional[str] = None):
+    return await db.run_sync(crud.create_note, note_in, user_id, session_id)
+
+
+async def bulk_create_notes(db: AsyncSession, notes_in: List[schemas.NoteCreate], user_id: Optional[int] = None, session_id: Optional[str] = None) -> List[int]:
+    return await db.run_sync(crud.bulk_create_notes, notes_in, user_id, session_id)
+
+
+async def update_note(db: AsyncSession, note_id: int, note_in: schemas.NoteCreate, user_id: Optional[int] = None, session_id: Optional[str] = None, expected_version: Optional[int] = None):
+    return await db.run_sync(crud.update_note, note_id, note_in, user_id, session_id, expected_version)
+
+
+async def apply_note_updates(db: AsyncSession, updates: List[dict]) -> List[str]:
+    return await db.run_sync(crud.apply_note_updates, updates)
+
+
+async def patch_note(db: AsyncSession, note_id: int, patch: schemas.NotePatch, user_id: Optional[int] = None, session_id: Optional[str] = None) -> Tuple[int, Optional[str]]:
+    return await db.run_sync(crud.patch_note, note_id, patch, user_id, session_id)
+
+
+async def delete_note(db: AsyncSession, note_id: int, user_id: Optional[int] = None, session_id: Optional[str] = None, expected_version: Optional[int] = None):
+    return await db.run_sync(crud.delete_note, note_id, user_id, session_id, expected_version)
+
+
+async def list_note_revisions(db: AsyncSession, note_id: int, user_id: Optional[int] = None, session_id: Optional[str] = None, limit: int = 50, before_version: Optional[int] = None):
+    return await db.run_sync(crud.list_note_revisions, note_id, user_id, session_id, limit, before_version)
+
+
+async def get_note_revision(db: AsyncSession, note_id: int, version: int, user_id: Optional[int] = None, session_id: Optional[str] = None) -> dict:
+    return await db.run_sync(crud.get_note_revision, note_id, version, user_id, session_id)
+
+
+async def restore_note_revision(db: AsyncSession, note_id: int, version: int, user_id: Optional[int] = None, session_id: Optional[str] = None, expected_version: Optional[int] = None):
+    return await db.run_sync(crud.restore_note_revision, note_id, version, user_id, session_id, expected_version)
+
+
+async def get_note_changes(db: AsyncSession, since: int = 0, user_id: Optional[int] = None, session_id: Optional[str] = None, limit: int = 500) -> dict:
+    return await db.run_sync(crud.get_note_changes, since, user_id, session_id, limit)
+
+
+async def get_note_stats(db: AsyncSession, user_id: Optional[int] = None, session_id: Optional[str] = None, utc_offset: int = 0) -> dict:
+    return await db.run_sync(crud.get_note_stats, user_id, session_id, utc_offset)
+
+
+async def search_notes(db: AsyncSession, query: str, user_id: Optional[int] = None, session_id: Optional[str] = None, limit: int = 20, offset: int = 0):
+    return await db.run_sync(crud.search_notes, query, user_id, session_id, limit, offset)
+
+
+async def get_blob_info(db: AsyncSession, digest: str) -> Optional[Tuple[str, int, Optional[str]]]:
+    return await db.run_sync(crud.get_blob_info, digest)
+
+
+async def get_notes_by_ids(db: AsyncSession, note_ids: List[int], user_id: Optional[int] = None, session_id: Optional[str] = None):
+    return await db.run_sync(crud.get_notes_by_ids, note_ids, user_id, session_id)
+
+
+async def read_blobs(db: AsyncSession, digests: Iterable[str]) -> Dict[str, Tuple[str, bytes]]:
+    return await db.run_sync(crud.read_blobs, digests)
+
+
+# ──────────────────────────────────────────────────
+# Guest sessions
+# ──────────────────────────────────────────────────
+async def touch_guest_session(db: AsyncSession, session_id: str) -> None:
+    return await db.run_sync(crud.touch_guest_session, session_id)
+
+
+async def sweep_expired_guest_notes(db: AsyncSession, cutoff: datetime, batch_size: int) -> int:
+    return await db.run_sync(crud.sweep_expired_guest_notes, cutoff, batch_size)
+
+
+async def sweep_expired_guest_sessions(db: AsyncSession, cutoff: datetime, batch_size: int) -> int:
+    return await db.run_sync(crud.sweep_expired_guest_sessions, cutoff, batch_size)
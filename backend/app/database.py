@@ -1,8 +1,89 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from .core.config import settings
+from .metrics import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+# Async drivers used for the same database by the request-serving engine
+_ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the sync driver in ``url`` for its asyncio counterpart"""
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+IS_SQLITE = settings.database_url.startswith("sqlite")
+# Seconds a SQLite transaction waits for another one's write lock before failing
+SQLITE_BUSY_TIMEOUT = 30
+
+# SQLite connections are shared across the threadpool that runs sync handlers
+connect_args = (
+    {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT} if IS_SQLITE else {}
+)
+
+
+def _use_immediate_transactions(sync_engine) -> None:
+    """SQLite: take the write lock when a transaction begins, not at its first write.
+
+    Handlers read before they write, and a deferred transaction that already
+    read cannot wait for a concurrent writer: SQLite fails it at once with
+    "database is locked". Beginning with ``BEGIN IMMEDIATE`` makes it queue
+    for the lock instead. Read-only work opts out with the ``sqlite_deferred``
+    execution option (see ``ReadSessionLocal``) and, the database being in
+    WAL mode, neither waits for writers nor blocks them.
+    """
+
+    @event.listens_for(sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None  # transactions are begun below, not by the driver
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+    @event.listens_for(sync_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN" if conn.get_execution_options().get("sqlite_deferred") else "BEGIN IMMEDIATE")
+
+
+# Sync engine: Alembic, scripts, tests and threadpool-bound streaming work
+engine = create_engine(
+    settings.database_url, pool_pre_ping=True, connect_args=connect_args, poolclass=TimedQueuePool
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# Read-only work, such as streaming exports and blobs; on SQLite it never takes the write lock
+ReadSessionLocal = sessionmaker(
+    bind=engine.execution_options(sqlite_deferred=True), autoflush=False, autocommit=False
+)
+
+# Async engine: every request handler
+async_engine = create_async_engine(
+    async_database_url(settings.database_url),
+    pool_pre_ping=True,
+    connect_args=connect_args,
+    poolclass=TimedAsyncQueuePool,
+)
+# Handlers serialize ORM objects after commit, outside any greenlet, so keep them loaded
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, autocommit=False, expire_on_commit=False
+)
+# GET and HEAD handlers, which only read
+AsyncReadSessionLocal = async_sessionmaker(
+    bind=async_engine.execution_options(sqlite_deferred=True), autoflush=False, autocommit=False, expire_on_commit=False
+)
+
+if IS_SQLITE:
+    _use_immediate_transactions(engine)
+    _use_immediate_transactions(async_engine.sync_engine)
+
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
 Base = declarative_base()
@@ -1,18 +1,18 @@
 # app/dependencies.py
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
-from .database import SessionLocal
+from .database import AsyncReadSessionLocal, AsyncSessionLocal, SessionLocal
 from .core.security import decode_access_token
-from app import models
+from .principals import Principal
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 
 # ───────────────────────────────────────────────────────────
-# DB session
+# DB session (sync: scripts, tests and threadpool-bound work)
 def get_db():
     db = SessionLocal()
     try:
@@ -21,11 +21,20 @@ def get_db():
         db.close()
 
 
+# ───────────────────────────────────────────────────────────
+# DB session (async: request handlers)
+async def get_async_db(request: Request):
+    sessions = AsyncReadSessionLocal if request.method in ("GET", "HEAD") else AsyncSessionLocal
+    async with sessions() as db:
+        yield db
+
+
 # ───────────────────────────────────────────────────────────
 # Current user (required authentication)
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> models.User:
+# Only the token is checked; the users row is read if a route awaits Principal.load().
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> Principal:
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -41,27 +50,19 @@ def get_current_user(
             detail="Invalid credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(models.User).get(user_id)
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return user
+    return Principal(user_id, db)
 
 
 # ───────────────────────────────────────────────────────────
 # Optional current user (for guest support)
-def get_current_user_optional(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> Optional[models.User]:
+async def get_current_user_optional(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> Optional[Principal]:
     if not token:
         return None
     try:
         payload = decode_access_token(token)
         user_id: int = int(payload.get("sub"))
-        user = db.query(models.User).get(user_id)
-        return user
     except Exception:
         return None
+    return Principal(user_id, db)
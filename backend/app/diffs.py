@@ -0,0 +1,86 @@
+"""Compact text deltas for incremental note edits.
+
+A delta is a list of ``[start, end, text]`` ops against a base string, each
+replacing ``base[start:end]`` with ``text``. Ops are sorted by ``start`` and do
+not overlap; offsets are Unicode code points of the base string. Clients count
+UTF-16 code units, as JavaScript strings do, so their ops go through
+``from_utf16`` first.
+"""
+import re
+from bisect import bisect_right
+from difflib import SequenceMatcher
+from itertools import accumulate
+from typing import List, Sequence, Tuple
+
+Op = Tuple[int, int, str]
+
+# Changed regions are diffed as words, whitespace runs and single symbols, not characters
+_TOKEN_RE = re.compile(r"\w+|\s+|[^\w\s]")
+# Changed regions of more tokens than this are replaced whole rather than diffed,
+# which is quadratic in the worst case and runs inside the saving transaction
+MAX_DIFF_TOKENS = 1000
+# Characters outside the BMP, which take two UTF-16 code units (a surrogate pair)
+_ASTRAL_RE = re.compile("[\U00010000-\U0010ffff]")
+
+
+def from_utf16(base: str, ops: Sequence[Op]) -> List[Op]:
+    """``ops`` with UTF-16 offsets into ``base`` turned into code point offsets;
+    raises ValueError for an offset between the halves of a surrogate pair"""
+    astral = [match.start() for match in _ASTRAL_RE.finditer(base)]
+    if not astral:
+        return list(ops)
+    # UTF-16 offset just past each astral character
+    ends = [at + i + 2 for i, at in enumerate(astral)]
+
+    def convert(offset: int) -> int:
+        before = bisect_right(ends, offset)
+        if before < len(ends) and offset == ends[before] - 1:
+            raise ValueError(f"Offset {offset} splits a surrogate pair")
+        return offset - before
+
+    return [(convert(start), convert(end), text) for start, end, text in ops]
+
+
+def apply_delta(base: str, ops: Sequence[Op]) -> str:
+    """Apply ``ops`` to ``base``; raises ValueError for malformed deltas"""
+    parts = []
+    cursor = 0
+    for start, end, text in ops:
+        if start < cursor or end < start or end > len(base):
+            raise ValueError(f"Invalid op [{start}, {end}] for text of length {len(base)}")
+        parts.append(base[cursor:start])
+        parts.append(text)
+        cursor = end
+    parts.append(base[cursor:])
+    return "".join(parts)
+
+
+def make_delta(base: str, target: str) -> List[Op]:
+    """Ops that turn ``base`` into ``target`` (``apply_delta(base, ops) == target``)"""
+    prefix = 0
+    limit = min(len(base), len(target))
+    while prefix < limit and base[prefix] == target[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and base[-1 - suffix] == target[-1 - suffix]:
+        suffix += 1
+    old = base[prefix:len(base) - suffix]
+    new = target[prefix:len(target) - suffix]
+    if not old and not new:
+        return []
+    if not old or not new:
+        return [(prefix, prefix + len(old), new)]
+    old_tokens = _TOKEN_RE.findall(old)
+    new_tokens = _TOKEN_RE.findall(new)
+    if len(old_tokens) + len(new_tokens) > MAX_DIFF_TOKENS:
+        return [(prefix, prefix + len(old), new)]
+    # Token index -> character offset
+    old_at = list(accumulate(map(len, old_tokens), initial=0))
+    new_at = list(accumulate(map(len, new_tokens), initial=0))
+    ops = []
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            ops.append((prefix + old_at[i1], prefix + old_at[i2], new[new_at[j1]:new_at[j2]]))
+    return ops
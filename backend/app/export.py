@@ -0,0 +1,113 @@
+"""Streaming full-account export.
+
+Notes are read with a server-side cursor (``yield_per``) from a session owned
+by the generator, since the request's session is closed before a streaming
+body is sent. Only one batch of notes and one zip entry are held in memory.
+
+Exports are backups, so they carry the images in the blob store: NDJSON
+bodies get them back inline as data URIs, and the Markdown zip holds each
+image once under ``images/``, linked relatively from the notes.
+"""
+import json
+import mimetypes
+import re
+import zipfile
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import blobs, models
+from .core.config import settings
+from .database import ReadSessionLocal
+from .renderers import markdown_converter, note_to_markdown
+
+EXPORT_BATCH_SIZE = 500
+_FILENAME_UNSAFE_RE = re.compile(r"[^\w\- ]+")
+
+
+def _iter_notes(scope: list) -> Iterator[Tuple[Session, models.Note]]:
+    """Every note in ``scope``, with the session it was read from (for blob reads)"""
+    db = ReadSessionLocal()
+    try:
+        stmt = (
+            select(models.Note)
+            .where(*scope)
+            .order_by(models.Note.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for note in db.execute(stmt).scalars():
+            yield db, note
+    finally:
+        db.close()
+
+
+def note_filename(note_id: int, title: Optional[str], extension: str = "md") -> str:
+    slug = _FILENAME_UNSAFE_RE.sub("", title or "").strip()[:60] or "Untitled"
+    return f"{note_id:06d} - {slug}.{extension}"
+
+
+def stream_ndjson(scope: list) -> Iterator[bytes]:
+    """One JSON object per note, flushed once per batch"""
+    lines = []
+    for db, note in _iter_notes(scope):
+        content = blobs.inline_images(db.connection(), note.content)
+        lines.append(
+            json.dumps(
+                {"id": note.id, "title": note.title, "content": content, "version": note.version},
+                ensure_ascii=False,
+            )
+        )
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ZipSink:
+    """Write-only file object collecting zip output until the response drains it.
+
+    It deliberately has no ``tell``/``seek``, so ``zipfile`` streams entries
+    with data descriptors instead of seeking back to patch headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_markdown_zip(scope: list) -> Iterator[bytes]:
+    """A zip archive with one Markdown file per note, written entry by entry"""
+    sink = _ZipSink()
+    converter = markdown_converter()
+    paths: Dict[str, str] = {}  # digest -> archive path of the images written so far
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for db, note in _iter_notes(scope):
+            content = note.content
+            digests = blobs.referenced_digests(content)
+            for digest, (media_type, data) in blobs.read_blobs(db.connection(), digests - paths.keys()).items():
+                paths[digest] = f"images/{digest}{mimetypes.guess_extension(media_type) or ''}"
+                # Image formats are compressed already
+                archive.writestr(paths[digest], data, compress_type=zipfile.ZIP_STORED)
+            for digest in digests & paths.keys():
+                content = content.replace(settings.blob_url_prefix + digest, paths[digest])
+            archive.writestr(
+                note_filename(note.id, note.title),
+                note_to_markdown(note.title, content, converter),
+            )
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
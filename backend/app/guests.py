@@ -0,0 +1,79 @@
+"""Guest-session lifecycle.
+
+Guests are identified only by the ``X-Session-ID`` issued by /auth/guest.
+Each session's last-seen time is written at most once per
+``GUEST_TOUCH_INTERVAL`` per process. Sessions idle for longer than
+``GUEST_SESSION_TTL`` are reclaimed by a background sweeper that deletes their
+notes in batches, one short transaction per batch, then the sessions
+themselves (with their tombstones and change-feed counters).
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+from . import crud_async
+from .core.cache import TTLCache
+from .core.config import settings
+from .database import AsyncSessionLocal
+from .metrics import (
+    GUEST_NOTES_SWEPT,
+    GUEST_SESSIONS_SWEPT,
+    GUEST_SWEEP_DURATION,
+    GUEST_SWEEP_FAILURES,
+    GUEST_SWEEP_LAST_SUCCESS,
+)
+
+logger = logging.getLogger(__name__)
+
+_touched = TTLCache(maxsize=settings.guest_touch_cache_size, ttl=settings.guest_touch_interval)
+
+
+async def touch_guest_session(session_id: str) -> None:
+    """Refresh a session's last-seen time unless this process did so recently"""
+    if _touched.get(session_id) is not None:
+        return
+    async with AsyncSessionLocal() as db:
+        await crud_async.touch_guest_session(db, session_id)
+    _touched.set(session_id, True)
+
+
+async def sweep_guest_sessions() -> Tuple[int, int]:
+    """One bounded sweep; returns (notes deleted, sessions deleted)"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.guest_session_ttl)
+    batch_size = settings.guest_sweep_batch_size
+    notes = sessions = 0
+    async with AsyncSessionLocal() as db:
+        for _ in range(settings.guest_sweep_max_batches):
+            deleted = await crud_async.sweep_expired_guest_notes(db, cutoff, batch_size)
+            GUEST_NOTES_SWEPT.inc(deleted)
+            notes += deleted
+            if deleted < batch_size:
+                break
+            await asyncio.sleep(0)  # let requests run between batches
+        for _ in range(settings.guest_sweep_max_batches):
+            deleted = await crud_async.sweep_expired_guest_sessions(db, cutoff, batch_size)
+            GUEST_SESSIONS_SWEPT.inc(deleted)
+            sessions += deleted
+            if deleted < batch_size:
+                break
+            await asyncio.sleep(0)
+    return notes, sessions
+
+
+async def run_sweeper() -> None:
+    """Sweep every ``GUEST_SWEEP_INTERVAL`` seconds until cancelled"""
+    while True:
+        await asyncio.sleep(settings.guest_sweep_interval)
+        start = time.perf_counter()
+        try:
+            notes, sessions = await sweep_guest_sessions()
+        except Exception:
+            GUEST_SWEEP_FAILURES.inc()
+            logger.exception("Guest-session sweep failed")
+            continue
+        GUEST_SWEEP_DURATION.observe(time.perf_counter() - start)
+        GUEST_SWEEP_LAST_SUCCESS.set_to_current_time()
+        if notes or sessions:
+            logger.info("Swept %d expired guest sessions and %d notes", sessions, notes)
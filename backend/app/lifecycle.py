@@ -0,0 +1,162 @@
+"""Process lifecycle: schema check, warm-up, readiness and drain.
+
+Nothing here runs at import time. ``prepare_database`` replaces the old
+``create_all`` on import: it reads the database's Alembic revision and refuses
+to start unless it is the head, so workers never race each other through DDL.
+Only an empty database is built from the models (``DB_SCHEMA=create``, the
+development default), then stamped at the head. ``python -m app.serve`` runs
+it once before starting workers; each worker's startup repeats the check
+unless it already passed in the process it was forked from.
+
+``warm_up`` opens pooled connections before a worker reports ready, and
+``install_drain_handler`` makes the first SIGTERM flip ``/readyz`` to 503 for
+``SHUTDOWN_DRAIN_SECONDS`` before the server stops accepting connections.
+"""
+import asyncio
+import logging
+import os
+import signal
+import threading
+from typing import List
+
+from sqlalchemy import inspect, text
+
+from .core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic")
+READY_TIMEOUT = 2
+
+
+class SchemaError(RuntimeError):
+    """The database is not at the schema this code expects"""
+
+
+class _State:
+    schema_checked = False
+    ready = False
+    draining = False
+
+
+state = _State()
+
+
+# ──────────────────────────────────────────────────
+# Schema
+# ──────────────────────────────────────────────────
+def _script_directory():
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", ALEMBIC_DIR)
+    return ScriptDirectory.from_config(config)
+
+
+def _create_schema(connection, script) -> None:
+    from alembic.runtime.migration import MigrationContext
+
+    from . import models  # noqa: F401  (registers every table on Base.metadata)
+    from .database import Base
+    from .search import create_search_index
+
+    logger.info("Empty database: creating tables and stamping Alembic head")
+    Base.metadata.create_all(bind=connection)
+    create_search_index(connection)
+    MigrationContext.configure(connection).stamp(script, "heads")
+
+
+def prepare_database() -> None:
+    """Check (or, for an empty database, create) the schema once per process tree"""
+    if state.schema_checked or settings.db_schema == "off":
+        return
+    from alembic.runtime.migration import MigrationContext
+
+    from .database import engine
+
+    script = _script_directory()
+    heads = set(script.get_heads())
+    with engine.begin() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+        if not current and settings.db_schema == "create" and not inspect(connection).get_table_names():
+            _create_schema(connection, script)
+            current = heads
+    if current != heads:
+        if not current:
+            raise SchemaError(
+                "Database has tables but no Alembic revision; stamp it with the revision its "
+                "schema matches (alembic stamp <revision>), then run: alembic upgrade head"
+            )
+        raise SchemaError(
+            f"Database schema is at {', '.join(sorted(current))}, code expects "
+            f"{', '.join(sorted(heads))}; run: alembic upgrade head"
+        )
+    # Connections must not be shared with processes forked after this
+    engine.dispose()
+    state.schema_checked = True
+
+
+# ──────────────────────────────────────────────────
+# Warm-up and readiness
+# ──────────────────────────────────────────────────
+async def warm_up() -> None:
+    """Fill the pools so the first requests do not pay for connecting"""
+    from .database import async_engine, engine
+
+    async def ping() -> None:
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    # Concurrent checkouts, so each ping opens its own connection
+    await asyncio.gather(*(ping() for _ in range(max(settings.db_warmup_connections, 1))))
+    await asyncio.to_thread(_ping_sync, engine)
+
+
+def _ping_sync(engine) -> None:
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+async def readiness() -> List[str]:
+    """Reasons this worker should not receive traffic; empty when ready"""
+    from .database import async_engine
+
+    problems = []
+    if state.draining:
+        problems.append("draining")
+    elif not state.ready:
+        problems.append("starting")
+    try:
+        async with async_engine.connect() as connection:
+            await asyncio.wait_for(connection.execute(text("SELECT 1")), READY_TIMEOUT)
+    except Exception as exc:
+        problems.append(f"database: {exc.__class__.__name__}")
+    return problems
+
+
+# ──────────────────────────────────────────────────
+# Drain
+# ──────────────────────────────────────────────────
+def install_drain_handler() -> None:
+    """Delay the server's own SIGTERM handling by ``SHUTDOWN_DRAIN_SECONDS``.
+
+    Call from startup, after the server has installed its handlers; a second
+    SIGTERM during the drain stops at once.
+    """
+    if settings.shutdown_drain_seconds <= 0 or threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        return
+    loop = asyncio.get_running_loop()
+
+    def on_sigterm(sig, frame) -> None:
+        if state.draining:
+            previous(sig, frame)
+            return
+        state.draining = True
+        logger.info("SIGTERM: draining for %ss before shutdown", settings.shutdown_drain_seconds)
+        loop.call_soon_threadsafe(loop.call_later, settings.shutdown_drain_seconds, previous, sig, None)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
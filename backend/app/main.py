@@ -1,28 +1,96 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+
+from . import lifecycle, realtime
+from .admission import AdmissionMiddleware, limiter as rate_limiter
+from .blobs import run_collector
+from .guests import run_sweeper
+from .routes import blobs, render, users, notes
+from .core.config import settings
+from .core.security import password_pool
+from .notecache import cache as note_cache
+from .render_jobs import queue as render_queue, render_pool
+from .metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, render_latest
+from .responses import CompressionMiddleware
+from .writeback import buffer as write_buffer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Verify the schema (no-op if the launcher already did, before forking) and fill the pools
+    lifecycle.prepare_database()
+    await lifecycle.warm_up()
+    sweeper = asyncio.create_task(run_sweeper()) if settings.guest_sweep_interval > 0 else None
+    collector = asyncio.create_task(run_collector()) if settings.blob_gc_interval > 0 else None
+    write_buffer.start()
+    await realtime.broker.start()
+    await note_cache.start()
+    lifecycle.install_drain_handler()
+    lifecycle.state.ready = True
+    yield
+    lifecycle.state.ready = False
+    await realtime.broker.stop()
+    for task in (sweeper, collector):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await write_buffer.stop()
+    await note_cache.stop()
+    await render_queue.stop()
+    await rate_limiter.stop()
+    password_pool.shutdown()
+    render_pool.shutdown()
+
+
+def create_app() -> FastAPI:
+    """Build the ASGI app; no I/O happens until its lifespan starts"""
+    app = FastAPI(title="CleverPad API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
-from .database import Base, engine
-from .routes import users, notes
+    @app.get("/")
+    def root():
+        return {"message": "Welcome to the CleverPad API!"}
 
-# Create tables at startup (simple projects only; for production use Alembic migrations)
-Base.metadata.create_all(bind=engine)
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
 
-app = FastAPI(title="CleverPad API")
+    @app.get("/healthz", include_in_schema=False)
+    async def healthz():
+        """Liveness: the process is serving requests"""
+        return {"status": "ok"}
 
+    @app.get("/readyz", include_in_schema=False)
+    async def readyz():
+        """Readiness: started, not draining, and the database answers"""
+        problems = await lifecycle.readiness()
+        if problems:
+            return ORJSONResponse({"status": "unavailable", "problems": problems}, status_code=503)
+        return {"status": "ready"}
 
-@app.get("/")
-def root():
-    return {"message": "Welcome to the CleverPad API!"}
+    # Inside CORS, so refusals still carry its headers and preflights are never limited
+    app.add_middleware(AdmissionMiddleware)
+    # CORS – allow your React dev server
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.response_compression_min_bytes)
+    # Outermost, so latency covers every other middleware
+    app.add_middleware(MetricsMiddleware)
 
+    app.include_router(users.router)
+    app.include_router(notes.router)
+    app.include_router(blobs.router)
+    app.include_router(render.router)
+    return app
 
-# CORS – allow your React dev server
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-app.include_router(users.router)
-app.include_router(notes.router)
+app = create_app()
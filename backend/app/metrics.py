@@ -0,0 +1,273 @@
+"""Prometheus metrics for the API.
+
+* request latency per route template (``/notes/{note_id}``, never raw paths)
+* SQL statements and DB time per request, from engine cursor events
+* connection-pool gauges, plus how long checkouts wait for a connection
+* what the guest-session sweeper and the blob garbage collector reclaim
+* how many note saves the write-behind buffer coalesces per database write
+* open change-push connections and the events fanned out to them
+* note cache hits, misses and invalidations
+* render jobs queued, their render time per format, and artifact cache hits
+* requests in flight, refused by a client's rate limit, or shed under overload
+
+Everything is exported in the text format at ``/metrics``. With several
+workers, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory writable by
+all of them (``app.serve`` requires it): counters and histograms are then
+summed across workers, live gauges too, while the pool gauges are those of the
+worker that answers the scrape.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUEST_LATENCY = Histogram(
+    "cleverpad_http_request_duration_seconds",
+    "Time to produce the full response, by route template",
+    ["method", "route", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "cleverpad_http_request_db_queries",
+    "SQL statements executed while serving one request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+REQUEST_DB_TIME = Histogram(
+    "cleverpad_http_request_db_seconds",
+    "Time spent in SQL statements while serving one request",
+    ["method", "route"],
+)
+DB_QUERIES = Counter("cleverpad_db_queries_total", "SQL statements executed", ["engine"])
+POOL_WAIT = Histogram(
+    "cleverpad_db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+GUEST_NOTES_SWEPT = Counter("cleverpad_guest_notes_swept_total", "Notes of expired guest sessions deleted")
+GUEST_SESSIONS_SWEPT = Counter("cleverpad_guest_sessions_swept_total", "Expired guest sessions deleted")
+GUEST_SWEEP_DURATION = Histogram(
+    "cleverpad_guest_sweep_duration_seconds",
+    "Time taken by one guest-session sweep",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+GUEST_SWEEP_FAILURES = Counter("cleverpad_guest_sweep_failures_total", "Guest-session sweeps that raised")
+GUEST_SWEEP_LAST_SUCCESS = Gauge(
+    "cleverpad_guest_sweep_last_success_timestamp_seconds",
+    "When a guest-session sweep last completed",
+    multiprocess_mode="max",
+)
+BLOBS_COLLECTED = Counter("cleverpad_blobs_collected_total", "Unreferenced blobs deleted by garbage collection")
+BLOB_BYTES_COLLECTED = Counter("cleverpad_blob_bytes_collected_total", "Bytes of the unreferenced blobs deleted")
+WRITEBACK_SAVES = Counter("cleverpad_writeback_saves_total", "Note saves accepted into the write-behind buffer")
+WRITEBACK_ROWS = Counter("cleverpad_writeback_rows_written_total", "Buffered notes written to the database")
+WRITEBACK_RATIO = Gauge(
+    "cleverpad_writeback_coalescing_ratio",
+    "Buffered saves per database write, since startup",
+    multiprocess_mode="liveall",
+)
+WRITEBACK_CONFLICTS = Counter(
+    "cleverpad_writeback_conflicts_total",
+    "Buffered notes whose stored note changed (the save is re-based onto it) or was deleted (the save is dropped)",
+    ["resolution"],
+)
+WRITEBACK_FAILURES = Counter("cleverpad_writeback_flush_failures_total", "Flushes that raised and were retried")
+WRITEBACK_PENDING = Gauge(
+    "cleverpad_writeback_pending_notes", "Notes with buffered, unwritten saves", multiprocess_mode="livesum"
+)
+WRITEBACK_FLUSH_DURATION = Histogram("cleverpad_writeback_flush_seconds", "Time taken by one buffer flush")
+REALTIME_CONNECTIONS = Gauge(
+    "cleverpad_realtime_connections", "Open change-push connections", ["transport"], multiprocess_mode="livesum"
+)
+REALTIME_EVENTS = Counter("cleverpad_realtime_events_total", "Note change events delivered to subscribers")
+REALTIME_OVERFLOWS = Counter(
+    "cleverpad_realtime_overflows_total", "Times a slow subscriber's backlog was replaced by a resync"
+)
+NOTE_CACHE_REQUESTS = Counter(
+    "cleverpad_note_cache_requests_total",
+    "Note cache lookups by kind and result (hit, miss, coalesced onto another load, error)",
+    ["kind", "result"],
+)
+NOTE_CACHE_INVALIDATIONS = Counter(
+    "cleverpad_note_cache_invalidations_total", "Note and owner generations replaced after writes"
+)
+NOTE_CACHE_BYTES = Gauge(
+    "cleverpad_note_cache_bytes", "Bytes held by the in-process note cache", multiprocess_mode="livesum"
+)
+RENDER_QUEUE_DEPTH = Gauge(
+    "cleverpad_render_jobs_pending", "Render jobs queued or running in the process pool", multiprocess_mode="livesum"
+)
+RENDER_DURATION = Histogram(
+    "cleverpad_render_duration_seconds",
+    "Time a worker spent rendering one note, by format",
+    ["format"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RENDER_CACHE = Counter(
+    "cleverpad_render_cache_total",
+    "Render requests by artifact cache result (hit, miss, coalesced onto a running render)",
+    ["result"],
+)
+RENDER_FAILURES = Counter("cleverpad_render_failures_total", "Render jobs that raised")
+RATE_LIMITED = Counter(
+    "cleverpad_rate_limited_total", "Requests refused with 429 by a client's token bucket", ["bucket"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "cleverpad_http_requests_in_flight", "Requests admitted and not yet finished", multiprocess_mode="livesum"
+)
+REQUESTS_SHED = Counter(
+    "cleverpad_http_requests_shed_total", "Requests refused with 503 because the worker was at its concurrency limit"
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+# ──────────────────────────────────────────────────
+# Connection pools
+# ──────────────────────────────────────────────────
+class _TimedCheckoutMixin:
+    """Times ``_do_get``, the step of a checkout that blocks when the pool is exhausted"""
+
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.labels(self.metrics_label).observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    metrics_label = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+class _PoolCollector:
+    """Reads pool occupancy at scrape time, so checkouts pay nothing for it"""
+
+    def __init__(self):
+        self.engines = {}
+
+    def collect(self):
+        checked_out = GaugeMetricFamily(
+            "cleverpad_db_pool_checked_out", "Connections currently checked out", labels=["engine"]
+        )
+        overflow = GaugeMetricFamily(
+            "cleverpad_db_pool_overflow", "Connections open beyond pool_size", labels=["engine"]
+        )
+        size = GaugeMetricFamily("cleverpad_db_pool_size", "Configured pool_size", labels=["engine"])
+        for label, engine in self.engines.items():
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                continue
+            checked_out.add_metric([label], pool.checkedout())
+            overflow.add_metric([label], max(pool.overflow(), 0))
+            size.add_metric([label], pool.size())
+        return [checked_out, overflow, size]
+
+
+_pool_collector = _PoolCollector()
+REGISTRY.register(_pool_collector)
+
+
+def instrument_engine(engine: Engine, label: str) -> None:
+    """Count statements and DB time for ``engine`` and expose its pool gauges"""
+    _pool_collector.engines[label] = engine
+    queries = DB_QUERIES.labels(label)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"]
+        queries.inc()
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+
+# ──────────────────────────────────────────────────
+# Requests
+# ──────────────────────────────────────────────────
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and SQL accounting per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            template = getattr(route, "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, template, str(status_code)).observe(elapsed)
+            REQUEST_QUERIES.labels(method, template).observe(stats.queries)
+            REQUEST_DB_TIME.labels(method, template).observe(stats.db_seconds)
+
+
+def render_latest() -> bytes:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY)
+    # Every worker's samples from the shared directory, plus this worker's pools
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_pool_collector)
+    return generate_latest(registry)
+
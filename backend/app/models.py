@@ -1,7 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import BigInteger, Column, DateTime, Integer, LargeBinary, String, Text, ForeignKey, Index, desc, func, text
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.sql.functions import FunctionElement
 from sqlalchemy.orm import relationship
 
+from .core import compression
 from .database import Base
+from .utils import note_text_fields
 
 
 class User(Base):
@@ -14,14 +20,146 @@ class User(Base):
     notes = relationship("Note", back_populates="owner", cascade="all, delete")
 
 
+class _NoteContentExpression(FunctionElement):
+    """``Note.content`` in SQL, where compressed bodies cannot be decoded; refuses to compile"""
+    inherit_cache = True
+    type = Text()
+
+
+@compiles(_NoteContentExpression)
+def _compile_note_content(element, compiler, **kw):
+    raise CompileError(
+        "Note.content cannot be used in SQL, since compressed bodies live in content_z; "
+        "select Note._content and Note.content_z and decode with core.compression"
+    )
+
+
+def _plain_content_default(context):
+    # A None body is otherwise replaced by "", so compressed rows would not read NULL
+    return "" if context.get_current_parameters().get("content_z") is None else None
+
+
 class Note(Base):
     __tablename__ = "notes"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, default="Untitled")
-    content = Column(Text, default="")
+    # The body lives in exactly one of these; use ``content`` to read or write it
+    _content = Column("content", Text, default=_plain_content_default)
+    content_z = Column(LargeBinary, nullable=True)  # Compressed body (see core.compression)
+    # Derived from the body whenever ``content`` is set, so reads never parse HTML
+    plaintext = Column(Text, nullable=True)
+    preview = Column(String, nullable=True)
+    word_count = Column(Integer, nullable=False, default=0, server_default="0")
+    char_count = Column(Integer, nullable=False, default=0, server_default="0")
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the HTML body
     owner_id = Column(
         Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True  # Allow null for guest notes
     )
     session_id = Column(String, nullable=True)  # For guest session identification
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped on every edit
+    revision = Column(BigInteger, nullable=False, default=0, server_default="0")  # Change-feed position
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     owner = relationship("User", back_populates="notes")
+
+    @hybrid_property
+    def content(self):
+        if self.content_z is not None:
+            return compression.decompress(self.content_z)
+        return self._content
+
+    @content.inplace.setter
+    def _content_setter(self, value):
+        self._content, self.content_z = compression.encode(value)
+        for name, derived in note_text_fields(value).items():
+            setattr(self, name, derived)
+
+    @content.inplace.expression
+    @classmethod
+    def _content_expression(cls):
+        # Not the plain column: compressed rows would silently read NULL there
+        return _NoteContentExpression()
+
+    @staticmethod
+    def stored_content(value) -> dict:
+        """Column values for a body and the fields derived from it, for Core/bulk
+        inserts that bypass the setter"""
+        text, blob = compression.encode(value)
+        return {"_content": text, "content_z": blob, **note_text_fields(value)}
+
+    __table_args__ = (
+        # Note lists: owner_id = ? / session_id = ? AND owner_id IS NULL, ORDER BY id DESC
+        Index("ix_notes_owner_id_desc", "owner_id", desc("id")),
+        Index(
+            "ix_notes_guest_session_id_desc",
+            "session_id",
+            desc("id"),
+            postgresql_where=text("owner_id IS NULL"),
+            sqlite_where=text("owner_id IS NULL"),
+        ),
+        Index("ix_notes_owner_revision", "owner_id", "revision"),
+        Index("ix_notes_session_revision", "session_id", "revision"),
+    )
+    # Fetch created_at/updated_at in the INSERT/UPDATE itself (RETURNING), so a saved
+    # note needs no refresh after commit, when a concurrent delete may have removed it
+    __mapper_args__ = {"eager_defaults": True}
+
+
+class SyncScope(Base):
+    """Change counter for one user ("user:<id>") or guest session ("session:<id>")"""
+    __tablename__ = "sync_scopes"
+    scope = Column(String, primary_key=True)
+    revision = Column(BigInteger, nullable=False, default=0)
+
+
+class NoteTombstone(Base):
+    """Records a deleted note so the change feed can report it"""
+    __tablename__ = "note_tombstones"
+    id = Column(Integer, primary_key=True, index=True)
+    note_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    session_id = Column(String, nullable=True)
+    revision = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index("ix_note_tombstones_owner_revision", "owner_id", "revision"),
+        Index("ix_note_tombstones_session_revision", "session_id", "revision"),
+    )
+
+
+class GuestSession(Base):
+    """A guest session id issued by /auth/guest; idle sessions expire with their notes"""
+    __tablename__ = "guest_sessions"
+    id = Column(String, primary_key=True)  # The X-Session-ID value
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class NoteRevision(Base):
+    """An earlier version of a note: a full snapshot or a reverse delta (see ``revisions``)"""
+    __tablename__ = "note_revisions"
+    id = Column(Integer, primary_key=True)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    title = Column(String, nullable=True)
+    # Snapshots only: the body, plain or compressed (see core.compression)
+    content = Column(Text, nullable=True)
+    content_z = Column(LargeBinary, nullable=True)
+    # Deltas only: JSON ops turning the next newer body into this one; NULL for snapshots
+    delta = Column(Text, nullable=True)
+    saved_at = Column(DateTime(timezone=True), nullable=False)  # When this version was written
+
+    __table_args__ = (Index("ix_note_revisions_note_version", "note_id", "version", unique=True),)
+
+
+class Blob(Base):
+    """An image moved out of a note body, keyed by the SHA-256 of its bytes (see ``blobs``)"""
+    __tablename__ = "blobs"
+    digest = Column(String(64), primary_key=True)
+    media_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=True)  # NULL when the bytes live under BLOB_DIR
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Refreshed when a note write references the blob; collection spares recently used ones
+    last_used_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
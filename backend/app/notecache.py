@@ -0,0 +1,242 @@
+"""Read-through cache of note bodies and note lists.
+
+GET /notes/{id}, GET /notes/ and GET /notes/summary keep their serialized
+JSON in a cache, so a hit is answered without touching the database. The
+default backend is a byte-bounded LRU in each process;
+``NOTE_CACHE_BACKEND=redis`` (``pip install redis``) shares one cache
+between workers.
+
+Keys embed generation tokens, one per owner scope and one per note. After
+every commit, the note events ``crud`` queues (see ``realtime``) replace the
+tokens of the scopes and notes they touch. Stale entries simply become
+unreachable, and a read that raced a write can only store its result under
+the superseded token. With the Postgres change channel, other workers' local
+caches are invalidated as its events arrive. Entries also expire after
+``NOTE_CACHE_TTL``, which bounds staleness from writes made outside the API.
+
+Concurrent misses of one key within a process share a single load.
+"""
+import asyncio
+import itertools
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import crud, realtime
+from .core.cache import SizedLRUCache, TTLCache
+from .core.config import settings
+from .metrics import NOTE_CACHE_BYTES, NOTE_CACHE_INVALIDATIONS, NOTE_CACHE_REQUESTS
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional dependency
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+ALL = "all"  # generation of every key, replaced when events may have been lost
+REDIS_PREFIX = "cleverpad:cache:"
+MAX_GENERATIONS = 100_000
+
+Entry = Tuple[int, bytes]  # (note version or scope revision, JSON body)
+Loader = Callable[[], Awaitable[Optional[Entry]]]
+_RETRY = object()  # a shared load failed; waiters load for themselves
+
+
+def _pack(entry: Entry) -> bytes:
+    return b"%d\n" % entry[0] + entry[1]
+
+
+def _unpack(value: bytes) -> Entry:
+    tag, _, body = value.partition(b"\n")
+    return int(tag), body
+
+
+class LocalBackend:
+    def __init__(self, max_bytes: int, ttl: float):
+        self._entries = SizedLRUCache(max_bytes=max_bytes, ttl=ttl)
+        # Outlive the entries; a forgotten generation just gets a fresh token
+        self._generations = TTLCache(maxsize=MAX_GENERATIONS, ttl=2 * ttl)
+        self._tokens = itertools.count(1)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self._entries.set(key, value)
+        NOTE_CACHE_BYTES.set(self._entries.nbytes)
+
+    async def generations(self, names: List[str]) -> List[str]:
+        tokens = []
+        for name in names:
+            token = self._generations.get(name)
+            if token is None:
+                token = str(next(self._tokens))
+                self._generations.set(name, token)
+            tokens.append(token)
+        return tokens
+
+    def bump(self, names: Iterable[str]) -> None:
+        for name in names:
+            self._generations.set(name, str(next(self._tokens)))
+
+    async def close(self) -> None:
+        self._entries.clear()
+        NOTE_CACHE_BYTES.set(0)
+
+
+class RedisBackend:
+    def __init__(self, url: str, ttl: float):
+        if redis_asyncio is None:
+            raise RuntimeError("NOTE_CACHE_BACKEND=redis requires the redis package")
+        self._redis = redis_asyncio.from_url(url)
+        self.ttl = max(int(ttl), 1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(REDIS_PREFIX + key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self._redis.set(REDIS_PREFIX + key, value, ex=self.ttl)
+
+    async def generations(self, names: List[str]) -> List[str]:
+        keys = [f"{REDIS_PREFIX}gen:{name}" for name in names]
+        tokens = await self._redis.mget(keys)
+        missing = [key for key, token in zip(keys, tokens) if token is None]
+        if missing:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in missing:
+                    pipe.set(key, uuid.uuid4().hex, nx=True, ex=2 * self.ttl)
+                await pipe.execute()
+            tokens = await self._redis.mget(keys)
+        return [token.decode() if token is not None else uuid.uuid4().hex for token in tokens]
+
+    async def _bump(self, names: List[str]) -> None:
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for name in names:
+                    pipe.set(f"{REDIS_PREFIX}gen:{name}", uuid.uuid4().hex, ex=2 * self.ttl)
+                await pipe.execute()
+        except Exception:
+            logger.exception("Note cache invalidation failed; entries expire in %ss", self.ttl)
+
+    def bump(self, names: Iterable[str]) -> None:
+        """Schedule the generation update on the event loop (commits may run in a thread)"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            task = self._loop.create_task(self._bump(list(names)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            asyncio.run_coroutine_threadsafe(self._bump(list(names)), self._loop)
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    async def close(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._loop = None
+        await self._redis.aclose()
+
+
+class NoteCache:
+    def __init__(self, backend):
+        self.backend = backend  # None when caching is off
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def note(self, owner: dict, note_id: int, load: Loader) -> Optional[Entry]:
+        """(version, NoteOut JSON) of one of ``owner``'s notes, or None if there is none"""
+        key = f"{crud._scope_key(**owner)}:{note_id}"
+        return await self._fetch("note", key, [f"note:{note_id}"], load)
+
+    async def page(self, owner: dict, name: str, load: Loader) -> Optional[Entry]:
+        """(scope revision, JSON body) of a list-like view ``name`` of ``owner``'s notes"""
+        scope_key = crud._scope_key(**owner)
+        return await self._fetch(name.partition(":")[0], f"{scope_key}:{name}", [f"scope:{scope_key}"], load)
+
+    async def _fetch(self, kind: str, key: str, generations: List[str], load: Loader) -> Optional[Entry]:
+        if self.backend is None:
+            return await load()
+        try:
+            tokens = await self.backend.generations([ALL, *generations])
+            key = f"{kind}:{key}:{'.'.join(tokens)}"
+            cached = await self.backend.get(key)
+        except Exception:
+            logger.exception("Note cache lookup failed")
+            NOTE_CACHE_REQUESTS.labels(kind, "error").inc()
+            return await load()
+        if cached is not None:
+            NOTE_CACHE_REQUESTS.labels(kind, "hit").inc()
+            return _unpack(cached)
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            NOTE_CACHE_REQUESTS.labels(kind, "coalesced").inc()
+            entry = await asyncio.shield(flight)
+            return await load() if entry is _RETRY else entry
+        NOTE_CACHE_REQUESTS.labels(kind, "miss").inc()
+        flight = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            entry = await load()
+        except BaseException:
+            flight.set_result(_RETRY)
+            raise
+        else:
+            flight.set_result(entry)
+        finally:
+            del self._inflight[key]
+        if entry is not None:
+            try:
+                await self.backend.set(key, _pack(entry))
+            except Exception:
+                logger.exception("Note cache store failed")
+        return entry
+
+    def invalidate(self, events: realtime.Events) -> None:
+        """Retire the generations of every scope and note touched by ``events``"""
+        if self.backend is None:
+            return
+        names = set()
+        for scope_key, note_event in events:
+            if scope_key == realtime.ALL_SCOPES:
+                names.add(ALL)
+                continue
+            names.add(f"scope:{scope_key}")
+            if "id" in note_event:
+                names.add(f"note:{note_event['id']}")
+        NOTE_CACHE_INVALIDATIONS.inc(len(names))
+        self.backend.bump(names)
+
+    async def start(self) -> None:
+        if isinstance(self.backend, RedisBackend):
+            await self.backend.start()
+
+    async def stop(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+
+def _backend():
+    if settings.note_cache_backend == "redis":
+        return RedisBackend(settings.note_cache_redis_url, settings.note_cache_ttl)
+    if settings.note_cache_backend == "local":
+        return LocalBackend(settings.note_cache_max_bytes, settings.note_cache_ttl)
+    return None
+
+
+cache = NoteCache(_backend())
+realtime.on_commit(cache.invalidate)
+if isinstance(cache.backend, LocalBackend) and realtime.broker.backend == "postgres":
+    # Writes committed by other workers reach this process's cache through LISTEN
+    realtime.broker.add_listener(cache.invalidate)
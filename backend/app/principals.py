@@ -0,0 +1,47 @@
+"""Lazy resolution of the authenticated caller.
+
+The JWT is still decoded on every request (it is cheap and checks the
+signature), and its ``sub`` claim is all that note routes need, so a principal
+starts out as just the user id and the users table is not touched. Routes that
+need the profile await ``Principal.load()``, which reads the row through the
+request's own session. Nothing is cached across requests, so every worker sees
+a changed user immediately.
+"""
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+
+class Principal:
+    """The caller's user id; name and email are available after ``load``"""
+
+    def __init__(self, user_id: int, db: AsyncSession):
+        self.id = user_id
+        self._db = db
+        self._row = None
+
+    async def load(self) -> Optional["Principal"]:
+        """Read the user's profile once per request; None if no such user"""
+        if self._row is None:
+            self._row = (
+                await self._db.execute(
+                    select(models.User.name, models.User.email).where(models.User.id == self.id)
+                )
+            ).first()
+        return self if self._row is not None else None
+
+    def _profile(self):
+        if self._row is None:
+            raise RuntimeError("await Principal.load() before reading fields other than id")
+        return self._row
+
+    @property
+    def name(self) -> str:
+        return self._profile().name
+
+    @property
+    def email(self) -> str:
+        return self._profile().email
@@ -0,0 +1,252 @@
+"""Change push: note events fanned out to WebSocket/SSE subscribers.
+
+``crud`` queues an event on the session for every note it creates, updates or
+deletes; nothing is sent unless that transaction commits. Subscribers are
+keyed by change-feed scope ("user:<id>" / "session:<id>") and each holds a
+small bounded queue, so an idle connection costs one coroutine and no
+database connection.
+
+With the "local" backend events are delivered in-process after commit. With
+"postgres" they are sent with ``pg_notify`` inside the committing transaction
+and every worker's LISTEN connection delivers them to its own subscribers, so
+all workers see every change exactly when it becomes visible.
+
+Events only carry ids, versions and revisions; clients fetch the data with
+``GET /notes/changes?since=``. Other modules can watch the same events:
+``on_commit`` listeners run in the committing process, broker listeners
+wherever events are delivered.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from .core.config import settings
+from .metrics import REALTIME_CONNECTIONS, REALTIME_EVENTS, REALTIME_OVERFLOWS
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cleverpad_note_events"
+EVENTS_KEY = "realtime_events"
+# NOTIFY payloads must stay under 8000 bytes
+MAX_PAYLOAD_BYTES = 7000
+RECONNECT_DELAY = 2
+# Scope key of the "resync" event listeners get when events may have been lost
+ALL_SCOPES = "*"
+
+Events = List[Tuple[str, dict]]
+
+
+def _backend() -> str:
+    if settings.realtime_backend != "auto":
+        return settings.realtime_backend
+    return "postgres" if settings.database_url.startswith("postgres") else "local"
+
+
+class Subscription:
+    def __init__(self, scope_key: str, transport: str, maxsize: int):
+        self.scope_key = scope_key
+        self.transport = transport
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind to catch up event by event: have it resync from the change feed
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+            REALTIME_OVERFLOWS.inc()
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """The next event, or None after ``timeout`` seconds (time for a heartbeat)"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    def __init__(self, backend: str, queue_size: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._event_listeners: List[Callable[[Events], None]] = []
+
+    def add_listener(self, listener: Callable[[Events], None]) -> None:
+        """Also hand every batch of delivered events to ``listener`` (on the event loop)"""
+        self._event_listeners.append(listener)
+
+    def subscribe(self, scope_key: str, transport: str) -> Subscription:
+        subscription = Subscription(scope_key, transport, self.queue_size)
+        self._subscribers[scope_key].add(subscription)
+        REALTIME_CONNECTIONS.labels(transport).inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.scope_key)
+        if subscribers is not None and subscription in subscribers:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.scope_key]
+            REALTIME_CONNECTIONS.labels(subscription.transport).dec()
+
+    def _deliver(self, events: Events) -> None:
+        """Fan events out to local subscribers; runs on the event loop"""
+        for listener in self._event_listeners:
+            listener(events)
+        for scope_key, note_event in events:
+            for subscription in self._subscribers.get(scope_key, ()):
+                subscription.put(note_event)
+                REALTIME_EVENTS.inc()
+
+    def _broadcast(self, note_event: dict) -> None:
+        for listener in self._event_listeners:
+            listener([(ALL_SCOPES, note_event)])
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                subscription.put(note_event)
+
+    def publish(self, events: Events) -> None:
+        """Deliver committed events locally, from any thread"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._deliver(events)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, events)
+
+    # ──────────────────────────────────────────────
+    # Postgres LISTEN
+    # ──────────────────────────────────────────────
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed %s payload", CHANNEL)
+            return
+        self._deliver([(message["scope"], note_event) for note_event in message["events"]])
+
+    async def _listen(self) -> None:
+        import asyncpg
+
+        dsn = make_url(settings.database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        connected_before = False
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn)
+            except Exception:
+                logger.exception("Cannot open the %s listener; retrying", CHANNEL)
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            closed = self._loop.create_future()
+            connection.add_termination_listener(lambda _: closed.done() or closed.set_result(None))
+            try:
+                await connection.add_listener(CHANNEL, self._on_notify)
+                if connected_before:
+                    # Notifications sent while we were away are lost
+                    self._broadcast({"type": "resync"})
+                connected_before = True
+                while not closed.done():
+                    try:
+                        await asyncio.wait_for(asyncio.shield(closed), settings.realtime_heartbeat)
+                    except asyncio.TimeoutError:
+                        await connection.fetchval("SELECT 1", timeout=10)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Lost the %s listener; reconnecting", CHANNEL)
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self.backend == "postgres" and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self._loop = None
+
+
+broker = Broker(backend=_backend(), queue_size=settings.realtime_queue_size)
+
+
+# ──────────────────────────────────────────────────
+# Session hooks
+# ──────────────────────────────────────────────────
+_commit_listeners: List[Callable[[Events], None]] = []
+
+
+def on_commit(listener: Callable[[Events], None]) -> None:
+    """Call ``listener`` with the note events of every commit made in this process"""
+    _commit_listeners.append(listener)
+
+
+def queue_event(db: Session, scope_key: str, note_event: dict) -> None:
+    """Publish ``note_event`` to the scope's subscribers once ``db`` commits"""
+    db.info.setdefault(EVENTS_KEY, []).append((scope_key, note_event))
+
+
+def _notify_payloads(events: Events) -> List[str]:
+    """Group events by scope into NOTIFY payloads under the size limit"""
+    by_scope: Dict[str, List[dict]] = defaultdict(list)
+    for scope_key, note_event in events:
+        by_scope[scope_key].append(note_event)
+    payloads = []
+    for scope_key, scope_events in by_scope.items():
+        chunk, size = [], 0
+        for note_event in scope_events:
+            encoded = len(json.dumps(note_event))
+            if chunk and size + encoded > MAX_PAYLOAD_BYTES:
+                payloads.append(json.dumps({"scope": scope_key, "events": chunk}))
+                chunk, size = [], 0
+            chunk.append(note_event)
+            size += encoded + 1
+        payloads.append(json.dumps({"scope": scope_key, "events": chunk}))
+    return payloads
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_before_commit(session: Session) -> None:
+    if broker.backend != "postgres" or not session.info.get(EVENTS_KEY):
+        return
+    # NOTIFY is transactional: listeners hear it exactly when the commit lands
+    for payload in _notify_payloads(session.info[EVENTS_KEY]):
+        session.execute(select(func.pg_notify(CHANNEL, payload)))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    events = session.info.pop(EVENTS_KEY, None)
+    if not events:
+        return
+    for listener in _commit_listeners:
+        listener(events)
+    if broker.backend != "postgres":
+        broker.publish(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(EVENTS_KEY, None)
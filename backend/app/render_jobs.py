@@ -0,0 +1,172 @@
+"""Server-side rendering of notes to PDF or Markdown, as background jobs.
+
+Rendering is CPU-bound, so it runs in a process pool (``RENDER_WORKERS``)
+and never on the event loop. ``POST /notes/{id}/render`` answers 202 with a
+job at once; ``GET /render/jobs/{id}`` reports its status and
+``/render/jobs/{id}/artifact`` serves the result. A batch of notes becomes
+one job per note, rendered in parallel.
+
+Artifacts are cached by a hash of the renderer version, format, options and
+note title and body, so re-rendering an unchanged note is free, and identical
+renders already running are joined rather than repeated. Once
+``RENDER_MAX_PENDING`` renders are in flight, new ones are refused with 503.
+
+Jobs and artifacts live in the process that accepted the job: run one worker,
+or route ``/render`` requests back to it (sticky sessions).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import blobs, crud, crud_async, renderers
+from .core.cache import SizedLRUCache, TTLCache
+from .core.config import settings
+from .core.executors import BoundedProcessPool
+from .export import note_filename
+from .metrics import RENDER_CACHE, RENDER_DURATION, RENDER_FAILURES, RENDER_QUEUE_DEPTH
+from .writeback import buffer as write_buffer
+
+logger = logging.getLogger(__name__)
+
+MAX_JOBS = 100_000
+RETRY_AFTER = 5
+
+render_pool = BoundedProcessPool(
+    "rendering",
+    max_workers=settings.render_workers,
+    max_pending=settings.render_max_pending,
+    retry_after=RETRY_AFTER,
+)
+
+
+@dataclass
+class RenderJob:
+    id: str
+    scope_key: str
+    note_id: int
+    format: str
+    key: str  # artifact cache key
+    filename: str
+
+
+def artifact_key(render_format: str, options: dict, title: Optional[str], content: Optional[str]) -> str:
+    source = json.dumps([renderers.RENDERER_VERSION, render_format, options, title or "", content or ""])
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+class RenderQueue:
+    def __init__(self, max_bytes: int, ttl: float):
+        self._jobs = TTLCache(maxsize=MAX_JOBS, ttl=ttl)
+        self._artifacts = SizedLRUCache(max_bytes=max_bytes, ttl=ttl)
+        self._failures = TTLCache(maxsize=MAX_JOBS, ttl=ttl)
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def submit(
+        self, db: AsyncSession, owner: dict, note_ids: List[int], render_format: str, options: dict
+    ) -> List[RenderJob]:
+        """Start rendering ``owner``'s notes; 404 if any is missing, 503 if too many renders are running"""
+        await write_buffer.flush(note_ids)
+        notes = {note.id: note for note in await crud_async.get_notes_by_ids(db, note_ids, **owner)}
+        if len(notes) < len(set(note_ids)):
+            raise HTTPException(status_code=404, detail="Note not found")
+
+        scope_key = crud._scope_key(**owner)
+        jobs, misses, results = [], {}, []
+        for note_id in note_ids:
+            note = notes[note_id]
+            key = artifact_key(render_format, options, note.title, note.content)
+            if self._artifacts.get(key) is not None:
+                results.append("hit")
+            elif key in self._inflight or key in misses:
+                results.append("coalesced")
+            else:
+                results.append("miss")
+                misses[key] = note
+            jobs.append(RenderJob(
+                id=uuid.uuid4().hex,
+                scope_key=scope_key,
+                note_id=note_id,
+                format=render_format,
+                key=key,
+                filename=note_filename(note_id, note.title, render_format),
+            ))
+        if misses and len(self._inflight) + len(misses) > render_pool.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy (rendering), please retry",
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+
+        for result in results:
+            RENDER_CACHE.labels(result).inc()
+
+        images: renderers.Images = {}
+        if render_format == "pdf":
+            digests = set().union(*(blobs.referenced_digests(note.content) for note in misses.values()))
+            images = await crud_async.read_blobs(db, digests)
+        for key, note in misses.items():
+            note_images = {digest: images[digest] for digest in blobs.referenced_digests(note.content) if digest in images}
+            source = {"title": note.title, "content": note.content}
+            self._failures.pop(key)
+            self._inflight[key] = asyncio.create_task(self._render(key, render_format, source, options, note_images))
+        for job in jobs:
+            self._jobs.set(job.id, job)
+        return jobs
+
+    async def _render(self, key: str, render_format: str, source: dict, options: dict, images: renderers.Images) -> None:
+        RENDER_QUEUE_DEPTH.inc()
+        try:
+            data, seconds = await render_pool.run(renderers.render, source, render_format, options, images)
+            RENDER_DURATION.labels(render_format).observe(seconds)
+            if len(data) > self._artifacts.max_bytes:
+                self._failures.set(key, "Rendered file exceeds the render cache size")
+            else:
+                self._artifacts.set(key, data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Rendering a note to %s failed", render_format)
+            RENDER_FAILURES.inc()
+            self._failures.set(key, "Rendering failed")
+        finally:
+            RENDER_QUEUE_DEPTH.dec()
+            del self._inflight[key]
+
+    def get(self, job_id: str, owner: dict) -> Optional[RenderJob]:
+        """One of ``owner``'s jobs, or None"""
+        job = self._jobs.get(job_id)
+        if job is None or job.scope_key != crud._scope_key(**owner):
+            return None
+        return job
+
+    def status(self, job: RenderJob) -> dict:
+        """Job state: "pending", "done", "failed" or "expired" (artifact evicted)"""
+        state = {"id": job.id, "note_id": job.note_id, "format": job.format, "status": "expired"}
+        error = self._failures.get(job.key)
+        if job.key in self._inflight:
+            state["status"] = "pending"
+        elif error is not None:
+            state.update(status="failed", error=error)
+        elif self._artifacts.get(job.key) is not None:
+            state.update(status="done", artifact_url=f"/render/jobs/{job.id}/artifact")
+        return state
+
+    def artifact(self, job: RenderJob) -> Optional[bytes]:
+        return self._artifacts.get(job.key)
+
+    async def stop(self) -> None:
+        """Cancel renders still running; the pool itself is shut down separately"""
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+queue = RenderQueue(settings.render_cache_max_bytes, settings.render_ttl)
@@ -0,0 +1,217 @@
+"""Note renderers: editor HTML to Markdown or PDF.
+
+Pure functions of their arguments, so they can run in worker processes;
+this module must not import the database layer. Bump ``RENDERER_VERSION``
+whenever output changes, since cached artifacts are keyed by it.
+"""
+import base64
+import html
+import io
+import re
+import time
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+import html2text
+
+RENDERER_VERSION = 1
+MEDIA_TYPES = {"pdf": "application/pdf", "md": "text/markdown; charset=utf-8"}
+
+Images = Dict[str, Tuple[str, bytes]]  # blob digest -> (media type, bytes)
+
+_BLOB_DIGEST_RE = re.compile(r"/([0-9a-f]{64})$")
+
+
+# ──────────────────────────────────────────────────
+# Markdown
+# ──────────────────────────────────────────────────
+def markdown_converter() -> html2text.HTML2Text:
+    converter = html2text.HTML2Text()
+    converter.body_width = 0  # keep paragraphs on one line
+    return converter
+
+
+def note_to_markdown(title: Optional[str], content: Optional[str], converter=None) -> str:
+    converter = converter or markdown_converter()
+    return f"# {title or 'Untitled'}\n\n{converter.handle(content or '')}"
+
+
+# ──────────────────────────────────────────────────
+# PDF
+# ──────────────────────────────────────────────────
+_INLINE_TAGS = {
+    "b": "b", "strong": "b", "i": "i", "em": "i", "u": "u",
+    "s": "strike", "strike": "strike", "del": "strike", "sub": "sub", "sup": "super",
+}
+_BLOCK_TAGS = {"p", "div", "h1", "h2", "h3", "h4", "h5", "h6", "li", "blockquote", "pre", "tr"}
+
+
+class _PdfBuilder(HTMLParser):
+    """Turns editor HTML into reportlab flowables, one paragraph per block"""
+
+    def __init__(self, styles, images: Images, max_width: float, max_height: float):
+        super().__init__(convert_charrefs=True)
+        self.styles = styles
+        self.images = images
+        self.max_width = max_width
+        self.max_height = max_height
+        self.flowables: List = []
+        self._markup: List[str] = []
+        self._open: List[str] = []  # closing markup of open inline tags
+        self._blocks: List[str] = []
+        self._lists: List[List] = []  # [tag, counter] per open list
+        self._in_pre = 0
+
+    def _style(self):
+        block = self._blocks[-1] if self._blocks else "p"
+        if block in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            return self.styles[f"Heading{block[1]}"]
+        if block == "pre":
+            return self.styles["Code"]
+        if block == "blockquote":
+            return self.styles["Quote"]
+        return self.styles["BodyText"]
+
+    def _flush(self) -> None:
+        from reportlab.platypus import Paragraph, Preformatted
+
+        markup = "".join(self._markup) + "".join(reversed(self._open))
+        self._markup = list(self._open)  # inline tags left open carry into the next block
+        if not markup.strip() and not self._in_pre:
+            return
+        if self._in_pre:
+            self.flowables.append(Preformatted(html.unescape(re.sub(r"<[^>]+>", "", markup)), self._style()))
+            return
+        bullet = None
+        if self._blocks and self._blocks[-1] == "li" and self._lists:
+            tag, counter = self._lists[-1]
+            bullet = f"{counter}." if tag == "ol" else "•"
+        style = self._style()
+        if self._lists:
+            from reportlab.lib.styles import ParagraphStyle
+
+            indent = 14 * len(self._lists)
+            style = ParagraphStyle(f"{style.name}-list", parent=style, leftIndent=indent + 10, bulletIndent=indent)
+        try:
+            self.flowables.append(Paragraph(markup, style, bulletText=bullet))
+        except ValueError:
+            # Markup reportlab cannot parse: fall back to the plain text
+            text = html.escape(html.unescape(re.sub(r"<[^>]+>", "", markup)))
+            self.flowables.append(Paragraph(text, style, bulletText=bullet))
+
+    def _image(self, src: str) -> None:
+        from reportlab.lib.utils import ImageReader
+        from reportlab.platypus import Image, Paragraph
+
+        data = None
+        if src.startswith("data:image/") and ";base64," in src:
+            try:
+                data = base64.b64decode(src.partition(";base64,")[2])
+            except ValueError:
+                data = None
+        else:
+            match = _BLOB_DIGEST_RE.search(src)
+            if match and match.group(1) in self.images:
+                data = self.images[match.group(1)][1]
+        try:
+            if data is None:
+                raise ValueError("image not available")
+            width, height = ImageReader(io.BytesIO(data)).getSize()
+            scale = min(1.0, self.max_width / width, self.max_height / height)
+            self.flowables.append(Image(io.BytesIO(data), width * scale, height * scale))
+        except Exception:
+            self.flowables.append(Paragraph("<i>[image]</i>", self.styles["BodyText"]))
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in _BLOCK_TAGS:
+            self._flush()
+            self._blocks.append(tag)
+            if tag == "pre":
+                self._in_pre += 1
+            if tag == "li" and self._lists:
+                self._lists[-1][1] += 1
+        elif tag in ("ul", "ol"):
+            self._flush()
+            self._lists.append([tag, 0])
+        elif tag == "br":
+            self._markup.append("\n" if self._in_pre else "<br/>")
+        elif tag == "img":
+            self._flush()
+            self._image(attrs.get("src") or "")
+        elif tag == "hr":
+            from reportlab.platypus import HRFlowable
+
+            self._flush()
+            self.flowables.append(HRFlowable(width="100%"))
+        elif tag in _INLINE_TAGS:
+            self._markup.append(f"<{_INLINE_TAGS[tag]}>")
+            self._open.append(f"</{_INLINE_TAGS[tag]}>")
+        elif tag == "code":
+            self._markup.append('<font face="Courier">')
+            self._open.append("</font>")
+        elif tag == "a" and attrs.get("href"):
+            self._markup.append(f'<a href="{html.escape(attrs["href"])}" color="blue">')
+            self._open.append("</a>")
+        elif tag == "td" or tag == "th":
+            self._markup.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in _BLOCK_TAGS:
+            self._flush()
+            if tag in self._blocks:
+                while self._blocks.pop() != tag:
+                    pass
+            if tag == "pre":
+                self._in_pre = max(self._in_pre - 1, 0)
+        elif tag in ("ul", "ol"):
+            self._flush()
+            if self._lists:
+                self._lists.pop()
+        elif tag in _INLINE_TAGS or tag == "code" or tag == "a":
+            if self._open:
+                closing = self._open.pop()
+                self._markup.append(closing)
+
+    def handle_data(self, data):
+        self._markup.append(html.escape(data, quote=False))
+
+    def close(self):
+        super().close()
+        self._open = []
+        self._flush()
+
+
+def note_to_pdf(title: Optional[str], content: Optional[str], page_size: str = "A4", images: Optional[Images] = None) -> bytes:
+    from reportlab.lib.pagesizes import A4, letter
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle("Quote", parent=styles["BodyText"], leftIndent=18, textColor="#555555"))
+    out = io.BytesIO()
+    doc = SimpleDocTemplate(
+        out,
+        pagesize=letter if page_size == "letter" else A4,
+        title=title or "Untitled",
+        leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm,
+    )
+    builder = _PdfBuilder(styles, images or {}, doc.width, doc.height * 0.9)
+    builder.feed(content or "")
+    builder.close()
+    doc.build([Paragraph(html.escape(title or "Untitled"), styles["Title"]), *builder.flowables])
+    return out.getvalue()
+
+
+# ──────────────────────────────────────────────────
+# Worker entry point
+# ──────────────────────────────────────────────────
+def render(note: dict, render_format: str, options: dict, images: Optional[Images] = None) -> Tuple[bytes, float]:
+    """Render ``{"title", "content"}``; returns the artifact and the seconds it took"""
+    start = time.perf_counter()
+    if render_format == "pdf":
+        data = note_to_pdf(note["title"], note["content"], options.get("page_size", "A4"), images)
+    else:
+        data = note_to_markdown(note["title"], note["content"]).encode("utf-8")
+    return data, time.perf_counter() - start
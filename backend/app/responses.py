@@ -0,0 +1,205 @@
+"""Response pipeline: orjson bodies and gzip/brotli compression.
+
+Routes that already hold ORM rows shaped like their response model can return
+``orm_response`` to skip pydantic re-validation. ``CompressionMiddleware``
+negotiates ``br`` (with the optional ``brotli`` package) or ``gzip`` for
+text-like bodies above a size threshold, and compresses streamed bodies chunk
+by chunk so each chunk still reaches the client as it is produced.
+
+A compressed body is a different representation from the handler's, so its
+ETag gets a per-coding suffix (``"abc"`` becomes ``"abc-gzip"``). The suffix is
+stripped from ``If-None-Match`` before the request reaches a route, so routes
+only ever compare their own tags.
+"""
+import zlib
+from typing import Iterable, Optional, Type, Union
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # higher levels cost far more CPU for little gain on JSON
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+ETAG_SUFFIXES = {"br": "-br", "gzip": "-gzip"}
+
+
+def dump_orm(obj, model: Type[BaseModel]) -> dict:
+    """``model``-shaped dict read straight off an ORM row, without validation"""
+    return {name: getattr(obj, name) for name in model.model_fields}
+
+
+def orm_response(
+    rows: Union[object, Iterable[object]],
+    model: Type[BaseModel],
+    many: bool = False,
+    status_code: int = 200,
+    headers: Optional[dict] = None,
+) -> ORJSONResponse:
+    """Serialize trusted ORM rows as ``model`` (or a list of it when ``many``)"""
+    content = [dump_orm(row, model) for row in rows] if many else dump_orm(rows, model)
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def _is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type == "text/event-stream":
+        return False
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES or media_type.endswith("+json")
+
+
+def _negotiate(accept_encoding: str) -> Optional[str]:
+    """Preferred supported coding from an Accept-Encoding header, if any"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            weights[coding] = quality
+    wildcard = weights.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if weights.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def _etag_with_coding(etag: str, coding: str) -> str:
+    """``etag`` tagged as the ``coding``-compressed representation"""
+    if not etag.endswith('"'):
+        return etag
+    return etag[:-1] + ETAG_SUFFIXES[coding] + '"'
+
+
+def _strip_etag_codings(if_none_match: str) -> str:
+    """If-None-Match with coding suffixes removed, so it matches the route's own ETags"""
+    candidates = []
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        for suffix in ETAG_SUFFIXES.values():
+            if candidate.endswith(suffix + '"'):
+                candidate = candidate[: -len(suffix) - 1] + '"'
+                break
+        candidates.append(candidate)
+    return ", ".join(candidates)
+
+
+class _Compressor:
+    def __init__(self, coding: str):
+        if coding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip framing
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress ``data`` and flush, so the client can decode it right away"""
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """Pure ASGI gzip/brotli middleware with a size threshold and streaming support"""
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            stripped = _strip_etag_codings(if_none_match)
+            if stripped != if_none_match:
+                raw = [(k, v) for k, v in scope["headers"] if k != b"if-none-match"]
+                scope = dict(scope, headers=raw + [(b"if-none-match", stripped.encode("latin-1"))])
+        coding = _negotiate(request_headers.get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None  # None until the first body message decides; False = pass through
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if start_message["status"] == 304 and if_none_match and "etag" in headers:
+                    # Answer with the tag the client cached, which may be the compressed one
+                    etag = _etag_with_coding(headers["etag"], coding)
+                    if etag.removeprefix("W/") in [c.strip().removeprefix("W/") for c in if_none_match.split(",")]:
+                        headers["ETag"] = etag
+                eligible = (
+                    start_message["status"] not in (204, 206, 304)
+                    and "content-encoding" not in headers
+                    and _is_compressible(headers.get("content-type", ""))
+                )
+                if eligible:
+                    headers.add_vary_header("Accept-Encoding")
+                if not eligible or (not more_body and len(body) < self.minimum_size):
+                    compressor = False
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(coding)
+                headers["Content-Encoding"] = coding
+                if "etag" in headers:
+                    headers["ETag"] = _etag_with_coding(headers["etag"], coding)
+                if more_body:
+                    if "content-length" in headers:
+                        del headers["Content-Length"]
+                else:
+                    body = compressor.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start_message)
+
+            if compressor is False:
+                await send(message)
+            elif more_body:
+                data = compressor.chunk(body)
+                if data:
+                    await send({"type": "http.response.body", "body": data, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body)})
+
+        await self.app(scope, receive, send_compressed)
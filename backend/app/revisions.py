@@ -0,0 +1,149 @@
+"""Note revision history, stored as reverse deltas.
+
+Every edit of a note records the version it replaced as a ``NoteRevision``.
+Usually that is only the delta turning the new body back into the old one, so
+history grows with the size of edits rather than of notes. Every
+``NOTE_REVISION_SNAPSHOT_EVERY``-th revision stores the whole body instead.
+Rebuilding a revision starts from the nearest snapshot above it (or the
+current note) and applies deltas downwards: fewer than that many delta
+applications, however long the history.
+
+Revisions beyond ``NOTE_REVISION_KEEP`` per note, or older than
+``NOTE_REVISION_MAX_AGE`` seconds, are pruned when the note is next edited.
+Deltas point upwards, so dropping the oldest revisions never breaks the rest.
+"""
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .core import compression
+from .core.config import settings
+from .diffs import apply_delta, make_delta
+
+Revision = models.NoteRevision
+
+
+class Previous(NamedTuple):
+    """A note as it was before an edit"""
+    version: int
+    title: str
+    content: str
+    saved_at: Optional[datetime]
+
+
+def capture(note: models.Note) -> Previous:
+    return Previous(note.version, note.title, note.content or "", note.updated_at)
+
+
+def record_revision(db: Session, note: models.Note, previous: Previous) -> None:
+    """Store ``previous`` as a revision of ``note``, which already holds the edit"""
+    every = max(settings.note_revision_snapshot_every, 1)
+    # A snapshot once the newest every - 1 revisions are all deltas
+    recent = db.execute(
+        select(Revision.delta.is_(None))
+        .where(Revision.note_id == note.id)
+        .order_by(Revision.version.desc())
+        .limit(every - 1)
+    ).scalars().all()
+    revision = Revision(
+        note_id=note.id,
+        version=previous.version,
+        title=previous.title,
+        saved_at=previous.saved_at or datetime.now(timezone.utc),
+    )
+    if len(recent) >= every - 1 and not any(recent):
+        revision.content, revision.content_z = compression.encode(previous.content)
+    else:
+        revision.delta = json.dumps(make_delta(note.content or "", previous.content))
+    db.add(revision)
+    db.flush()
+    _prune(db, note.id)
+
+
+def _prune(db: Session, note_id: int) -> None:
+    if settings.note_revision_keep > 0:
+        oldest_kept = (
+            select(Revision.version)
+            .where(Revision.note_id == note_id)
+            .order_by(Revision.version.desc())
+            .offset(settings.note_revision_keep - 1)
+            .limit(1)
+            .scalar_subquery()
+        )
+        db.execute(delete(Revision).where(Revision.note_id == note_id, Revision.version < oldest_kept))
+    if settings.note_revision_max_age > 0:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.note_revision_max_age)
+        db.execute(delete(Revision).where(Revision.note_id == note_id, Revision.saved_at < cutoff))
+
+
+def drop_revisions(db: Session, note_ids: Sequence[int]) -> None:
+    """Delete the history of deleted notes"""
+    if note_ids:
+        db.execute(delete(Revision).where(Revision.note_id.in_(note_ids)))
+
+
+def list_revisions(
+    db: Session, note_id: int, limit: int = 50, before_version: Optional[int] = None
+) -> Tuple[List[dict], Optional[int]]:
+    """Page of a note's revisions, newest first, without rebuilding any body"""
+    query = select(Revision.version, Revision.title, Revision.saved_at).where(Revision.note_id == note_id)
+    if before_version is not None:
+        query = query.where(Revision.version < before_version)
+    rows = db.execute(query.order_by(Revision.version.desc()).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{"version": row.version, "title": row.title, "saved_at": row.saved_at} for row in rows]
+    return items, (rows[-1].version if has_more else None)
+
+
+def get_revision(db: Session, note: models.Note, version: int) -> Optional[dict]:
+    """Rebuild revision ``version`` of ``note``, or None if it is not in the history"""
+    snapshot_version = (
+        select(func.min(Revision.version))
+        .where(Revision.note_id == note.id, Revision.version >= version, Revision.delta.is_(None))
+        .scalar_subquery()
+    )
+    # The revision and everything above it, up to the nearest snapshot
+    chain = db.execute(
+        select(Revision)
+        .where(
+            Revision.note_id == note.id,
+            Revision.version >= version,
+            or_(snapshot_version.is_(None), Revision.version <= snapshot_version),
+        )
+        .order_by(Revision.version.desc())
+    ).scalars().all()
+    if not chain or chain[-1].version != version:
+        return None
+    target = chain[-1]
+    if chain[0].delta is None:
+        top = chain.pop(0)
+        body = compression.decompress(top.content_z) if top.content_z is not None else top.content or ""
+    else:
+        body = note.content or ""
+    for revision in chain:
+        body = apply_delta(body, json.loads(revision.delta))
+    return {"version": target.version, "title": target.title, "content": body, "saved_at": target.saved_at}
+
+
+def iter_history(db: Session, bodies: Dict[int, str]) -> Iterator[str]:
+    """Every body the notes in ``bodies`` (note id -> current body) ever had that is still in their history"""
+    yield from bodies.values()
+    rows = db.execute(
+        select(Revision.note_id, Revision.delta, Revision.content, Revision.content_z)
+        .where(Revision.note_id.in_(bodies))
+        .order_by(Revision.note_id, Revision.version.desc())
+    )
+    note_id = body = None
+    for row in rows:
+        if row.note_id != note_id:
+            note_id, body = row.note_id, bodies[row.note_id]
+        if row.delta is None:
+            body = compression.decompress(row.content_z) if row.content_z is not None else row.content or ""
+        else:
+            body = apply_delta(body, json.loads(row.delta))
+        yield body
@@ -0,0 +1,73 @@
+import re
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import blobs, crud_async
+from ..dependencies import get_async_db
+
+router = APIRouter(prefix="/blobs", tags=["blobs"])
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+# Content-addressed, so a URL's bytes never change
+_IMMUTABLE_HEADERS = {
+    "Cache-Control": "public, max-age=31536000, immutable",
+    "X-Content-Type-Options": "nosniff",
+    # Images only: an SVG opened directly must not run scripts on the API origin
+    "Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'; sandbox",
+}
+
+
+def _byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) of a single-range request, None to send everything; 416 if unsatisfiable"""
+    match = _RANGE_RE.fullmatch((range_header or "").strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None  # absent, malformed or multi-range: reply with the whole blob
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+# ──────────────────────────────────────────────────
+@router.api_route("/{digest}", methods=["GET", "HEAD"], response_class=StreamingResponse)
+async def read_blob(
+    request: Request,
+    digest: str = Path(..., pattern=blobs.DIGEST_PATTERN),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Stream an image referenced from a note; supports Range and never changes"""
+    etag = f'"{digest}"'
+    if if_none_match and etag in [c.strip().removeprefix("W/") for c in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, **_IMMUTABLE_HEADERS})
+    info = await crud_async.get_blob_info(db, digest)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    media_type, size, path = info
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", **_IMMUTABLE_HEADERS}
+    byte_range = None
+    if size and (if_range is None or if_range.strip() == etag):
+        byte_range = _byte_range(range_header, size)
+    start, end = byte_range or (0, size - 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    body = blobs.iter_blob(digest, start, end, path) if request.method == "GET" and size else iter(())
+    return StreamingResponse(
+        body,
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type=media_type,
+        headers=headers,
+    )
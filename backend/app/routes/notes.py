@@ -1,96 +1,687 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, Header
-from sqlalchemy.orm import Session
+import asyncio
+import json
+import re
+from contextlib import suppress
+from typing import AsyncIterator, List, Literal, Optional, Tuple
 
-from .. import schemas, crud
-from ..dependencies import get_db, get_current_user_optional
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import schemas, crud, crud_async, realtime
+from ..core.config import settings
+from ..core.security import decode_access_token
+from ..database import AsyncSessionLocal
+from ..dependencies import get_async_db, get_current_user_optional, oauth2_scheme
+from ..guests import touch_guest_session
+from ..notecache import cache as note_cache
+from ..render_jobs import queue as render_queue
+from ..responses import dump_orm, orm_response
+from ..writeback import buffer as write_buffer
 
 router = APIRouter(prefix="/notes", tags=["notes"])
 
+# Responses depend on who is asking, so shared caches must not reuse them
+_CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization, X-Session-Id"}
+_NOTE_ETAG_RE = re.compile(r'"(\d+)\.(\d+)"')
+
+BULK_BATCH_SIZE = 500
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+EXPORT_MEDIA_TYPES = {
+    "ndjson": ("application/x-ndjson", "cleverpad-notes.ndjson"),
+    "markdown-zip": ("application/zip", "cleverpad-notes.zip"),
+}
+
 
-def get_session_id(x_session_id: Optional[str] = Header(None)) -> Optional[str]:
-    """Extract session ID from headers for guest users"""
+async def get_session_id(x_session_id: Optional[str] = Header(None)) -> Optional[str]:
+    """Extract session ID from headers for guest users, keeping the session alive"""
+    if x_session_id:
+        await touch_guest_session(x_session_id)
     return x_session_id
 
 
+def note_etag(note_id: int, version: int) -> str:
+    return f'"{note_id}.{version}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak If-None-Match comparison"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in ("*", etag):
+            return True
+    return False
+
+
+def _expected_version(if_match: Optional[str], note_id: int) -> Optional[int]:
+    """Version an If-Match header requires (strong comparison); None if unconditional"""
+    if not if_match or if_match.strip() == "*":
+        return None
+    for candidate in if_match.split(","):
+        match = _NOTE_ETAG_RE.fullmatch(candidate.strip())
+        if match and int(match.group(1)) == note_id:
+            return int(match.group(2))
+    return -1  # matches no version, so the write fails with 412
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **_CACHE_HEADERS})
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'note'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+async def _iter_ndjson(request: Request) -> AsyncIterator[bytes]:
+    """Yield non-empty lines of the request body as they arrive"""
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+async def _push_owner(token: Optional[str], session_id: Optional[str]) -> Optional[dict]:
+    """Owner of a push connection, from a bearer token or a guest session id"""
+    if token:
+        try:
+            user_id = int(decode_access_token(token).get("sub"))
+        except Exception:
+            return None
+        return {"user_id": user_id}
+    if session_id:
+        await touch_guest_session(session_id)
+        return {"session_id": session_id}
+    return None
+
+
+async def _open_subscription(owner: dict, transport: str) -> Tuple[realtime.Subscription, dict]:
+    """Subscribe to an owner's events; returns the subscription and its hello event"""
+    subscription = realtime.broker.subscribe(crud._scope_key(**owner), transport)
+    try:
+        # Read after subscribing, so no change past this revision can be missed
+        async with AsyncSessionLocal() as db:
+            revision = await crud_async.get_scope_revision(db, **owner)
+    except Exception:
+        realtime.broker.unsubscribe(subscription)
+        raise
+    return subscription, {"type": "hello", "revision": revision}
+
+
+def _sse_message(event: dict) -> bytes:
+    lines = [f"event: {event['type']}"]
+    if "revision" in event:
+        lines.append(f"id: {event['revision']}")
+    lines.append(f"data: {json.dumps(event)}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
 # ──────────────────────────────────────────────────
 @router.get("/", response_model=List[schemas.NoteOut])
-def list_notes(
-    db: Session = Depends(get_db),
+async def list_notes(
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user_optional),
     session_id: Optional[str] = Depends(get_session_id),
 ):
     """List notes for authenticated user or guest session"""
     if current_user:
-        return crud.get_notes(db, user_id=current_user.id)
+        owner = {"user_id": current_user.id}
     elif session_id:
-        return crud.get_notes(db, session_id=session_id)
+        owner = {"session_id": session_id}
     else:
         return []
+    marker = write_buffer.scope_marker(owner)
+    revision = None
+    if not note_cache.enabled:
+        # The validator is read before the notes, so a racing write can only make it stale
+        revision = await crud_async.get_scope_revision(db, **owner)
+        if _etag_matches(if_none_match, f'"notes.{revision}{marker}"'):
+            return _not_modified(f'"notes.{revision}{marker}"')
+
+    async def load():
+        scope_revision = revision if revision is not None else await crud_async.get_scope_revision(db, **owner)
+        notes = await crud_async.get_notes(db, **owner)
+        return scope_revision, orjson.dumps([dump_orm(note, schemas.NoteOut) for note in notes])
+
+    revision, body = await note_cache.page(owner, "list", load)
+    etag = f'"notes.{revision}{marker}"'
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    headers = {"ETag": etag, **_CACHE_HEADERS}
+    if marker:
+        return ORJSONResponse([write_buffer.overlay(note) for note in orjson.loads(body)], headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# ──────────────────────────────────────────────────
+@router.get("/summary", response_model=schemas.NoteSummaryPage)
+async def list_note_summaries(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = Query(None, ge=1, description="next_cursor of the previous page"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Page through id/title/preview of notes, newest first, without full bodies"""
+    if current_user:
+        owner = {"user_id": current_user.id}
+    elif session_id:
+        owner = {"session_id": session_id}
+    else:
+        return {"items": [], "next_cursor": None}
+    marker = write_buffer.scope_marker(owner)
+    revision = None
+    if not note_cache.enabled:
+        revision = await crud_async.get_scope_revision(db, **owner)
+        etag = f'"summary.{revision}{marker}.{limit}.{cursor or 0}"'
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+
+    async def load():
+        scope_revision = revision if revision is not None else await crud_async.get_scope_revision(db, **owner)
+        items, next_cursor = await crud_async.get_note_summaries(db, **owner, limit=limit, before_id=cursor)
+        return scope_revision, orjson.dumps({"items": items, "next_cursor": next_cursor})
+
+    revision, body = await note_cache.page(owner, f"summary:{limit}:{cursor or 0}", load)
+    etag = f'"summary.{revision}{marker}.{limit}.{cursor or 0}"'
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    headers = {"ETag": etag, **_CACHE_HEADERS}
+    if marker:
+        page = orjson.loads(body)
+        page["items"] = [write_buffer.overlay_summary(item) for item in page["items"]]
+        return ORJSONResponse(page, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# ──────────────────────────────────────────────────
+@router.get("/stats", response_model=schemas.NoteStats)
+async def read_note_stats(
+    utc_offset: int = Query(0, ge=-840, le=840, description="client's offset from UTC in minutes, for notes_today"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Word, character and activity totals, aggregated in the database"""
+    if current_user:
+        owner = {"user_id": current_user.id}
+    elif session_id:
+        owner = {"session_id": session_id}
+    else:
+        return await crud_async.get_note_stats(db)
+    await write_buffer.flush_scope(owner)
+    return await crud_async.get_note_stats(db, **owner, utc_offset=utc_offset)
+
+
+# ──────────────────────────────────────────────────
+@router.get("/search", response_model=schemas.NoteSearchPage)
+async def search_notes(
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: int = Query(0, ge=0, description="next_cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Ranked full-text search with highlighted snippets"""
+    if current_user:
+        items, next_cursor = await crud_async.search_notes(
+            db, q, user_id=current_user.id, limit=limit, offset=cursor
+        )
+    elif session_id:
+        items, next_cursor = await crud_async.search_notes(
+            db, q, session_id=session_id, limit=limit, offset=cursor
+        )
+    else:
+        items, next_cursor = [], None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# ──────────────────────────────────────────────────
+@router.get("/changes", response_model=schemas.NoteChanges)
+async def list_note_changes(
+    since: int = Query(0, ge=0, description="cursor returned by the previous call"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Notes created, updated or deleted since ``since``, for incremental sync"""
+    if current_user:
+        changes = await crud_async.get_note_changes(db, since, user_id=current_user.id, limit=limit)
+    elif session_id:
+        changes = await crud_async.get_note_changes(db, since, session_id=session_id, limit=limit)
+    else:
+        return {"notes": [], "deleted": [], "cursor": since, "has_more": False}
+    changes["notes"] = [dump_orm(note, schemas.NoteOut) for note in changes["notes"]]
+    return ORJSONResponse(changes)
+
+
+# ──────────────────────────────────────────────────
+@router.get("/export", response_class=StreamingResponse)
+async def export_notes(
+    export_format: Literal["ndjson", "markdown-zip"] = Query("ndjson", alias="format"),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Download every note, streamed as NDJSON or as a zip of Markdown files"""
+    if current_user:
+        owner = {"user_id": current_user.id}
+    elif session_id:
+        owner = {"session_id": session_id}
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required or session ID missing",
+        )
+    await write_buffer.flush_scope(owner)
+    chunks = crud.export_notes(export_format, **owner)
+    media_type, filename = EXPORT_MEDIA_TYPES[export_format]
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# ──────────────────────────────────────────────────
+@router.get("/events", response_class=StreamingResponse)
+async def note_events(
+    token: Optional[str] = Query(None, description="bearer token, for clients that cannot send headers"),
+    guest_session_id: Optional[str] = Query(None, alias="session_id"),
+    bearer: Optional[str] = Depends(oauth2_scheme),
+    x_session_id: Optional[str] = Header(None),
+):
+    """Server-sent note change events (fallback for the ``/notes/ws`` WebSocket).
+
+    The first event is ``hello`` with the current change-feed revision; each
+    note event's SSE id is its revision. Fetch the changes themselves from
+    ``/notes/changes?since=``. A ``resync`` event means events were dropped.
+    """
+    owner = await _push_owner(token or bearer, guest_session_id or x_session_id)
+    if owner is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required or session ID missing",
+        )
+    subscription, hello = await _open_subscription(owner, "sse")
+
+    async def stream() -> AsyncIterator[bytes]:
+        try:
+            yield _sse_message(hello)
+            while True:
+                event = await subscription.get(settings.realtime_heartbeat)
+                yield _sse_message(event) if event else b": ping\n\n"
+        finally:
+            realtime.broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def note_events_socket(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    guest_session_id: Optional[str] = Query(None, alias="session_id"),
+):
+    """Note change events as JSON text messages; same events as ``/notes/events``"""
+    authorization = websocket.headers.get("authorization", "")
+    bearer = authorization[7:] if authorization.lower().startswith("bearer ") else None
+    owner = await _push_owner(token or bearer, guest_session_id or websocket.headers.get("x-session-id"))
+    if owner is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription, hello = await _open_subscription(owner, "websocket")
+
+    async def send_events():
+        await websocket.send_text(json.dumps(hello))
+        while True:
+            event = await subscription.get(settings.realtime_heartbeat)
+            await websocket.send_text(json.dumps(event or {"type": "ping"}))
+
+    async def wait_for_close():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(wait_for_close())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        realtime.broker.unsubscribe(subscription)
+        for task in tasks:
+            task.cancel()
+            # A send racing the disconnect may fail; the connection is gone either way
+            with suppress(Exception, asyncio.CancelledError):
+                await task
 
 
 # ──────────────────────────────────────────────────
 @router.post("/", response_model=schemas.NoteOut, status_code=201)
-def create_note(
+async def create_note(
     note_in: schemas.NoteCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user_optional),
     session_id: Optional[str] = Depends(get_session_id),
 ):
     """Create a note for authenticated user or guest session"""
     if current_user:
-        return crud.create_note(db, note_in, user_id=current_user.id)
+        note = await crud_async.create_note(db, note_in, user_id=current_user.id)
     elif session_id:
-        return crud.create_note(db, note_in, session_id=session_id)
+        note = await crud_async.create_note(db, note_in, session_id=session_id)
     else:
-        from fastapi import HTTPException, status
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required or session ID missing",
+        )
+    return orm_response(note, schemas.NoteOut, status_code=201)
+
+
+# ──────────────────────────────────────────────────
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_create_notes(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Import many notes from a JSON array or an NDJSON stream.
 
+    Items are validated as they are read and inserted in batches of
+    ``BULK_BATCH_SIZE``, one transaction per batch. The result reports the new
+    id or the validation error for every input position.
+    """
+    if current_user:
+        owner = {"user_id": current_user.id}
+    elif session_id:
+        owner = {"session_id": session_id}
+    else:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication required or session ID missing",
         )
 
+    results = []
+    batch = []
+
+    async def flush():
+        ids = await crud_async.bulk_create_notes(db, [note for _, note in batch], **owner)
+        results.extend({"index": index, "id": note_id} for (index, _), note_id in zip(batch, ids))
+        batch.clear()
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_CONTENT_TYPES:
+        index = 0
+        async for line in _iter_ndjson(request):
+            try:
+                batch.append((index, schemas.NoteCreate.model_validate_json(line)))
+            except ValidationError as e:
+                results.append({"index": index, "error": _validation_message(e)})
+            index += 1
+            if len(batch) >= BULK_BATCH_SIZE:
+                await flush()
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=422, detail="Body must be a JSON array or NDJSON")
+        for index, item in enumerate(items):
+            try:
+                batch.append((index, schemas.NoteCreate.model_validate(item)))
+            except ValidationError as e:
+                results.append({"index": index, "error": _validation_message(e)})
+            if len(batch) >= BULK_BATCH_SIZE:
+                await flush()
+    if batch:
+        await flush()
+
+    results.sort(key=lambda item: item["index"])
+    created = sum(1 for item in results if item.get("id") is not None)
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+
+# ──────────────────────────────────────────────────
+@router.get("/{note_id}", response_model=schemas.NoteOut)
+async def read_note(
+    note_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Read one note; 304 for a matching If-None-Match without loading the body"""
+    if current_user:
+        owner = {"user_id": current_user.id}
+    elif session_id:
+        owner = {"session_id": session_id}
+    else:
+        raise HTTPException(status_code=404, detail="Note not found")
+    buffered_version = write_buffer.version_of(note_id, owner)
+    if if_none_match and not note_cache.enabled:
+        version = buffered_version or await crud_async.get_note_version(db, note_id, **owner)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Note not found")
+        etag = note_etag(note_id, version)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+
+    async def load():
+        note = await crud_async.get_note(db, note_id, **owner)
+        return (note.version, orjson.dumps(dump_orm(note, schemas.NoteOut))) if note is not None else None
+
+    entry = await note_cache.note(owner, note_id, load)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+    version, body = entry
+    if buffered_version is not None and buffered_version > version:
+        note = write_buffer.overlay(orjson.loads(body))
+        etag = note_etag(note_id, note["version"])
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+        return ORJSONResponse(note, headers={"ETag": etag, **_CACHE_HEADERS})
+    etag = note_etag(note_id, version)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    return Response(body, media_type="application/json", headers={"ETag": etag, **_CACHE_HEADERS})
+
 
 # ──────────────────────────────────────────────────
 @router.put("/{note_id}", response_model=schemas.NoteOut)
-def update_note(
+async def update_note(
     note_id: int,
     note_in: schemas.NoteCreate,
-    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user_optional),
     session_id: Optional[str] = Depends(get_session_id),
 ):
-    """Update a note for authenticated user or guest session"""
+    """Update a note for authenticated user or guest session; honours If-Match"""
+    expected_version = _expected_version(if_match, note_id)
     if current_user:
-        return crud.update_note(db, note_id, note_in, user_id=current_user.id)
+        owner = {"user_id": current_user.id}
     elif session_id:
-        return crud.update_note(db, note_id, note_in, session_id=session_id)
+        owner = {"session_id": session_id}
     else:
-        from fastapi import HTTPException, status
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required or session ID missing",
+        )
+    if write_buffer.enabled:
+        note = await write_buffer.save(db, note_id, note_in, owner, expected_version)
+        return ORJSONResponse(note, headers={"ETag": note_etag(note_id, note["version"])})
+    note = await crud_async.update_note(db, note_id, note_in, expected_version=expected_version, **owner)
+    return orm_response(note, schemas.NoteOut, headers={"ETag": note_etag(note.id, note.version)})
+
+
+# ──────────────────────────────────────────────────
+@router.patch("/{note_id}", response_model=schemas.NotePatchResult)
+async def patch_note(
+    note_id: int,
+    patch: schemas.NotePatch,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Apply an incremental edit; 409 if the note moved past ``base_version``.
 
+    ``content`` is returned only when the stored body differs from the patched one.
+    """
+    await write_buffer.flush_note(note_id)
+    if current_user:
+        version, content = await crud_async.patch_note(db, note_id, patch, user_id=current_user.id)
+    elif session_id:
+        version, content = await crud_async.patch_note(db, note_id, patch, session_id=session_id)
+    else:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication required or session ID missing",
         )
+    response.headers["ETag"] = note_etag(note_id, version)
+    return {"id": note_id, "version": version, "content": content}
 
 
 # ──────────────────────────────────────────────────
 @router.delete("/{note_id}", status_code=204)
-def delete_note(
+async def delete_note(
     note_id: int,
-    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user_optional),
     session_id: Optional[str] = Depends(get_session_id),
 ):
-    """Delete a note for authenticated user or guest session"""
+    """Delete a note for authenticated user or guest session; honours If-Match"""
+    expected_version = _expected_version(if_match, note_id)
+    await write_buffer.flush_note(note_id)
     if current_user:
-        crud.delete_note(db, note_id, user_id=current_user.id)
+        await crud_async.delete_note(db, note_id, user_id=current_user.id, expected_version=expected_version)
     elif session_id:
-        crud.delete_note(db, note_id, session_id=session_id)
+        await crud_async.delete_note(db, note_id, session_id=session_id, expected_version=expected_version)
     else:
-        from fastapi import HTTPException, status
-
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication required or session ID missing",
         )
+
+
+# ──────────────────────────────────────────────────
+# Revision history
+# ──────────────────────────────────────────────────
+def _require_owner(current_user, session_id: Optional[str]) -> dict:
+    if current_user:
+        return {"user_id": current_user.id}
+    if session_id:
+        return {"session_id": session_id}
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Authentication required or session ID missing",
+    )
+
+
+@router.get("/{note_id}/revisions", response_model=schemas.NoteRevisionPage)
+async def list_note_revisions(
+    note_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = Query(None, ge=1, description="next_cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Earlier versions of a note, newest first (titles and times only)"""
+    owner = _require_owner(current_user, session_id)
+    await write_buffer.flush_note(note_id)
+    items, next_cursor = await crud_async.list_note_revisions(
+        db, note_id, **owner, limit=limit, before_version=cursor
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/{note_id}/revisions/{version}", response_model=schemas.NoteRevisionOut)
+async def read_note_revision(
+    note_id: int,
+    version: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """One earlier version of a note, rebuilt from its history"""
+    owner = _require_owner(current_user, session_id)
+    await write_buffer.flush_note(note_id)
+    return await crud_async.get_note_revision(db, note_id, version, **owner)
+
+
+@router.post("/{note_id}/revisions/{version}/restore", response_model=schemas.NoteOut)
+async def restore_note_revision(
+    note_id: int,
+    version: int,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Bring back an earlier version as a new version of the note; honours If-Match"""
+    expected_version = _expected_version(if_match, note_id)
+    owner = _require_owner(current_user, session_id)
+    await write_buffer.flush_note(note_id)
+    note = await crud_async.restore_note_revision(db, note_id, version, expected_version=expected_version, **owner)
+    return orm_response(note, schemas.NoteOut, headers={"ETag": note_etag(note.id, note.version)})
+
+
+# ──────────────────────────────────────────────────
+# Server-side rendering
+# ──────────────────────────────────────────────────
+def _render_options(render_format: str, page_size: str) -> dict:
+    return {"page_size": page_size} if render_format == "pdf" else {}
+
+
+@router.post("/render", response_model=List[schemas.RenderJob], status_code=202)
+async def render_notes(
+    render_in: schemas.RenderRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Render several notes in parallel; one job per note, polled at ``/render/jobs/{id}``"""
+    owner = _require_owner(current_user, session_id)
+    jobs = await render_queue.submit(
+        db, owner, render_in.note_ids, render_in.format, _render_options(render_in.format, render_in.page_size)
+    )
+    return [render_queue.status(job) for job in jobs]
+
+
+@router.post("/{note_id}/render", response_model=schemas.RenderJob, status_code=202)
+async def render_note(
+    note_id: int,
+    response: Response,
+    render_format: Literal["pdf", "md"] = Query("pdf", alias="format"),
+    page_size: Literal["A4", "letter"] = Query("A4"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Render a note to PDF or Markdown in the background; poll the returned job"""
+    owner = _require_owner(current_user, session_id)
+    [job] = await render_queue.submit(db, owner, [note_id], render_format, _render_options(render_format, page_size))
+    response.headers["Location"] = f"/render/jobs/{job.id}"
+    return render_queue.status(job)
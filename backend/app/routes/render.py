@@ -0,0 +1,57 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+
+from .. import renderers, schemas
+from ..dependencies import get_current_user_optional
+from ..render_jobs import queue as render_queue
+from .notes import get_session_id
+
+router = APIRouter(prefix="/render", tags=["render"])
+
+
+def _job(job_id: str, current_user, session_id: Optional[str]):
+    if current_user:
+        owner = {"user_id": current_user.id}
+    elif session_id:
+        owner = {"session_id": session_id}
+    else:
+        owner = None
+    job = render_queue.get(job_id, owner) if owner else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Render job not found")
+    return job
+
+
+# ──────────────────────────────────────────────────
+@router.get("/jobs/{job_id}", response_model=schemas.RenderJob)
+async def read_render_job(
+    job_id: str,
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Status of a render job, with the artifact URL once it is done"""
+    return render_queue.status(_job(job_id, current_user, session_id))
+
+
+@router.get("/jobs/{job_id}/artifact", response_class=Response)
+async def read_render_artifact(
+    job_id: str,
+    if_none_match: Optional[str] = Header(None),
+    current_user=Depends(get_current_user_optional),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    """Download the rendered file; 409 while the job is pending or if it failed"""
+    job = _job(job_id, current_user, session_id)
+    etag = f'"{job.key}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    data = render_queue.artifact(job)
+    if data is None:
+        state = render_queue.status(job)
+        if state["status"] == "expired":
+            raise HTTPException(status_code=404, detail="Rendered file expired, render the note again")
+        raise HTTPException(status_code=409, detail=state.get("error") or "Render still in progress")
+    if if_none_match and etag in [c.strip().removeprefix("W/") for c in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{job.filename}"'
+    return Response(data, media_type=renderers.MEDIA_TYPES[job.format], headers=headers)
@@ -1,26 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 
-from .. import schemas, crud
+from .. import schemas, crud, crud_async
+from ..core.config import settings
 from ..core.security import create_access_token
-from ..dependencies import get_db, get_current_user
+from ..dependencies import get_async_db, get_current_user
+from ..guests import touch_guest_session
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 # ──────────────────────────────────────────────────
 @router.post("/signup", response_model=schemas.UserOut)
-def signup(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    return crud.create_user(db, user_in)
+async def signup(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    return await crud_async.create_user(db, user_in)
 
 
 # ──────────────────────────────────────────────────
 @router.post("/login", response_model=schemas.Token)
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
 ):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+    user = await crud_async.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -32,13 +34,21 @@ def login(
 
 # ──────────────────────────────────────────────────
 @router.post("/guest", response_model=schemas.GuestSession)
-def guest_login():
+async def guest_login():
     """Create a guest session for unauthenticated users"""
     session_id = crud.generate_guest_session_id()
-    return {"session_id": session_id, "token_type": "guest"}
+    await touch_guest_session(session_id)
+    return {"session_id": session_id, "token_type": "guest", "expires_in": int(settings.guest_session_ttl)}
 
 
 # ──────────────────────────────────────────────────
 @router.get("/me", response_model=schemas.UserOut)
-def read_current_user(current_user=Depends(get_current_user)):
-    return current_user
+async def read_current_user(current_user=Depends(get_current_user)):
+    user = await current_user.load()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Literal, Optional, Tuple
 
 
 # ──────────────────────────────────────────────────
@@ -27,6 +28,7 @@ class Token(BaseModel):
 class GuestSession(BaseModel):
     session_id: str
     token_type: str = "guest"
+    expires_in: Optional[int] = None  # Seconds of inactivity before the session expires
 
 
 # ──────────────────────────────────────────────────
@@ -43,7 +45,122 @@ class NoteCreate(NoteBase):
 
 class NoteOut(NoteBase):
     id: int
+    version: int = 1
+    revision: int = 0
     owner_id: Optional[int] = None
     session_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     model_config = {"from_attributes": True}
+
+
+class NotePatch(BaseModel):
+    """Edit against ``base_version``: ops are ``[start, end, text]`` replacements,
+    with offsets in UTF-16 code units as JavaScript counts them"""
+    base_version: int
+    title: Optional[str] = None
+    ops: List[Tuple[int, int, str]] = []
+
+
+class NoteVersion(BaseModel):
+    id: int
+    version: int
+
+
+class NotePatchResult(NoteVersion):
+    """Set when the server rewrote the patched body (pasted images moved to the
+    blob store); later ops must be made against this ``content``"""
+    content: Optional[str] = None
+
+
+class NoteRevisionSummary(BaseModel):
+    version: int
+    title: Optional[str] = None
+    saved_at: Optional[datetime] = None
+
+
+class NoteRevisionPage(BaseModel):
+    items: List[NoteRevisionSummary]
+    next_cursor: Optional[int] = None
+
+
+class NoteRevisionOut(NoteRevisionSummary):
+    content: str
+
+
+class NoteSummary(BaseModel):
+    id: int
+    title: str
+    preview: str = ""
+    word_count: int = 0
+
+
+class NoteSummaryPage(BaseModel):
+    items: List[NoteSummary]
+    next_cursor: Optional[int] = None
+
+
+class NoteLength(BaseModel):
+    id: int
+    title: Optional[str] = None
+    word_count: int
+
+
+class NoteStats(BaseModel):
+    total_notes: int
+    total_words: int
+    total_characters: int
+    average_words: int
+    notes_this_week: int
+    notes_today: int
+    last_updated_at: Optional[datetime] = None
+    longest_note: Optional[NoteLength] = None
+
+
+class NoteSearchHit(BaseModel):
+    id: int
+    title: str
+    snippet: str = ""
+    rank: float
+
+
+class NoteSearchPage(BaseModel):
+    items: List[NoteSearchHit]
+    next_cursor: Optional[int] = None
+
+
+class NoteChanges(BaseModel):
+    """Notes created/updated and ids deleted after ``since``; resume from ``cursor``"""
+    notes: List[NoteOut]
+    deleted: List[int]
+    cursor: int
+    has_more: bool = False
+
+
+class RenderRequest(BaseModel):
+    note_ids: List[int] = Field(min_length=1, max_length=100)
+    format: Literal["pdf", "md"] = "pdf"
+    page_size: Literal["A4", "letter"] = "A4"
+
+
+class RenderJob(BaseModel):
+    """A server-side render; poll until ``status`` is "done", then fetch ``artifact_url``"""
+    id: str
+    note_id: int
+    format: str
+    status: str
+    error: Optional[str] = None
+    artifact_url: Optional[str] = None
+
+
+class BulkImportItem(BaseModel):
+    index: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkImportResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkImportItem]
@@ -0,0 +1,167 @@
+"""Full-text search over notes.
+
+Postgres keeps a weighted ``tsvector`` in ``notes.search_vector``, a column
+generated from the title and plaintext behind a GIN index, so saves need no
+extra statement. SQLite (tests / local runs) uses an FTS5 table keyed by note
+id, written from ``crud`` inside the same transaction as the note itself.
+"""
+import html
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models
+
+FTS_TABLE = "notes_fts"
+TS_CONFIG = "english"
+
+# Control characters mark hits so snippets can be HTML-escaped before <mark> is added
+_HIT_START = "\x02"
+_HIT_STOP = "\x03"
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+SNIPPET_WORDS = 24
+# Postgres ``notes.search_vector``: title weighted above the body
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{TS_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{TS_CONFIG}', coalesce(plaintext, '')), 'B')"
+)
+
+
+def _is_postgres(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def create_search_index(connection: Connection) -> None:
+    """Create the search column/index (Postgres) or FTS5 table (SQLite) in a new, empty schema.
+
+    Existing databases get them from the Alembic migration instead.
+    """
+    if _is_postgres(connection):
+        connection.execute(
+            text(
+                "ALTER TABLE notes ADD COLUMN search_vector tsvector "
+                f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"
+            )
+        )
+        connection.execute(text("CREATE INDEX ix_notes_search_vector ON notes USING gin (search_vector)"))
+    elif connection.dialect.name == "sqlite":
+        connection.execute(
+            text(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, body, tokenize='porter unicode61')")
+        )
+
+
+def index_note(db: Session, note: models.Note) -> None:
+    """(Re)index a flushed note; call before the surrounding commit"""
+    index_notes(db, [{"id": note.id, "title": note.title, "plaintext": note.plaintext}])
+
+
+def index_notes(db: Session, notes: List[dict]) -> None:
+    """(Re)index many ``{"id", "title", "plaintext"}`` rows in one executemany"""
+    if not notes or _is_postgres(db.get_bind()):
+        return  # Postgres generates search_vector from the row itself
+    params = [{"id": note["id"], "title": note["title"] or "", "body": note["plaintext"] or ""} for note in notes]
+    db.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"),
+        [{"id": row["id"]} for row in params],
+    )
+    db.execute(
+        text(f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (:id, :title, :body)"),
+        params,
+    )
+
+
+def unindex_note(db: Session, note_id: int) -> None:
+    """Drop a note from the index (Postgres rows take their vector with them)"""
+    unindex_notes(db, [note_id])
+
+
+def unindex_notes(db: Session, note_ids: List[int]) -> None:
+    if note_ids and not _is_postgres(db.get_bind()):
+        db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), [{"id": i} for i in note_ids])
+
+
+def _fts5_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 AND-query; the last term matches as a prefix"""
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    terms = ['"%s"' % token for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _render_snippet(raw: Optional[str]) -> str:
+    escaped = html.escape(html.unescape(raw or ""), quote=False)
+    return escaped.replace(_HIT_START, "<mark>").replace(_HIT_STOP, "</mark>")
+
+
+def search_notes(
+    db: Session,
+    query: str,
+    scope: list,
+    limit: int = 20,
+    offset: int = 0,
+) -> Tuple[List[dict], Optional[int]]:
+    """Ranked search within ``scope`` (see ``crud._note_scope``).
+
+    Returns the hits and the offset of the next page, or ``None``.
+    """
+    Note = models.Note
+    if _is_postgres(db.get_bind()):
+        tsquery = func.websearch_to_tsquery(TS_CONFIG, query)
+        vector = literal_column("notes.search_vector")
+        rank = func.ts_rank_cd(vector, tsquery).label("rank")
+        # Rank and page first so ts_headline only runs for the returned rows
+        ranked = (
+            select(Note.id, rank)
+            .where(vector.op("@@")(tsquery), *scope)
+            .order_by(rank.desc(), Note.id.desc())
+            .limit(limit + 1)
+            .offset(offset)
+            .subquery()
+        )
+        headline = func.ts_headline(
+            TS_CONFIG,
+            func.coalesce(Note.plaintext, ""),
+            tsquery,
+            f"StartSel={_HIT_START}, StopSel={_HIT_STOP}, MaxWords={SNIPPET_WORDS}, MinWords=8, MaxFragments=2",
+        )
+        stmt = (
+            select(Note.id, Note.title, ranked.c.rank, headline.label("snippet"))
+            .join(ranked, ranked.c.id == Note.id)
+            .order_by(ranked.c.rank.desc(), Note.id.desc())
+        )
+        rows = [(row.id, row.title, float(row.rank), row.snippet) for row in db.execute(stmt)]
+    else:
+        match = _fts5_query(query)
+        if match is None:
+            return [], None
+        fts = table(FTS_TABLE, column("rowid"))
+        bm25 = literal_column(f"bm25({FTS_TABLE}, 10.0, 1.0)").label("rank")
+        snippet = literal_column(
+            f"snippet({FTS_TABLE}, 1, char(2), char(3), '…', 16)"
+        ).label("snippet")
+        stmt = (
+            select(Note.id, Note.title, bm25, snippet)
+            .select_from(fts)
+            .join(Note, Note.id == fts.c.rowid)
+            .where(text(f"{FTS_TABLE} MATCH :match"), *scope)
+            .order_by(bm25, Note.id.desc())
+            .limit(limit + 1)
+            .offset(offset)
+        )
+        # bm25() is "lower is better"; flip it so both backends rank descending
+        rows = [
+            (row.id, row.title, -float(row.rank), row.snippet)
+            for row in db.execute(stmt, {"match": match})
+        ]
+
+    has_more = len(rows) > limit
+    items = [
+        {"id": note_id, "title": title, "rank": rank, "snippet": _render_snippet(snippet)}
+        for note_id, title, rank, snippet in rows[:limit]
+    ]
+    return items, (offset + limit if has_more else None)
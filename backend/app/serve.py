@@ -0,0 +1,137 @@
+"""Production entry point: ``python -m app.serve`` (from ``backend/``).
+
+Checks the schema once, then starts ``WEB_CONCURRENCY`` workers on
+``HOST:PORT``. With gunicorn installed (``pip install gunicorn``) the app is
+imported once in the master and forked into uvicorn workers (preload), so
+workers start without re-importing anything or repeating the check; otherwise
+uvicorn's own multi-process mode is used. ``--check`` only runs the schema
+check, e.g. as a release step after ``alembic upgrade head``.
+
+``WEB_CONCURRENCY`` defaults to 1, because some state lives in each worker.
+More workers are refused while any of it would split between them: buffered
+saves (``WRITE_COALESCE_WINDOW``), change pushes and note-cache invalidations
+on the local channel, or metrics without ``PROMETHEUS_MULTIPROC_DIR``.
+Render jobs stay in the worker that accepted them, so route ``/render`` back to
+it (sticky sessions).
+
+SIGTERM drains: workers report not ready for ``SHUTDOWN_DRAIN_SECONDS``
+(default 5 here), then stop accepting connections and give in-flight requests
+``GRACEFUL_TIMEOUT`` seconds to finish.
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+from typing import List
+
+from dotenv import load_dotenv
+
+# The one place .env is loaded, before settings are read; it still takes precedence over this default
+load_dotenv()
+os.environ.setdefault("SHUTDOWN_DRAIN_SECONDS", "5")
+
+from . import lifecycle, realtime  # noqa: E402
+from .core.config import settings  # noqa: E402
+
+try:
+    import gunicorn.app.base as gunicorn_base
+except ImportError:  # optional dependency
+    gunicorn_base = None
+
+logger = logging.getLogger("app.serve")
+
+
+def _multi_worker_problems() -> List[str]:
+    """Settings under which several workers would disagree about the data they serve"""
+    problems = []
+    if settings.write_coalesce_window > 0:
+        problems.append("WRITE_COALESCE_WINDOW > 0 keeps saves in the memory of the worker that took them")
+    if realtime._backend() == "local":
+        problems.append(
+            "the local change channel reaches one worker only (use PostgreSQL or REALTIME_BACKEND=postgres)"
+        )
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        problems.append("without PROMETHEUS_MULTIPROC_DIR each scrape of /metrics sees one worker")
+    return problems
+
+
+def _clear_metrics_dir() -> None:
+    # Samples left by a previous run's workers would be added to this run's
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.unlink(path)
+
+
+def _run_gunicorn() -> None:
+    from prometheus_client import multiprocess
+
+    def child_exit(server, worker):
+        # Drop the live gauges of a worker that is gone
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            multiprocess.mark_process_dead(worker.pid)
+
+    class Application(gunicorn_base.BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{settings.host}:{settings.port}",
+                "workers": settings.web_concurrency,
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "preload_app": True,
+                # Drain plus the time in-flight requests get, before workers are killed
+                "graceful_timeout": settings.shutdown_drain_seconds + settings.graceful_timeout,
+                "child_exit": child_exit,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from .main import app
+
+            return app
+
+    Application().run()
+
+
+def _run_uvicorn() -> None:
+    import uvicorn
+
+    uvicorn.run(
+        "app.main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=settings.web_concurrency,
+        timeout_graceful_shutdown=settings.graceful_timeout,
+    )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.serve", description="Run the CleverPad API")
+    parser.add_argument("--check", action="store_true", help="check the database schema and exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s:     %(message)s")
+    for name in ("app.serve", "app.lifecycle"):
+        logging.getLogger(name).setLevel(logging.INFO)
+
+    try:
+        lifecycle.prepare_database()
+    except lifecycle.SchemaError as exc:
+        sys.exit(f"cleverpad: {exc}")
+    if args.check:
+        logger.info("Database schema is at the Alembic head")
+        return
+    if settings.web_concurrency > 1:
+        problems = _multi_worker_problems()
+        if problems:
+            sys.exit(f"cleverpad: refusing to start {settings.web_concurrency} workers: " + "; ".join(problems))
+        logger.info("Render jobs stay in the worker that accepted them; route /render requests back to it")
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        _clear_metrics_dir()
+    if gunicorn_base is not None:
+        _run_gunicorn()
+    else:
+        logger.info("gunicorn is not installed; starting uvicorn workers without preload")
+        _run_uvicorn()
+
+
+if __name__ == "__main__":
+    main()
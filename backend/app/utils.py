@@ -0,0 +1,42 @@
+import hashlib
+import html
+import re
+from typing import Optional
+
+_TAG_RE = re.compile(r"<[^>]*>|<[^>]*$")
+_BLOCK_TAG_RE = re.compile(r"</?(p|div|br|li|h[1-6]|blockquote|pre|tr)\b[^>]*>", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+PREVIEW_LENGTH = 140
+
+
+def html_to_text(value: str) -> str:
+    """Strip tags from (possibly truncated) editor HTML and collapse whitespace"""
+    if not value:
+        return ""
+    text = _BLOCK_TAG_RE.sub(" ", value)
+    text = _TAG_RE.sub("", text)
+    return _WHITESPACE_RE.sub(" ", html.unescape(text)).strip()
+
+
+def _truncate(text: str, length: int) -> str:
+    if len(text) <= length:
+        return text
+    return text[:length].rstrip() + "…"
+
+
+def make_preview(value: str, length: int = PREVIEW_LENGTH) -> str:
+    """Short plain-text preview of a note body, as shown in the sidebar"""
+    return _truncate(html_to_text(value), length)
+
+
+def note_text_fields(value: Optional[str]) -> dict:
+    """Columns derived from a note body when it is written (see ``models.Note``)"""
+    body = value or ""
+    text = html_to_text(body)
+    return {
+        "plaintext": text,
+        "preview": _truncate(text, PREVIEW_LENGTH),
+        "word_count": len(text.split()),
+        "char_count": len(text),
+        "content_hash": hashlib.sha256(body.encode("utf-8")).hexdigest(),
+    }
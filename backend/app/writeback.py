@@ -0,0 +1,266 @@
+"""Write-behind coalescing for note autosaves.
+
+With ``WRITE_COALESCE_WINDOW`` > 0, PUT /notes/{id} keeps the new title and
+body in memory and answers at once; further saves of the same note replace
+them (last write wins, with If-Match checked against the buffered version).
+Every window a background task writes the buffered notes through
+``crud.apply_note_updates``, ``WRITE_COALESCE_BATCH_SIZE`` notes per
+transaction. An acknowledged save is never dropped for being stale: if the
+stored note moved on meanwhile (say, saved through another worker), the save
+is re-based and written on top of it, and the version it replaced stays in
+the note's history. Only a save of a note deleted since is discarded.
+
+Reads of a note, the note list and summaries overlay buffered saves, so a
+client sees its own writes (within one worker process). PATCH, DELETE and
+export flush the affected notes first; search and the change feed see a save
+once it is flushed. The buffer is flushed on shutdown.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud_async, schemas
+from .core.config import settings
+from .database import AsyncSessionLocal
+from .metrics import (
+    WRITEBACK_CONFLICTS,
+    WRITEBACK_FAILURES,
+    WRITEBACK_FLUSH_DURATION,
+    WRITEBACK_PENDING,
+    WRITEBACK_RATIO,
+    WRITEBACK_ROWS,
+    WRITEBACK_SAVES,
+)
+from .responses import dump_orm
+from .utils import note_text_fields
+
+logger = logging.getLogger(__name__)
+
+FINAL_FLUSH_ATTEMPTS = 3
+
+
+@dataclass
+class PendingWrite:
+    note: dict  # NoteOut fields, with the buffered title/content/version applied
+    owner: dict  # {"user_id": ...} or {"session_id": ...}
+    base_version: int  # stored version this write applies on top of
+    saves: int = 1  # saves merged into this write
+    seq: int = 0  # buffer-wide write counter, for list ETags
+
+    def as_update(self) -> dict:
+        return {
+            "id": self.note["id"],
+            "title": self.note["title"],
+            "content": self.note["content"],
+            "version": self.note["version"],
+            "base_version": self.base_version,
+            "user_id": self.owner.get("user_id"),
+            "session_id": self.owner.get("session_id"),
+        }
+
+
+class WriteBehindBuffer:
+    def __init__(self, window: float, batch_size: int, max_pending: int):
+        self.window = window
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: Dict[int, PendingWrite] = {}
+        self._inflight: Dict[int, PendingWrite] = {}  # being written by the current flush
+        self._lock = asyncio.Lock()
+        self._seq = 0
+        self._saves_written = 0
+        self._rows_written = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _latest(self, note_id: int) -> Optional[PendingWrite]:
+        return self._pending.get(note_id) or self._inflight.get(note_id)
+
+    # ──────────────────────────────────────────────
+    # Writes
+    # ──────────────────────────────────────────────
+    async def save(
+        self,
+        db: AsyncSession,
+        note_id: int,
+        note_in: schemas.NoteCreate,
+        owner: dict,
+        expected_version: Optional[int] = None,
+    ) -> dict:
+        """Buffer a full update of a note; returns the note as the client should now see it"""
+        latest = self._latest(note_id)
+        if latest is None:
+            if len(self._pending) >= self.max_pending:
+                note = await crud_async.update_note(db, note_id, note_in, expected_version=expected_version, **owner)
+                return dump_orm(note, schemas.NoteOut)
+            stored = await crud_async.get_note(db, note_id, **owner)
+            if stored is None:
+                raise HTTPException(status_code=404, detail="Note not found")
+            # Another save of this note may have been buffered while we were loading it
+            latest = self._latest(note_id)
+            base = latest.note if latest else dump_orm(stored, schemas.NoteOut)
+        elif latest.owner != owner:
+            raise HTTPException(status_code=404, detail="Note not found")
+        else:
+            base = latest.note
+
+        if expected_version is not None and base["version"] != expected_version:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail=f"Note is at version {base['version']}",
+            )
+        note = {
+            **base,
+            "title": note_in.title,
+            "content": note_in.content,
+            "version": base["version"] + 1,
+            "updated_at": datetime.now(timezone.utc),
+        }
+        self._seq += 1
+        pending = self._pending.get(note_id)
+        if pending is not None:
+            pending.note = note
+            pending.saves += 1
+            pending.seq = self._seq
+        else:
+            self._pending[note_id] = PendingWrite(note=note, owner=owner, base_version=base["version"], seq=self._seq)
+        WRITEBACK_SAVES.inc()
+        WRITEBACK_PENDING.set(len(self._pending))
+        return dict(note)
+
+    # ──────────────────────────────────────────────
+    # Reads
+    # ──────────────────────────────────────────────
+    def overlay(self, note: dict) -> dict:
+        """``note`` (NoteOut fields, as stored) with any newer buffered save applied"""
+        latest = self._latest(note["id"])
+        if latest is not None and latest.note["version"] > note["version"]:
+            return dict(latest.note)
+        return note
+
+    def overlay_summary(self, item: dict) -> dict:
+        latest = self._latest(item["id"])
+        if latest is None:
+            return item
+        fields = note_text_fields(latest.note["content"])
+        return {**item, "title": latest.note["title"], "preview": fields["preview"], "word_count": fields["word_count"]}
+
+    def version_of(self, note_id: int, owner: dict) -> Optional[int]:
+        latest = self._latest(note_id)
+        return latest.note["version"] if latest is not None and latest.owner == owner else None
+
+    def scope_marker(self, owner: dict) -> str:
+        """ETag suffix that changes with every buffered save in a scope ("" if none)"""
+        seqs = [w.seq for w in (*self._pending.values(), *self._inflight.values()) if w.owner == owner]
+        return f".w{max(seqs)}" if seqs else ""
+
+    # ──────────────────────────────────────────────
+    # Flushing
+    # ──────────────────────────────────────────────
+    async def flush(self, note_ids: Optional[Iterable[int]] = None) -> None:
+        """Write buffered saves (all, or those of ``note_ids``) to the database"""
+        async with self._lock:
+            ids = sorted(self._pending if note_ids is None else (i for i in note_ids if i in self._pending))
+            if not ids:
+                return
+            writes = [self._pending.pop(note_id) for note_id in ids]
+            for write in writes:
+                self._inflight[write.note["id"]] = write
+            start = time.perf_counter()
+            try:
+                for i in range(0, len(writes), self.batch_size):
+                    await self._write_batch(writes[i:i + self.batch_size])
+            except Exception:
+                WRITEBACK_FAILURES.inc()
+                for write in writes:
+                    if self._inflight.get(write.note["id"]) is write:
+                        self._requeue(write)
+                raise
+            finally:
+                WRITEBACK_PENDING.set(len(self._pending))
+                WRITEBACK_FLUSH_DURATION.observe(time.perf_counter() - start)
+
+    async def _write_batch(self, writes: List[PendingWrite]) -> None:
+        async with AsyncSessionLocal() as db:
+            outcomes = await crud_async.apply_note_updates(db, [write.as_update() for write in writes])
+        for write, outcome in zip(writes, outcomes):
+            del self._inflight[write.note["id"]]
+            if outcome == "missing":
+                WRITEBACK_CONFLICTS.labels("dropped").inc()
+                logger.warning("Dropped buffered save of note %s: the note was deleted", write.note["id"])
+                continue
+            if outcome == "rebased":
+                WRITEBACK_CONFLICTS.labels("rebased").inc()
+                logger.info("Re-based buffered save of note %s onto a newer stored version", write.note["id"])
+            WRITEBACK_ROWS.inc()
+            self._rows_written += 1
+            self._saves_written += write.saves
+        if self._rows_written:
+            WRITEBACK_RATIO.set(self._saves_written / self._rows_written)
+
+    def _requeue(self, write: PendingWrite) -> None:
+        """Put back a write that did not land, under any newer save of the same note"""
+        note_id = write.note["id"]
+        del self._inflight[note_id]
+        newer = self._pending.get(note_id)
+        if newer is None:
+            self._pending[note_id] = write
+        else:
+            newer.base_version = write.base_version
+            newer.saves += write.saves
+
+    async def flush_note(self, note_id: int) -> None:
+        if note_id in self._pending or note_id in self._inflight:
+            await self.flush([note_id])
+
+    async def flush_scope(self, owner: dict) -> None:
+        note_ids = [note_id for note_id, write in self._pending.items() if write.owner == owner]
+        if note_ids or self._inflight:
+            await self.flush(note_ids)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed; retrying next window")
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for attempt in range(1, FINAL_FLUSH_ATTEMPTS + 1):
+            try:
+                await self.flush()
+                return
+            except Exception:
+                logger.exception("Final write-behind flush failed (attempt %d)", attempt)
+                await asyncio.sleep(attempt)
+        if self._pending:
+            logger.error("Lost %d buffered note saves at shutdown", len(self._pending))
+
+
+buffer = WriteBehindBuffer(
+    window=settings.write_coalesce_window,
+    batch_size=settings.write_coalesce_batch_size,
+    max_pending=settings.write_coalesce_max_pending,
+)
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""Load/benchmark harness for the notes API.
+
+Boots the app in-process (no server, no network) against a throwaway SQLite
+file or a local Postgres, seeds users x notes x note size, then drives a
+mixed workload at fixed concurrency and reports latency percentiles,
+throughput and SQL queries per request. Server errors (5xx) are counted
+rather than raised, and any of them fails the run.
+
+    python benchmark.py --users 20 --notes 500 --requests 5000 --save baseline.json
+    python benchmark.py --users 20 --notes 500 --requests 5000 --compare baseline.json
+    python benchmark.py --users 20 --notes 500 --check-plans
+
+--check-plans runs no workload; it EXPLAINs the SQL the hot crud paths issue
+and fails if any of them scans the notes or tombstones tables sequentially.
+Use a scratch Postgres database with --database-url; --reset drops its tables.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+DEFAULT_MIX = "list=25,summary=10,open=25,autosave=25,create=5,delete=5,login=5"
+OPS = ("list", "summary", "open", "autosave", "create", "delete", "login")
+# Route templates as labelled by app.metrics, used to read queries per request
+OP_ROUTES = {
+    "list": ("GET", "/notes/"),
+    "summary": ("GET", "/notes/summary"),
+    "open": ("GET", "/notes/{note_id}"),
+    "autosave": ("PUT", "/notes/{note_id}"),
+    "create": ("POST", "/notes/"),
+    "delete": ("DELETE", "/notes/{note_id}"),
+    "login": ("POST", "/auth/login"),
+}
+PASSWORD = "benchmark-password"
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate tables first")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--notes", type=int, default=200, help="notes per user")
+    parser.add_argument("--note-size", type=int, default=4000, help="HTML characters per note")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests first")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="op=weight,... (ops: %s)" % ", ".join(OPS))
+    parser.add_argument("--bcrypt-rounds", type=int, help="override BCRYPT_ROUNDS for the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="fail if results regress against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (0.15 = 15%%)")
+    parser.add_argument("--check-plans", action="store_true", help="check hot query plans instead of running the workload")
+    return parser.parse_args(argv)
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPS:
+            raise SystemExit(f"Unknown op in --mix: {op!r}")
+        weights[op] = float(weight or 1)
+    return weights
+
+
+def make_html(rng: random.Random, size: int) -> str:
+    paragraphs = []
+    length = 0
+    while length < size:
+        text = " ".join(rng.choice(WORDS) for _ in range(40))
+        paragraph = f"<p>{text}</p>"
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return "".join(paragraphs)[:size]
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# ──────────────────────────────────────────────────
+# Setup
+# ──────────────────────────────────────────────────
+def seed(args, rng):
+    """Create users and notes straight through crud; returns per-user state"""
+    from sqlalchemy import text
+
+    from app import crud, lifecycle, schemas
+    from app.core.security import create_access_token
+    from app.database import Base, SessionLocal, engine
+
+    if args.reset:
+        # prepare_database then rebuilds the now empty schema at the Alembic head
+        with engine.begin() as conn:
+            if engine.dialect.name == "sqlite":
+                conn.execute(text("DROP TABLE IF EXISTS notes_fts"))
+            Base.metadata.drop_all(bind=conn)
+            conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    lifecycle.prepare_database()
+
+    users = []
+    run_tag = f"{int(time.time())}-{rng.randrange(10 ** 6)}"
+    db = SessionLocal()
+    try:
+        for i in range(args.users):
+            email = f"bench-{run_tag}-{i}@example.com"
+            user = crud.create_user(db, schemas.UserCreate(name=f"Bench {i}", email=email, password=PASSWORD))
+            note_ids = []
+            for start in range(0, args.notes, 500):
+                batch = [
+                    schemas.NoteCreate(title=f"Note {n}", content=make_html(rng, args.note_size))
+                    for n in range(start, min(args.notes, start + 500))
+                ]
+                note_ids.extend(crud.bulk_create_notes(db, batch, user_id=user.id))
+            users.append(
+                {
+                    "id": user.id,
+                    "email": email,
+                    "headers": {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"},
+                    "note_ids": note_ids,
+                }
+            )
+    finally:
+        db.close()
+    return users
+
+
+# ──────────────────────────────────────────────────
+# Workload
+# ──────────────────────────────────────────────────
+async def run_op(client, op, user, rng, note_size):
+    headers = user["headers"]
+    note_ids = user["note_ids"]
+    if op in ("open", "autosave", "delete") and not note_ids:
+        op = "create"
+    if op == "list":
+        return op, await client.get("/notes/", headers=headers)
+    if op == "summary":
+        return op, await client.get("/notes/summary", headers=headers)
+    if op == "open":
+        return op, await client.get(f"/notes/{rng.choice(note_ids)}", headers=headers)
+    if op == "autosave":
+        body = {"title": "Edited", "content": make_html(rng, note_size)}
+        return op, await client.put(f"/notes/{rng.choice(note_ids)}", json=body, headers=headers)
+    if op == "create":
+        body = {"title": "Created", "content": make_html(rng, note_size)}
+        response = await client.post("/notes/", json=body, headers=headers)
+        if response.status_code == 201:
+            note_ids.append(response.json()["id"])
+        return op, response
+    if op == "delete":
+        note_id = note_ids.pop(rng.randrange(len(note_ids)))
+        return op, await client.delete(f"/notes/{note_id}", headers=headers)
+    if op == "login":
+        return op, await client.post("/auth/login", data={"username": user["email"], "password": PASSWORD})
+    raise ValueError(op)
+
+
+async def drive(app, users, args, weights, rng, total, record):
+    import httpx
+
+    ops = list(weights)
+    op_weights = [weights[op] for op in ops]
+    remaining = total
+
+    async def worker(client):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            user = rng.choice(users)
+            chosen = rng.choices(ops, op_weights)[0]
+            start = time.perf_counter()
+            op, response = await run_op(client, chosen, user, rng, args.note_size)
+            if record is not None:
+                record(op, time.perf_counter() - start, response.status_code)
+
+    # An exception in the app becomes a 500 response, counted like any other
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+
+
+def query_totals():
+    from prometheus_client import REGISTRY
+
+    totals = {}
+    for op, (method, route) in OP_ROUTES.items():
+        labels = {"method": method, "route": route}
+        totals[op] = (
+            REGISTRY.get_sample_value("cleverpad_http_request_db_queries_sum", labels) or 0.0,
+            REGISTRY.get_sample_value("cleverpad_http_request_db_queries_count", labels) or 0.0,
+        )
+    return totals
+
+
+async def benchmark(args, weights, rng):
+    from app.main import app
+
+    users = seed(args, rng)
+    latencies = {op: [] for op in weights}
+    errors = {op: 0 for op in weights}
+    server_errors = {op: 0 for op in weights}
+
+    def record(op, seconds, status_code):
+        latencies.setdefault(op, []).append(seconds)
+        if status_code >= 400:
+            errors[op] = errors.get(op, 0) + 1
+        if status_code >= 500:
+            server_errors[op] = server_errors.get(op, 0) + 1
+
+    async with app.router.lifespan_context(app):
+        await drive(app, users, args, weights, rng, args.warmup, None)
+        queries_before = query_totals()
+        started = time.perf_counter()
+        await drive(app, users, args, weights, rng, args.requests, record)
+        elapsed = time.perf_counter() - started
+        queries_after = query_totals()
+
+    results = {}
+    for op, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        query_sum = queries_after[op][0] - queries_before[op][0]
+        query_count = queries_after[op][1] - queries_before[op][1]
+        results[op] = {
+            "count": len(values),
+            "errors": errors.get(op, 0),
+            "server_errors": server_errors.get(op, 0),
+            "mean_ms": statistics.fmean(values) * 1000,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "queries_per_request": query_sum / query_count if query_count else 0.0,
+        }
+    return {"throughput_rps": args.requests / elapsed, "elapsed_s": elapsed, "ops": results}
+
+
+# ──────────────────────────────────────────────────
+# Query plans
+# ──────────────────────────────────────────────────
+SCANNED_TABLES = ("notes", "note_tombstones")
+_SQLITE_FULL_SCAN_RE = re.compile(r"^SCAN (%s)\b" % "|".join(SCANNED_TABLES))
+
+
+def _explain(conn, statement, parameters):
+    """Plan lines for one statement, and whether any of them is a full table scan"""
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("ANALYZE")
+        # With seq scans priced out, a Seq Scan in the plan means no index can serve the query
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        nodes, lines, full_scan = [plan[0]["Plan"]], [], False
+        while nodes:
+            node = nodes.pop()
+            lines.append(f"{node['Node Type']} {node.get('Index Name') or node.get('Relation Name') or ''}".strip())
+            if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in SCANNED_TABLES:
+                full_scan = True
+            nodes.extend(node.get("Plans", []))
+        return lines, full_scan
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    lines = [row[-1] for row in rows]
+    return lines, any(_SQLITE_FULL_SCAN_RE.match(line) for line in lines)
+
+
+def explain_hot_paths(users, rng):
+    """EXPLAIN every statement the hot crud paths run; returns (path, statement, plan lines, full scan?) tuples"""
+    from sqlalchemy import event
+
+    from app import crud, schemas
+    from app.database import SessionLocal, engine
+
+    db = SessionLocal()
+    session_id = crud.generate_guest_session_id()
+    crud.bulk_create_notes(
+        db, [schemas.NoteCreate(title="Guest", content=make_html(rng, 200)) for _ in range(20)], session_id=session_id
+    )
+    user = users[0]
+    note_id = user["note_ids"][len(user["note_ids"]) // 2]
+    hot_paths = {
+        "list notes (user)": lambda: crud.get_notes(db, user_id=user["id"]),
+        "list notes (guest)": lambda: crud.get_notes(db, session_id=session_id),
+        "summaries (user)": lambda: crud.get_note_summaries(db, user_id=user["id"], before_id=note_id),
+        "summaries (guest)": lambda: crud.get_note_summaries(db, session_id=session_id),
+        "open note (user)": lambda: crud.get_note(db, note_id, user_id=user["id"]),
+        "note version (guest)": lambda: crud.get_note_version(db, note_id, session_id=session_id),
+        "changes (user)": lambda: crud.get_note_changes(db, 0, user_id=user["id"]),
+        "changes (guest)": lambda: crud.get_note_changes(db, 0, session_id=session_id),
+    }
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    plans = []
+    try:
+        for name, call in hot_paths.items():
+            captured.clear()
+            event.listen(engine, "before_cursor_execute", capture)
+            try:
+                call()
+            finally:
+                event.remove(engine, "before_cursor_execute", capture)
+            db.rollback()
+            for statement, parameters in captured:
+                with engine.begin() as conn:
+                    lines, full_scan = _explain(conn, statement, parameters)
+                plans.append((name, statement, lines, full_scan))
+    finally:
+        db.close()
+    return plans
+
+
+def check_query_plans(users, rng):
+    """Print the hot paths' plans; returns the statements that full-scan"""
+    problems = []
+    for name, statement, lines, full_scan in explain_hot_paths(users, rng):
+        print(f"{'FULL SCAN' if full_scan else 'ok':<10}{name}: {'; '.join(lines)}")
+        if full_scan:
+            problems.append(f"{name}: {' '.join(statement.split())[:120]}")
+    return problems
+
+
+# ──────────────────────────────────────────────────
+# Reporting
+# ──────────────────────────────────────────────────
+def print_report(report):
+    print(f"\n{'op':<10}{'count':>7}{'err':>5}{'5xx':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/req':>8}")
+    for op, row in report["ops"].items():
+        print(
+            f"{op:<10}{row['count']:>7}{row['errors']:>5}{row['server_errors']:>5}{row['p50_ms']:>10.2f}"
+            f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['queries_per_request']:>8.2f}"
+        )
+    print(f"\nthroughput: {report['throughput_rps']:.1f} req/s over {report['elapsed_s']:.2f}s")
+
+
+def compare(report, baseline, tolerance):
+    """Regressions against ``baseline``: slower p95/throughput or more queries per request"""
+    problems = []
+    base_rps = baseline["throughput_rps"]
+    if report["throughput_rps"] < base_rps * (1 - tolerance):
+        problems.append(f"throughput {report['throughput_rps']:.1f} < baseline {base_rps:.1f} req/s")
+    for op, row in report["ops"].items():
+        base = baseline["ops"].get(op)
+        if not base:
+            continue
+        if row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{op}: p95 {row['p95_ms']:.2f}ms > baseline {base['p95_ms']:.2f}ms")
+        # Query counts are deterministic, so any increase is an N+1 style regression
+        if row["queries_per_request"] > base["queries_per_request"] + 0.5:
+            problems.append(
+                f"{op}: {row['queries_per_request']:.2f} queries/request > "
+                f"baseline {base['queries_per_request']:.2f}"
+            )
+    return problems
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    weights = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+
+    tmpdir = None
+    if not args.database_url:
+        tmpdir = tempfile.TemporaryDirectory(prefix="cleverpad-bench-")
+        args.database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    # Settings are read at import time, so configure the environment first
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    # Measure the server, not the per-client rate limits (the concurrency cap stays on)
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        if args.check_plans:
+            problems = check_query_plans(seed(args, rng), rng)
+            if problems:
+                print("\nFULL TABLE SCANS:")
+                for problem in problems:
+                    print(f"  - {problem}")
+                return 1
+            print("\nall hot queries use indexes")
+            return 0
+        report = asyncio.run(benchmark(args, weights, rng))
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    report["meta"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "database": args.database_url.split(":", 1)[0],
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "config": {
+            key: getattr(args, key)
+            for key in ("users", "notes", "note_size", "concurrency", "requests", "mix", "seed")
+        },
+    }
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved {args.save}")
+
+    failed = {op: row["server_errors"] for op, row in report["ops"].items() if row["server_errors"]}
+    if failed:
+        print("\nSERVER ERRORS: " + ", ".join(f"{op} {count}" for op, count in failed.items()))
+        return 1
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("config") != report["meta"]["config"]:
+            print("warning: baseline was recorded with a different configuration")
+        problems = compare(report, baseline, args.tolerance)
+        if problems:
+            print("\nREGRESSIONS:")
+            for problem in problems:
+                print(f"  - {problem}")
+            return 1
+        print("no regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Shared test setup.
+
+Settings are read at import time, so the app is pointed at a throwaway SQLite
+database here, before any test module imports it.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_tmpdir = tempfile.TemporaryDirectory(prefix="cleverpad-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir.name, 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ["RATE_LIMIT_BACKEND"] = "none"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def guest(client):
+    """Headers of a fresh guest session"""
+    return {"X-Session-Id": client.post("/auth/guest").json()["session_id"]}
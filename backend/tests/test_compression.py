@@ -0,0 +1,38 @@
+"""Compressed responses carry their own ETag, and still revalidate to 304."""
+from app.routes.notes import note_etag
+
+
+def _note(client, headers, size=4000):
+    body = "<p>" + "compressible text " * (size // 18) + "</p>"
+    return client.post("/notes/", json={"title": "t", "content": body}, headers=headers).json()["id"]
+
+
+def test_compressed_body_gets_a_coding_etag(client, guest):
+    note_id = _note(client, guest)
+    plain = client.get(f"/notes/{note_id}", headers={**guest, "Accept-Encoding": "identity"})
+    gzipped = client.get(f"/notes/{note_id}", headers={**guest, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] == note_etag(note_id, 1)
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["etag"] == note_etag(note_id, 1)[:-1] + '-gzip"'
+    assert gzipped.json() == plain.json()
+
+
+def test_coding_etag_revalidates(client, guest):
+    note_id = _note(client, guest)
+    etag = client.get(f"/notes/{note_id}", headers={**guest, "Accept-Encoding": "gzip"}).headers["etag"]
+    response = client.get(f"/notes/{note_id}", headers={**guest, "Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    assert client.put(f"/notes/{note_id}", json={"title": "t2", "content": "<p>x</p>"}, headers=guest).status_code == 200
+    response = client.get(f"/notes/{note_id}", headers={**guest, "Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_plain_etag_revalidates_without_a_suffix(client, guest):
+    note_id = _note(client, guest)
+    etag = note_etag(note_id, 1)
+    response = client.get(f"/notes/{note_id}", headers={**guest, "Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
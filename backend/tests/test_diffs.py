@@ -0,0 +1,106 @@
+"""Delta ops: UTF-16 offsets from clients, and PATCH /notes/{id}."""
+import pytest
+
+from app.diffs import apply_delta, from_utf16
+
+EMOJI = "\U0001F600"  # two UTF-16 code units
+
+
+def utf16_len(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+# ──────────────────────────────────────────────────
+# from_utf16 / apply_delta
+# ──────────────────────────────────────────────────
+def test_bmp_text_keeps_offsets():
+    ops = [(1, 2, "x")]
+    assert from_utf16("abcé", ops) == ops
+
+
+def test_astral_characters_shift_later_offsets():
+    base = f"a{EMOJI}b{EMOJI}c"
+    # "b" is UTF-16 [3, 4) but code points [2, 3)
+    assert from_utf16(base, [(3, 4, "X")]) == [(2, 3, "X")]
+    assert apply_delta(base, from_utf16(base, [(3, 4, "X")])) == f"a{EMOJI}X{EMOJI}c"
+    assert apply_delta(base, from_utf16(base, [(utf16_len(base),) * 2 + ("!",)])) == base + "!"
+
+
+def test_ops_may_replace_astral_characters():
+    base = f"{EMOJI}{EMOJI}"
+    assert apply_delta(base, from_utf16(base, [(2, 4, "b")])) == f"{EMOJI}b"
+
+
+@pytest.mark.parametrize("offset", [1, 5])
+def test_offset_between_surrogate_halves_is_rejected(offset):
+    # UTF-16: emoji [0, 2), "a" 2, "b" 3, emoji [4, 6)
+    with pytest.raises(ValueError, match="surrogate pair"):
+        from_utf16(f"{EMOJI}ab{EMOJI}", [(offset, offset, "x")])
+
+
+@pytest.mark.parametrize(
+    "ops",
+    [
+        [(0, 9, "x")],  # past the end
+        [(2, 1, "x")],  # end before start
+        [(0, 2, "x"), (1, 3, "y")],  # overlapping
+        [(2, 3, "x"), (0, 1, "y")],  # out of order
+    ],
+)
+def test_malformed_ops_are_rejected(ops):
+    with pytest.raises(ValueError):
+        apply_delta("abcd", ops)
+
+
+# ──────────────────────────────────────────────────
+# PATCH /notes/{id}
+# ──────────────────────────────────────────────────
+def _create(client, headers, content):
+    response = client.post("/notes/", json={"title": "t", "content": content}, headers=headers)
+    assert response.status_code in (200, 201)
+    return response.json()["id"]
+
+
+def test_patch_takes_utf16_offsets(client, guest):
+    body = f"<p>{EMOJI} hi</p>"
+    note_id = _create(client, guest, body)
+    start = body.encode("utf-16-le").find("hi".encode("utf-16-le")) // 2
+    response = client.patch(
+        f"/notes/{note_id}", json={"base_version": 1, "ops": [[start, start + 2, "yo"]]}, headers=guest
+    )
+    assert response.status_code == 200
+    assert response.json() == {"id": note_id, "version": 2, "content": None}
+    assert client.get(f"/notes/{note_id}", headers=guest).json()["content"] == f"<p>{EMOJI} yo</p>"
+
+
+def test_patch_splitting_a_surrogate_pair_is_422(client, guest):
+    note_id = _create(client, guest, f"<p>{EMOJI}</p>")
+    response = client.patch(f"/notes/{note_id}", json={"base_version": 1, "ops": [[4, 4, "x"]]}, headers=guest)
+    assert response.status_code == 422
+    assert client.get(f"/notes/{note_id}", headers=guest).json()["version"] == 1
+
+
+def test_patch_against_stale_version_is_409(client, guest):
+    note_id = _create(client, guest, "<p>a</p>")
+    first = client.patch(f"/notes/{note_id}", json={"base_version": 1, "ops": [[3, 4, "b"]]}, headers=guest)
+    assert first.status_code == 200
+    response = client.patch(f"/notes/{note_id}", json={"base_version": 1, "ops": [[3, 4, "c"]]}, headers=guest)
+    assert response.status_code == 409
+    assert client.get(f"/notes/{note_id}", headers=guest).json()["content"] == "<p>b</p>"
+
+
+def test_patch_applies_several_ops_against_the_base(client, guest):
+    body = f"<p>one {EMOJI} two three</p>"
+    note_id = _create(client, guest, body)
+    units = body.encode("utf-16-le")
+
+    def at(word):
+        return units.find(word.encode("utf-16-le")) // 2
+
+    ops = [[at("one"), at("one") + 3, "1"], [at("two"), at("two") + 3, "2"], [utf16_len(body), utf16_len(body), "!"]]
+    response = client.patch(f"/notes/{note_id}", json={"base_version": 1, "title": "new", "ops": ops}, headers=guest)
+    assert response.status_code == 200
+    note = client.get(f"/notes/{note_id}", headers=guest).json()
+    assert note["content"] == f"<p>1 {EMOJI} 2 three</p>!"
+    assert note["title"] == "new"
+    assert note["version"] == 2
@@ -0,0 +1,39 @@
+"""The hot note queries must be served by indexes on SQLite (``benchmark.py --check-plans``).
+
+    cd backend && python -m pytest tests
+"""
+import random
+
+import pytest
+
+import benchmark
+
+# Hot path -> index each of its notes/tombstones lookups must use
+EXPECTED_INDEXES = {
+    "list notes (user)": ["ix_notes_owner_id_desc"],
+    "list notes (guest)": ["ix_notes_guest_session_id_desc"],
+    "summaries (user)": ["ix_notes_owner_id_desc"],
+    "summaries (guest)": ["ix_notes_guest_session_id_desc"],
+    "changes (user)": ["ix_notes_owner_revision", "ix_note_tombstones_owner_revision"],
+    "changes (guest)": ["ix_notes_session_revision", "ix_note_tombstones_session_revision"],
+}
+
+
+@pytest.fixture(scope="module")
+def plans():
+    rng = random.Random(1)
+    args = benchmark.parse_args(["--users", "2", "--notes", "50", "--note-size", "500"])
+    users = benchmark.seed(args, rng)
+    return benchmark.explain_hot_paths(users, rng)
+
+
+def test_no_hot_query_scans_a_table(plans):
+    scans = [f"{name}: {'; '.join(lines)}" for name, _, lines, full_scan in plans if full_scan]
+    assert scans == []
+
+
+@pytest.mark.parametrize("path", sorted(EXPECTED_INDEXES))
+def test_hot_path_uses_its_indexes(plans, path):
+    lines = [line for name, _, path_lines, _ in plans if name == path for line in path_lines]
+    for index in EXPECTED_INDEXES[path]:
+        assert any(f"USING INDEX {index} " in line for line in lines), lines
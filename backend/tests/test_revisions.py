@@ -0,0 +1,80 @@
+"""Revision history: reverse deltas must rebuild every saved body exactly."""
+import random
+
+import pytest
+
+from app.core.config import settings
+from app.diffs import MAX_DIFF_TOKENS, apply_delta, make_delta
+
+WORDS = "lorem ipsum dolor sit amet \U0001F600 café <b>bold</b> &amp; line\n".split(" ")
+
+
+def _edit(rng, body):
+    """``body`` with a few words inserted, deleted or replaced"""
+    words = body.split(" ")
+    for _ in range(rng.randint(1, 4)):
+        at = rng.randrange(len(words) + 1)
+        kind = rng.choice(("insert", "delete", "replace"))
+        if kind == "insert" or not words:
+            words.insert(at, rng.choice(WORDS))
+        elif kind == "delete":
+            del words[min(at, len(words) - 1)]
+        else:
+            words[min(at, len(words) - 1)] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_make_delta_round_trips(seed):
+    rng = random.Random(seed)
+    base = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 200)))
+    target = _edit(rng, base)
+    assert apply_delta(base, make_delta(base, target)) == target
+
+
+def test_large_changes_are_replaced_whole():
+    base = "a " * MAX_DIFF_TOKENS
+    target = "b " * MAX_DIFF_TOKENS
+    ops = make_delta(base, target)
+    assert len(ops) == 1
+    assert apply_delta(base, ops) == target
+
+
+@pytest.fixture(params=["none", "zlib"])
+def history_settings(request, monkeypatch):
+    """Snapshots every few revisions, with plain or compressed bodies"""
+    monkeypatch.setattr(settings, "note_revision_snapshot_every", 4)
+    monkeypatch.setattr(settings, "note_compression", request.param)
+    monkeypatch.setattr(settings, "note_compression_min_bytes", 1)
+
+
+def test_every_revision_rebuilds_and_restores(client, guest, history_settings):
+    rng = random.Random(1)
+    bodies = {1: "<p>" + " ".join(rng.choice(WORDS) for _ in range(60)) + "</p>"}
+    note = client.post("/notes/", json={"title": "v1", "content": bodies[1]}, headers=guest).json()
+    note_id = note["id"]
+    for version in range(2, 15):
+        bodies[version] = _edit(rng, bodies[version - 1])
+        saved = client.put(
+            f"/notes/{note_id}", json={"title": f"v{version}", "content": bodies[version]}, headers=guest
+        ).json()
+        assert saved["version"] == version
+
+    for version in range(1, 14):
+        revision = client.get(f"/notes/{note_id}/revisions/{version}", headers=guest).json()
+        assert (revision["version"], revision["title"], revision["content"]) == (version, f"v{version}", bodies[version])
+    assert client.get(f"/notes/{note_id}/revisions/14", headers=guest).status_code == 404
+
+    restored = client.post(f"/notes/{note_id}/revisions/3/restore", headers=guest)
+    assert restored.status_code == 200
+    assert (restored.json()["version"], restored.json()["content"]) == (15, bodies[3])
+    assert client.get(f"/notes/{note_id}", headers=guest).json()["content"] == bodies[3]
+    # The replaced version joined the history, and the older ones still rebuild past it
+    assert client.get(f"/notes/{note_id}/revisions/14", headers=guest).json()["content"] == bodies[14]
+    for version in range(1, 14):
+        assert client.get(f"/notes/{note_id}/revisions/{version}", headers=guest).json()["content"] == bodies[version]
+
+
+def test_restoring_a_missing_revision_is_404(client, guest):
+    note_id = client.post("/notes/", json={"title": "t", "content": "<p>a</p>"}, headers=guest).json()["id"]
+    assert client.post(f"/notes/{note_id}/revisions/1/restore", headers=guest).status_code == 404
@@ -50,6 +50,7 @@ export default function NotesApp() {
   const [isImporting, setIsImporting] = useState(false);
   const [isExporting, setIsExporting] = useState(false);
   const importAllNotesRef = useRef();
+  const syncCursorRef = useRef(0);
 
   useEffect(() => {
     const root = document.documentElement;
@@ -157,6 +158,7 @@ export default function NotesApp() {
       .then((res) => res.json())
       .then((data) => {
         setNotes(data);
+        syncCursorRef.current = data.reduce((max, n) => Math.max(max, n.revision || 0), 0);
         // Don't automatically select the first note - show welcome screen instead
         setActiveId(null);
         setTitleDraft("");
@@ -184,12 +186,25 @@ export default function NotesApp() {
           body: JSON.stringify({ title: titleDraft, content: draft })
         });
         
-        // Refresh notes list to ensure consistency
-        const res = await fetch("http://localhost:8000/notes/", {
-          headers: { Authorization: `Bearer ${user.token}` }
-        });
-        const data = await res.json();
-        setNotes(data);
+        // Pull only what changed since the last sync instead of the whole list
+        let hasMore = true;
+        while (hasMore) {
+          const res = await fetch(
+            `http://localhost:8000/notes/changes?since=${syncCursorRef.current}`,
+            { headers: { Authorization: `Bearer ${user.token}` } }
+          );
+          const changes = await res.json();
+          const changed = new Map(changes.notes.map((n) => [n.id, n]));
+          const deleted = new Set(changes.deleted);
+          setNotes((prev) => [
+            ...changes.notes.filter((n) => !prev.some((p) => p.id === n.id)).reverse(),
+            ...prev
+              .filter((n) => !deleted.has(n.id))
+              .map((n) => changed.get(n.id) || n),
+          ]);
+          syncCursorRef.current = changes.cursor;
+          hasMore = changes.has_more;
+        }
       } catch (error) {
         console.error('Failed to save note:', error);
       }
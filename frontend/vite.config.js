@@ -4,4 +4,10 @@ import react from '@vitejs/plugin-react'
 // https://vite.dev/config/
 export default defineConfig({
   plugins: [react()],
+  server: {
+    // Images pasted into notes are served by the API at /blobs/<digest>
+    proxy: {
+      '/blobs': 'http://localhost:8000',
+    },
+  },
 })